@@ -0,0 +1,105 @@
+"""Time a bulk farmer import against registering farmers one at a time.
+
+Writes synthetic vendors and farmers as NDJSON in a temporary directory,
+imports them with bulk_io, then registers a few more farmers the old way
+(rewrite farmers.json, rescan every community, rewrite the community shards) to
+measure the per-farmer cost at that size.
+
+    python benchmarks/bench_bulk_io.py --farmers 50000 --vendors 500
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bulk_io import export_records, import_users, read_records, write_records  # noqa: E402
+from storage import COMMUNITIES_FILES, FARMERS_FILE, VENDORS_FILE, load_data, load_sharded, save_data, split_by_shard  # noqa: E402
+
+
+def calculate_distance(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def legacy_register_farmer(farmer):
+    farmers = load_data(FARMERS_FILE)
+    farmers.append(farmer)
+    save_data(farmers, FARMERS_FILE)
+    vendors = load_data(VENDORS_FILE)
+    communities = load_sharded(COMMUNITIES_FILES)
+    for community in communities:
+        vendor = next((v for v in vendors if v["id"] == community["vendor_id"]), None)
+        if vendor:
+            distance = calculate_distance(vendor["latitude"], vendor["longitude"],
+                                          farmer["latitude"], farmer["longitude"])
+            if distance <= 50:
+                community["members"].append({"id": farmer["id"], "name": farmer["name"],
+                                             "type": "farmer", "distance": round(distance, 2)})
+    for file_path, rows in split_by_shard(communities, COMMUNITIES_FILES, "id").items():
+        save_data(rows, file_path)
+
+
+def write_ndjson(path, records):
+    with open(path, 'w') as f:
+        f.writelines(json.dumps(record) + "\n" for record in records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--farmers", type=int, default=50000)
+    parser.add_argument("--vendors", type=int, default=500)
+    parser.add_argument("--legacy-sample", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(8)
+
+    def user(name):
+        # Maharashtra-sized region, so communities have a realistic share of nearby farmers
+        return {"name": name, "latitude": rng.uniform(16, 21), "longitude": rng.uniform(73, 80)}
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        try:
+            write_ndjson("vendors.ndjson", [user(f"Vendor {i}") for i in range(args.vendors)])
+            write_ndjson("farmers.ndjson", [user(f"Farmer {i}") for i in range(args.farmers)])
+            with open("vendors.ndjson") as f:
+                import_users("vendor", read_records(f, "ndjson"))
+
+            t0 = time.perf_counter()
+            with open("farmers.ndjson") as f:
+                report = import_users("farmer", read_records(f, "ndjson"))
+            bulk_s = time.perf_counter() - t0
+
+            t0 = time.perf_counter()
+            for i in range(args.legacy_sample):
+                legacy_register_farmer(dict(user(f"Late farmer {i}"), id=str(uuid.uuid4()), created_at=""))
+            legacy_ms = (time.perf_counter() - t0) / args.legacy_sample * 1000
+
+            t0 = time.perf_counter()
+            with open("export.ndjson", 'w') as f:
+                exported = write_records(f, "ndjson", None, export_records("farmers"))
+            export_s = time.perf_counter() - t0
+        finally:
+            os.chdir(cwd)
+
+    print(f"{args.farmers} farmers into {args.vendors} vendor communities")
+    print(f"bulk import: {bulk_s:.2f}s ({args.farmers / bulk_s:,.0f} farmers/s), "
+          f"{report['memberships']} memberships; "
+          + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in report["seconds"].items()))
+    print(f"one-at-a-time registration at this size: {legacy_ms:.0f} ms per farmer "
+          f"(~{legacy_ms * args.farmers / 2 / 1000 / 60:.0f} min for the whole import, as files grow)")
+    print(f"export: {exported} farmers in {export_s:.2f}s ({exported / export_s:,.0f} records/s)")
+
+
+if __name__ == "__main__":
+    main()
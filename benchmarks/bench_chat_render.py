@@ -0,0 +1,127 @@
+"""Measure chat render cost per rerun for large communities.
+
+Compares the old behaviour (format every message on every rerun) with the
+windowed, memoized renderer in chat_view. With --apptest the full Streamlit
+script is also rerun headless against a generated community.
+
+    python benchmarks/bench_chat_render.py --messages 10000 50000 --apptest
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import chat_view  # noqa: E402
+
+APP_SCRIPT = os.path.join(ROOT, "pytest - Copy.py")
+
+
+def make_messages(n, user_ids):
+    """Generate n chat messages spread over the given users"""
+    start = datetime(2024, 1, 1)
+    messages = []
+    for i in range(n):
+        user_id = user_ids[i % len(user_ids)]
+        messages.append({
+            "id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "user_name": f"User {user_id[:4]}",
+            "user_type": "vendor" if i % 10 == 0 else "farmer",
+            "content": f"Message number {i} about the next mandi delivery",
+            "timestamp": (start + timedelta(minutes=i)).isoformat()
+        })
+    return messages
+
+
+def timed(fn, repeat):
+    """Return the best wall time of `repeat` calls in milliseconds"""
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def bench_render(n, repeat):
+    user_ids = [str(uuid.uuid4()) for _ in range(50)]
+    messages = make_messages(n, user_ids)
+    me = user_ids[0]
+
+    def full_render():
+        for msg in messages:
+            chat_view._format_bubble(msg, msg["user_id"] == me)
+
+    def windowed_render():
+        window = chat_view.message_window(messages, chat_view.CHAT_PAGE_SIZE)
+        chat_view.render_message_window(window, me)
+
+    chat_view.clear_bubble_cache()
+    cold = timed(windowed_render, 1)
+    warm = timed(windowed_render, repeat)
+    full = timed(full_render, repeat)
+    return {"messages": n, "full_ms": full, "window_cold_ms": cold, "window_warm_ms": warm}
+
+
+def bench_apptest(n, repeat):
+    """Rerun the whole app headless with a community holding n messages"""
+    from streamlit.testing.v1 import AppTest
+
+    vendor_id = str(uuid.uuid4())
+    community_id = str(uuid.uuid4())
+    vendor = {"id": vendor_id, "name": "Bench Vendor", "latitude": 28.61, "longitude": 77.2,
+              "created_at": datetime.now().isoformat()}
+    community = {
+        "id": community_id,
+        "name": "Bench Vendor's Community",
+        "vendor_id": vendor_id,
+        "vendor_name": vendor["name"],
+        "members": [{"id": vendor_id, "name": vendor["name"], "type": "vendor"}],
+        "messages": make_messages(n, [vendor_id, str(uuid.uuid4())]),
+        "created_at": datetime.now().isoformat()
+    }
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as data_dir:
+        with open(os.path.join(data_dir, "vendors.json"), "w") as f:
+            json.dump([vendor], f)
+        with open(os.path.join(data_dir, "communities.json"), "w") as f:
+            json.dump([community], f)
+        os.chdir(data_dir)
+        try:
+            at = AppTest.from_file(APP_SCRIPT, default_timeout=120)
+            at.session_state.current_user = vendor_id
+            at.session_state.current_user_type = "vendor"
+            at.session_state.view = "chat"
+            at.session_state.chat_community = community_id
+            at.run()
+            rerun_ms = timed(at.run, repeat)
+        finally:
+            os.chdir(cwd)
+    return rerun_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--apptest", action="store_true", help="also time full headless reruns")
+    args = parser.parse_args()
+
+    print(f"{'messages':>10} {'full (ms)':>12} {'window cold':>12} {'window warm':>12} {'rerun (ms)':>12}")
+    for n in args.messages:
+        result = bench_render(n, args.repeat)
+        rerun = f"{bench_apptest(n, args.repeat):12.1f}" if args.apptest else f"{'-':>12}"
+        print(f"{result['messages']:>10} {result['full_ms']:12.1f} {result['window_cold_ms']:12.2f} "
+              f"{result['window_warm_ms']:12.3f} {rerun}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Benchmark the crop recommendation models: load time, latency, throughput, memory and accuracy.
+
+Measures every model artifact in the models directory: the five the
+notebooks save (Decision Tree, Logistic Regression, Random Forest, Naive Bayes
+and SVM) and any other .pkl there, such as a compiled or distilled variant.
+Accuracy is 5-fold cross-validation on Crop_recommendation.csv.
+
+With --baseline, the results are compared with the baseline file (or saved to
+it if there is none yet); the exit status is 1 when a model got slower than
+the tolerance allows or lost accuracy. --update overwrites the baseline.
+
+    python benchmarks/bench_crop_models.py --models-dir . --baseline benchmarks/crop_models_baseline.json
+"""
+import argparse
+import glob
+import json
+import os
+import pickle
+import platform
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.base import clone
+from sklearn.model_selection import StratifiedKFold, train_test_split
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET = os.path.join(ROOT, "Crop_recommendation.csv")
+
+FEATURES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+ENCODER_FILE = "label_encoder.pkl"
+
+# The artifacts the notebooks save, by model name
+MODEL_FILES = {
+    "Decision Tree": "DecisionTree.pkl",
+    "Logistic Regression": "LogisticRegression.pkl",
+    "Random Forest": "RandomForest.pkl",
+    "Naive Bayes": "NBClassifier.pkl",
+    "SVM": "supportvectormachine.pkl",
+}
+
+BATCH_SIZES = (1, 32, 256, 2048)
+SINGLE_ROW_CALLS = 1000
+LOAD_REPEATS = 5
+FOLDS = 5
+# Seconds spent on each batch size
+THROUGHPUT_SECONDS = 0.5
+
+# A model regresses when it is this much slower than the baseline ...
+DEFAULT_TOLERANCE = 0.25
+# ... or loses more than this much mean accuracy
+ACCURACY_TOLERANCE = 0.01
+# p99 and small batches are recorded but too noisy to fail a run on
+GATED_BATCH_SIZE = 256
+# Timings that moved by less than this are noise, whatever the fraction
+NOISE_FLOOR_MS = 0.05
+
+
+def notebook_model(name):
+    """An untrained model with the notebook's settings"""
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.naive_bayes import GaussianNB
+    from sklearn.svm import SVC
+    from sklearn.tree import DecisionTreeClassifier
+    return {
+        "Decision Tree": lambda: DecisionTreeClassifier(criterion="entropy", random_state=2, max_depth=5),
+        "Logistic Regression": lambda: LogisticRegression(random_state=2),
+        "Random Forest": lambda: RandomForestClassifier(n_estimators=20, random_state=0),
+        "Naive Bayes": GaussianNB,
+        "SVM": lambda: SVC(gamma="auto"),
+    }[name]()
+
+
+def train_missing(models_dir, features, labels):
+    """Train and save any notebook artifact that is not in `models_dir`, the way the notebook does"""
+    x_train, _, y_train, _ = train_test_split(features, labels, test_size=0.2, random_state=2)
+    for name, file_name in MODEL_FILES.items():
+        path = os.path.join(models_dir, file_name)
+        if not os.path.exists(path):
+            with open(path, "wb") as f:
+                pickle.dump(notebook_model(name).fit(x_train, y_train), f)
+            print(f"Trained {file_name}")
+
+
+def artifacts(models_dir):
+    """(name, path) of each model artifact: the notebook's first, then any other .pkl as a variant"""
+    found = [(name, os.path.join(models_dir, file_name)) for name, file_name in MODEL_FILES.items()]
+    known = set(MODEL_FILES.values()) | {ENCODER_FILE}
+    for path in sorted(glob.glob(os.path.join(models_dir, "*.pkl"))):
+        if os.path.basename(path) not in known:
+            found.append((os.path.splitext(os.path.basename(path))[0], path))
+    return found
+
+
+def load(path):
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+def measure_load(path):
+    """Median unpickle seconds and the peak memory it allocates, in bytes"""
+    load(path)  # imports the model's modules, so they are not counted
+    times = []
+    for _ in range(LOAD_REPEATS):
+        started = time.perf_counter()
+        load(path)
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    model = load(path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return model, float(np.median(times)), peak
+
+
+def measure_latency(model, rows):
+    """p50 and p99 milliseconds of predicting one row, as the app does"""
+    times = np.empty(SINGLE_ROW_CALLS)
+    for i in range(SINGLE_ROW_CALLS):
+        row = rows[i % len(rows)].reshape(1, -1)
+        started = time.perf_counter()
+        model.predict(row)
+        times[i] = time.perf_counter() - started
+    p50, p99 = np.percentile(times * 1000, [50, 99])
+    return float(p50), float(p99)
+
+
+def measure_throughput(model, rows):
+    """Rows predicted per second at each batch size"""
+    throughput = {}
+    for size in BATCH_SIZES:
+        batch = rows[np.arange(size) % len(rows)]
+        model.predict(batch)
+        calls = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < THROUGHPUT_SECONDS:
+            model.predict(batch)
+            calls += 1
+        throughput[str(size)] = calls * size / (time.perf_counter() - started)
+    return throughput
+
+
+def measure_accuracy(model, features, labels, encoder):
+    """Accuracy on each cross-validation fold, and whether the model could be refit per fold
+
+    A scikit-learn model is cloned and trained on the other folds. Anything
+    that cannot be cloned (e.g. a compiled model) is scored as it is, which
+    overstates accuracy when it was trained on some of the fold's rows.
+    """
+    # Models trained on encoded labels predict numbers; decode them to compare
+    decode = encoder is not None and not isinstance(getattr(model, "classes_", ["crop"])[0], str)
+    try:
+        template = clone(model)
+    except TypeError:
+        template = None
+    scores = []
+    for train, test in StratifiedKFold(FOLDS, shuffle=True, random_state=0).split(features, labels):
+        if template is not None:
+            targets = encoder.transform(labels[train]) if decode else labels[train]
+            fold_model = clone(template).fit(features[train], targets)
+        else:
+            fold_model = model
+        predicted = fold_model.predict(features[test])
+        if decode:
+            predicted = encoder.inverse_transform(predicted.astype(int))
+        scores.append(float(np.mean(predicted == labels[test])))
+    return scores, template is not None
+
+
+def environment():
+    return {"python": platform.python_version(), "sklearn": sklearn.__version__, "machine": platform.machine(),
+            "processor": platform.processor(), "cpus": os.cpu_count()}
+
+
+def regressions(results, baseline, tolerance):
+    """Messages for each measurement that got worse than the baseline allows"""
+    found = []
+    for name, result in results["models"].items():
+        before = baseline["models"].get(name)
+        if before is None:
+            continue
+        slower = [(measure, now, then) for measure, now, then in (
+            ("load_ms", result["load_seconds"] * 1000, before["load_seconds"] * 1000),
+            ("p50_ms", result["p50_ms"], before["p50_ms"])) if now - then > NOISE_FLOOR_MS]
+        # Throughput is better when higher, so compare its inverse
+        slower += [(f"throughput@{size}", 1 / result["throughput"][size], 1 / value)
+                   for size, value in before["throughput"].items()
+                   if int(size) >= GATED_BATCH_SIZE and size in result["throughput"]]
+        for measure, now, then in slower:
+            if now > then * (1 + tolerance):
+                found.append(f"{name}: {measure} is {now / then - 1:.0%} worse than the baseline")
+        if result["accuracy"] < before["accuracy"] - ACCURACY_TOLERANCE:
+            found.append(f"{name}: accuracy fell from {before['accuracy']:.4f} to {result['accuracy']:.4f}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models-dir", default=ROOT, help="directory holding the .pkl artifacts")
+    parser.add_argument("--train-missing", action="store_true",
+                        help="train and save notebook artifacts that are missing, with the notebook's settings")
+    parser.add_argument("--baseline", help="JSON file to compare with, or to save to if it does not exist")
+    parser.add_argument("--update", action="store_true", help="overwrite the baseline with these results")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown against the baseline, as a fraction")
+    args = parser.parse_args()
+    warnings.filterwarnings("ignore")  # models fitted on DataFrames warn about numpy input, as the app passes
+
+    data = pd.read_csv(DATASET)
+    features = data[FEATURES].to_numpy()
+    labels = data["label"].to_numpy()
+    if args.train_missing:
+        train_missing(args.models_dir, data[FEATURES], data["label"])
+    encoder_path = os.path.join(args.models_dir, ENCODER_FILE)
+    encoder = load(encoder_path) if os.path.exists(encoder_path) else None
+
+    results = {"date": datetime.now().isoformat(timespec="seconds"), "environment": environment(), "models": {}}
+    print(f"{'model':<26}{'size KB':>9}{'load ms':>9}{'load MB':>9}{'p50 ms':>8}{'p99 ms':>8}"
+          + "".join(f"{f'rows/s@{size}':>13}" for size in BATCH_SIZES) + f"{'accuracy':>14}")
+    for name, path in artifacts(args.models_dir):
+        if not os.path.exists(path):
+            print(f"{name:<26}missing {os.path.basename(path)} (run with --train-missing to build it)")
+            continue
+        model, load_seconds, load_bytes = measure_load(path)
+        p50, p99 = measure_latency(model, features)
+        throughput = measure_throughput(model, features)
+        scores, refit = measure_accuracy(model, features, labels, encoder)
+        results["models"][name] = {
+            "file": os.path.basename(path), "file_bytes": os.path.getsize(path),
+            "load_seconds": load_seconds, "load_bytes": load_bytes, "p50_ms": p50, "p99_ms": p99,
+            "throughput": throughput, "accuracy": float(np.mean(scores)), "accuracy_std": float(np.std(scores)),
+            "fold_accuracy": scores, "refit": refit,
+        }
+        print(f"{name:<26}{os.path.getsize(path) / 1024:9.0f}{load_seconds * 1000:9.2f}{load_bytes / 2**20:9.1f}"
+              f"{p50:8.3f}{p99:8.3f}" + "".join(f"{throughput[str(size)]:13,.0f}" for size in BATCH_SIZES)
+              + f"{np.mean(scores):9.4f}±{np.std(scores):.3f}" + ("" if refit else " (not refit)"))
+
+    if not args.baseline:
+        return
+    if args.update or not os.path.exists(args.baseline):
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved the baseline to {args.baseline}")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline["environment"] != results["environment"]:
+        print(f"Note: the baseline was measured on {baseline['environment']}; timings may not be comparable")
+    found = regressions(results, baseline, args.tolerance)
+    for message in found:
+        print(f"REGRESSION {message}")
+    print(f"{len(found)} regressions against the baseline from {baseline['date']}")
+    sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Compare load/save time and file size of the data file formats.
+
+Builds a synthetic communities file (members and chat messages) and farmers
+file, then saves and loads each through every available codec, next to the
+old path (stdlib json with indent=2).
+
+    python benchmarks/bench_data_codecs.py --communities 200 --members 200 --messages 500
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from data_codecs import CODECS, msgpack, orjson  # noqa: E402
+from storage import load_data, save_data  # noqa: E402
+
+
+def make_data(rng, communities, members, messages):
+    start = datetime(2024, 1, 1)
+    farmers = [{
+        "id": str(uuid.uuid4()), "name": f"Farmer {i}", "phone": f"98{i:08d}",
+        "location": f"Village {rng.randrange(500)}", "latitude": rng.uniform(8, 35),
+        "longitude": rng.uniform(68, 97), "land_size": round(rng.uniform(0.5, 20), 1),
+        "crops": rng.sample(["rice", "wheat", "maize", "cotton", "jute", "coffee"], 2),
+        "registered_at": (start + timedelta(minutes=i)).isoformat()
+    } for i in range(communities * members // 4)]
+    data = [{
+        "id": str(uuid.uuid4()), "name": f"Community {c}", "vendor_id": str(uuid.uuid4()),
+        "vendor_name": f"Vendor {c}", "location": f"Town {c}",
+        "members": [rng.choice(farmers)["id"] for _ in range(members)],
+        "messages": [{
+            "id": str(uuid.uuid4()), "user_id": rng.choice(farmers)["id"], "user_name": "Farmer",
+            "user_type": "farmer", "content": "Prices for wheat are up this week, anyone selling?",
+            "timestamp": (start + timedelta(minutes=m)).isoformat()
+        } for m in range(messages)]
+    } for c in range(communities)]
+    return {"communities.json": data, "farmers.json": farmers}
+
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000
+
+
+def stdlib_save(data, path):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+
+def stdlib_load(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--communities", type=int, default=200)
+    parser.add_argument("--members", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    files = make_data(random.Random(3), args.communities, args.members, args.messages)
+    print(f"orjson: {'yes' if orjson else 'no'}, msgpack: {'yes' if msgpack else 'no'}")
+    print(f"{'file':<18}{'format':<16}{'size (MB)':>10}{'save (ms)':>11}{'load (ms)':>11}")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        for name, data in files.items():
+            path = os.path.join(data_dir, name)
+            save = median_ms(lambda: stdlib_save(data, path), args.repeat)
+            load = median_ms(lambda: stdlib_load(path), args.repeat)
+            print(f"{name:<18}{'stdlib json':<16}{os.path.getsize(path) / 1e6:10.1f}{save:11.1f}{load:11.1f}")
+            for codec in CODECS.values():
+                if codec.name == "msgpack" and msgpack is None:
+                    continue
+                os.remove(path)
+                save = median_ms(lambda: save_data(data, path, codec=codec), args.repeat)
+                load = median_ms(lambda: load_data(path), args.repeat)
+                assert load_data(path) == data
+                print(f"{name:<18}{codec.name:<16}{os.path.getsize(path) / 1e6:10.1f}{save:11.1f}{load:11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Measure what the drift monitor adds to a crop prediction.
+
+Times observing one input, against predicting it with a Random Forest trained
+the way the notebook does, then how long a drift check (adding the counts to
+the shared totals and scoring them) takes, and checks that the monitor's
+memory stays the same however many inputs it has seen.
+
+    python benchmarks/bench_drift_monitor.py --calls 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from crop_recommendations import FEATURES  # noqa: E402
+from drift_monitor import DriftMonitor, Reference  # noqa: E402
+
+DATASET = os.path.join(ROOT, "Crop_recommendation.csv")
+
+
+def per_call_us(fn, calls):
+    t0 = time.perf_counter()
+    for i in range(calls):
+        fn(i)
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def traced_bytes(fn):
+    tracemalloc.start()
+    fn()
+    current = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=100000)
+    parser.add_argument("--predictions", type=int, default=500)
+    args = parser.parse_args()
+
+    data = pd.read_csv(DATASET)
+    rows = data[FEATURES].to_numpy().tolist()
+    labels = data["label"].tolist()
+    started = time.perf_counter()
+    reference = Reference.from_csv(DATASET, FEATURES)
+    reference_ms = (time.perf_counter() - started) * 1000
+
+    model = RandomForestClassifier(n_estimators=20, random_state=0).fit(data[FEATURES].to_numpy(), labels)
+    predict_us = per_call_us(lambda i: model.predict(np.array(rows[i % len(rows)]).reshape(1, -1)), args.predictions)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        try:
+            monitor = DriftMonitor(reference)
+            observe_us = per_call_us(lambda i: monitor.observe(rows[i % len(rows)], labels[i % len(labels)]),
+                                     args.calls)
+            junk_us = per_call_us(lambda i: monitor.observe([0.0] * len(FEATURES), "rice"), args.calls)
+            started = time.perf_counter()
+            report = monitor.check()
+            check_ms = (time.perf_counter() - started) * 1000
+
+            def observe(count):
+                return lambda: [monitor.observe(rows[i % len(rows)], labels[i % len(labels)]) for i in range(count)]
+            small = traced_bytes(observe(1000))
+            large = traced_bytes(observe(args.calls))
+        finally:
+            os.chdir(cwd)
+
+    print(f"reference from the training data: {reference_ms:.1f} ms")
+    print(f"{'observe (us)':>14}{'junk (us)':>11}{'predict (us)':>14}{'share of a prediction':>23}")
+    print(f"{observe_us:14.1f}{junk_us:11.1f}{predict_us:14.1f}{observe_us / predict_us:23.2%}")
+    print(f"drift check: {check_ms:.2f} ms; memory left after 1000 inputs {small} bytes, "
+          f"after {args.calls} {large} bytes")
+    print(f"{report['inputs']} inputs, {report['junk_share']:.0%} junk, largest feature PSI "
+          f"{max(feature['psi'] for feature in report['features'].values()):.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Measure event-bus fan-out latency and throughput with many subscribers.
+
+Each subscriber is a thread blocking on its subscription, the way a session
+waits for chat deltas. Latency is publish -> receive per delivered event.
+
+    python benchmarks/bench_event_bus.py --subscribers 100 300 500 --events 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from event_bus import EventBus, community_topic  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def bench(subscriber_count, event_count):
+    bus = EventBus()
+    topic = community_topic("bench")
+    subscriptions = [bus.subscribe(topic, max_queue=event_count) for _ in range(subscriber_count)]
+    latencies = [[] for _ in subscriptions]
+
+    def consume(subscription, sink):
+        for _ in range(event_count):
+            event = subscription.get(timeout=30)
+            if event is None:
+                return
+            sink.append(time.time() - event["published_at"])
+
+    threads = [threading.Thread(target=consume, args=(sub, sink)) for sub, sink in zip(subscriptions, latencies)]
+    for thread in threads:
+        thread.start()
+
+    t0 = time.perf_counter()
+    for i in range(event_count):
+        bus.publish(topic, "message_added", message={"id": str(i), "content": "bench"})
+    publish_s = time.perf_counter() - t0
+    for thread in threads:
+        thread.join()
+    total_s = time.perf_counter() - t0
+
+    all_latencies = [lat for sink in latencies for lat in sink]
+    return {
+        "subscribers": subscriber_count,
+        "delivered": len(all_latencies),
+        "publish_rate": event_count / publish_s,
+        "delivery_rate": len(all_latencies) / total_s,
+        "p50_ms": statistics.median(all_latencies) * 1000,
+        "p99_ms": percentile(all_latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--subscribers", type=int, nargs="+", default=[100, 300, 500])
+    parser.add_argument("--events", type=int, default=2000)
+    args = parser.parse_args()
+
+    print(f"{'subscribers':>11} {'delivered':>10} {'publish/s':>11} {'deliveries/s':>13} {'p50 (ms)':>9} {'p99 (ms)':>9}")
+    for n in args.subscribers:
+        r = bench(n, args.events)
+        print(f"{r['subscribers']:>11} {r['delivered']:>10} {r['publish_rate']:>11.0f} {r['delivery_rate']:>13.0f} "
+              f"{r['p50_ms']:>9.2f} {r['p99_ms']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Compare write latency of snapshot and log persistence as a data file grows.
+
+For each size, fills a farmers file in a temporary directory, then times
+registering one more farmer with record_changes in both modes, loading the
+file with a log tail, and compacting that tail.
+
+    python benchmarks/bench_event_log.py --sizes 1000 10000 100000 --writes 50
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import storage  # noqa: E402
+from event_log import insert_change  # noqa: E402
+
+
+def make_farmer(rng):
+    return {"id": str(uuid.uuid4()), "name": f"Farmer {rng.randrange(10 ** 6)}",
+            "latitude": rng.uniform(8, 35), "longitude": rng.uniform(68, 97),
+            "created_at": "2025-01-01T00:00:00"}
+
+
+def median_write_ms(path, rng, writes):
+    times = []
+    for _ in range(writes):
+        change = insert_change(make_farmer(rng))
+        t0 = time.perf_counter()
+        storage.record_changes(path, [change])
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--writes", type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    print(f"{'farmers':>8}{'snapshot write (ms)':>21}{'log write (ms)':>16}{'load (ms)':>11}{'compact (ms)':>14}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as data_dir:
+            path = os.path.join(data_dir, "farmers.json")
+            storage.save_data([make_farmer(rng) for _ in range(size)], path)
+
+            storage.PERSISTENCE = "snapshot"
+            snapshot_ms = median_write_ms(path, rng, min(args.writes, 10))
+            storage.PERSISTENCE = "log"
+            log_ms = median_write_ms(path, rng, args.writes)
+
+            t0 = time.perf_counter()
+            storage.load_data(path)
+            load_ms = (time.perf_counter() - t0) * 1000
+            t0 = time.perf_counter()
+            storage.compact_log(path)
+            compact_ms = (time.perf_counter() - t0) * 1000
+        print(f"{size:>8}{snapshot_ms:21.2f}{log_ms:16.3f}{load_ms:11.1f}{compact_ms:14.1f}")
+
+
+if __name__ == "__main__":
+    main()
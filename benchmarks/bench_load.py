@@ -0,0 +1,214 @@
+"""Drive the services with concurrent traffic and report throughput, tail latency and lost updates.
+
+Worker processes call register_user, add_message_to_community,
+respond_to_poll, add_market_price and like_farming_tip in a weighted mix, each
+at its share of the target rate, and time every call. Afterwards each write
+the workers made is looked up in storage: a write that is missing, or a poll
+whose running total no longer matches its responses, is a lost update.
+
+Point it at a data directory made by synthetic_data.py (it generates a small
+one if the directory is empty):
+
+    python benchmarks/bench_load.py --data-dir loadtest --workers 4 --rate 200 --duration 30
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import time
+import uuid
+from collections import defaultdict
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from price_store import PriceStore  # noqa: E402
+from services.polls import load_polls  # noqa: E402
+from storage import COMMUNITIES_FILES, FARMERS_FILE, FARMING_TIPS_FILE, VENDORS_FILE, load_data, load_sharded  # noqa: E402
+from synthetic_data import DISTRICTS, PRODUCTS, generate  # noqa: E402
+from tips_index import TIP_LIKES_FILE, TipsIndex  # noqa: E402
+
+OPERATIONS = ("register", "message", "respond", "price", "like")
+
+# Targets sampled for the workers from each kind of record
+SAMPLE_SIZE = 500
+
+
+def parse_mix(text):
+    weights = dict.fromkeys(OPERATIONS, 0.0)
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op not in weights:
+            raise argparse.ArgumentTypeError(f"unknown operation {op}; expected one of {', '.join(OPERATIONS)}")
+        weights[op] = float(weight)
+    return weights
+
+
+def worker(index, data_dir, targets, mix, rate, duration, seed):
+    """Run the mix at `rate` calls per second for `duration` seconds; returns latencies and expected writes"""
+    os.chdir(data_dir)
+    # Imported here so each process builds its own indexes and workers
+    from services.communities import add_message_to_community
+    from services.polls import respond_to_poll
+    from services.prices import add_market_price
+    from services.tips import like_farming_tip
+    from services.users import register_user
+
+    rng = random.Random(seed)
+    ops = [op for op in OPERATIONS if mix[op] > 0]
+    weights = [mix[op] for op in ops]
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    expected = defaultdict(list)
+    late = 0
+
+    def call(op, n):
+        if op == "register":
+            district = rng.choice(DISTRICTS)
+            user_id = register_user("farmer", f"Load farmer {index}-{n}", district[1] + rng.gauss(0, 0.3),
+                                    district[2] + rng.gauss(0, 0.3))
+            expected[op].append(user_id)
+        elif op == "message":
+            community_id, member = rng.choice(targets["communities"])
+            message_id = str(uuid.uuid4())
+            add_message_to_community(community_id, member["id"], member["name"], member["type"],
+                                     f"Load test message {index}-{n}", message_id=message_id)
+            expected[op].append((community_id, message_id))
+        elif op == "respond":
+            poll_id = rng.choice(targets["polls"])
+            farmer_id = f"load-{index}-{n}"
+            quantity = rng.randint(1, 20)
+            if respond_to_poll(poll_id, farmer_id, f"Load farmer {index}-{n}", quantity):
+                expected[op].append((poll_id, farmer_id, quantity))
+        elif op == "price":
+            vendor = rng.choice(targets["vendors"])
+            product, unit, typical = rng.choice(PRODUCTS)
+            price_id, _ = add_market_price(vendor["id"], vendor["name"], product,
+                                           round(typical * rng.uniform(0.9, 1.1), 2), unit, rng.choice(DISTRICTS)[0])
+            if price_id:
+                expected[op].append(price_id)
+        elif op == "like":
+            tip_id = rng.choice(targets["tips"])
+            user_id = f"load-{index}-{n}"
+            if like_farming_tip(tip_id, user_id):
+                expected[op].append((tip_id, user_id))
+
+    interval = 1.0 / rate
+    started = time.perf_counter()
+    next_at = started
+    n = 0
+    while next_at < started + duration:
+        now = time.perf_counter()
+        if next_at > now:
+            time.sleep(next_at - now)
+        elif now - next_at > interval:
+            late += 1
+        op = rng.choices(ops, weights)[0]
+        t0 = time.perf_counter()
+        try:
+            call(op, n)
+        except Exception as e:
+            errors[op] += 1
+            print(f"worker {index}: {op} failed: {e}", file=sys.stderr)
+        latencies[op].append(time.perf_counter() - t0)
+        n += 1
+        next_at += interval
+    return {"latencies": dict(latencies), "errors": dict(errors), "expected": dict(expected), "late": late,
+            "elapsed": time.perf_counter() - started}
+
+
+def sample_targets(rng):
+    communities = [(c["id"], rng.choice(c["members"])) for c in load_sharded(COMMUNITIES_FILES) if c["members"]]
+    polls = [p["id"] for p in load_polls() if p["status"] == "open"]
+    tips = [t["id"] for t in load_data(FARMING_TIPS_FILE)]
+    vendors = [{"id": v["id"], "name": v["name"]} for v in load_data(VENDORS_FILE)]
+    return {name: rng.sample(items, min(len(items), SAMPLE_SIZE))
+            for name, items in (("communities", communities), ("polls", polls), ("tips", tips), ("vendors", vendors))}
+
+
+def count_lost(expected):
+    """How many of the expected writes are not in storage, per operation"""
+    lost = {}
+    if expected["register"]:
+        farmer_ids = {f["id"] for f in load_data(FARMERS_FILE)}
+        lost["register"] = sum(user_id not in farmer_ids for user_id in expected["register"])
+    if expected["message"]:
+        messages = {(c["id"], m["id"]) for c in load_sharded(COMMUNITIES_FILES) for m in c["messages"]}
+        lost["message"] = sum(key not in messages for key in expected["message"])
+    if expected["respond"]:
+        polls = {p["id"]: p for p in load_polls()}
+        lost["respond"] = sum(
+            polls.get(poll_id, {}).get("responses", {}).get(farmer_id, {}).get("quantity") != quantity
+            for poll_id, farmer_id, quantity in expected["respond"])
+        # A lost update to the running total shows as a total that disagrees with the responses
+        lost["respond"] += sum(p["total_committed"] != sum(r["quantity"] for r in p["responses"].values())
+                               for p in polls.values())
+    if expected["price"]:
+        price_ids = set(PriceStore().scan(columns=("id",))["id"].tolist())
+        lost["price"] = sum(price_id not in price_ids for price_id in expected["price"])
+    if expected["like"]:
+        tips = TipsIndex(FARMING_TIPS_FILE, lambda: load_data(FARMING_TIPS_FILE), TIP_LIKES_FILE)
+        lost["like"] = sum(not tips.has_liked(tip_id, user_id) for tip_id, user_id in expected["like"])
+    return lost
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data-dir", default="loadtest")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=100, help="target calls per second, over all workers")
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("register=1,message=5,respond=3,price=2,like=5"),
+                        help="relative weight of each operation")
+    parser.add_argument("--seed", type=int, default=11)
+    args = parser.parse_args()
+
+    os.makedirs(args.data_dir, exist_ok=True)
+    data_dir = os.path.abspath(args.data_dir)
+    os.chdir(data_dir)
+    if not os.path.exists(FARMERS_FILE):
+        print("Generating a small data set...")
+        generate(farmers=5000, vendors=100, messages=20000, polls=500, prices=20000, tips=500, likes=5000)
+
+    targets = sample_targets(random.Random(args.seed))
+    # Fresh interpreters, so no worker inherits another process's indexes or threads
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.workers) as pool:
+        results = pool.starmap(worker, [(i, data_dir, targets, args.mix, args.rate / args.workers, args.duration,
+                                         args.seed * 1000 + i) for i in range(args.workers)])
+
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    expected = defaultdict(list)
+    for result in results:
+        for op, values in result["latencies"].items():
+            latencies[op].extend(values)
+        for op, count in result["errors"].items():
+            errors[op] += count
+        for op, values in result["expected"].items():
+            expected[op].extend(values)
+    elapsed = max(result["elapsed"] for result in results)
+    lost = count_lost(expected)
+
+    print(f"{args.workers} workers, target {args.rate:g} calls/s for {args.duration:g}s "
+          f"({os.environ.get('DATA_PERSISTENCE', 'snapshot')} persistence)")
+    print(f"{'operation':<10}{'calls':>8}{'calls/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'errors':>8}{'lost':>6}")
+    total = 0
+    for op in OPERATIONS:
+        values = np.array(latencies.get(op, [])) * 1000
+        if not len(values):
+            continue
+        total += len(values)
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        print(f"{op:<10}{len(values):8d}{len(values) / elapsed:9.1f}{p50:9.1f}{p95:9.1f}{p99:9.1f}{values.max():9.1f}"
+              f"{errors[op]:8d}{lost.get(op, 0):6d}")
+    late = sum(result["late"] for result in results)
+    print(f"achieved {total / elapsed:.1f} calls/s; {late} calls started over one interval late")
+
+
+if __name__ == "__main__":
+    main()
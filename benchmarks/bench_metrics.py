@@ -0,0 +1,73 @@
+"""Measure what the metrics cost with APP_METRICS off and on.
+
+Times a histogram observation and a timer, alone and around a small
+load_data, with metrics switched off and on, then how long an export of the
+resulting metrics takes in each format.
+
+    python benchmarks/bench_metrics.py --calls 200000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import metrics  # noqa: E402
+from storage import FARMERS_FILE, load_data, save_data  # noqa: E402
+
+BENCH_SECONDS = metrics.histogram("bench_seconds", "Benchmark timings")
+
+
+def per_call_ns(fn, calls):
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - t0) / calls * 1e9
+
+
+def timed():
+    with BENCH_SECONDS.time(file=FARMERS_FILE):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200000)
+    parser.add_argument("--loads", type=int, default=5000)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        try:
+            save_data([{"id": str(i), "name": f"Farmer {i}"} for i in range(10)], FARMERS_FILE)
+            results = {}
+            for enabled in (False, True):
+                metrics.ENABLED = enabled
+                results[enabled] = (
+                    per_call_ns(lambda: BENCH_SECONDS.observe(0.001, file=FARMERS_FILE), args.calls),
+                    per_call_ns(timed, args.calls),
+                    per_call_ns(lambda: load_data(FARMERS_FILE), args.loads),
+                )
+
+            t0 = time.perf_counter()
+            text = metrics.render_prometheus()
+            prometheus_ms = (time.perf_counter() - t0) * 1000
+            t0 = time.perf_counter()
+            line = json.dumps(metrics.snapshot())
+            json_ms = (time.perf_counter() - t0) * 1000
+        finally:
+            os.chdir(cwd)
+
+    print(f"{'':<22}{'observe (ns)':>14}{'timer (ns)':>12}{'load_data (us)':>16}")
+    for enabled, (observe_ns, timer_ns, load_ns) in results.items():
+        print(f"{'metrics on' if enabled else 'metrics off':<22}{observe_ns:14.0f}{timer_ns:12.0f}{load_ns / 1000:16.1f}")
+    print(f"export: Prometheus text {prometheus_ms:.2f} ms ({len(text)} bytes), JSON {json_ms:.2f} ms ({len(line)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""Compare the "Active Commitments" lookup with and without the poll index.
+
+Writes a synthetic polls.json / communities.json to a temporary directory,
+then times the old load-and-scan path against PollIndex lookups.
+
+    python benchmarks/bench_poll_index.py --polls 100000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from community_index import CommunityIndex  # noqa: E402
+from poll_index import PollIndex  # noqa: E402
+
+
+def make_data(rng, poll_count, community_count, farmer_count, responses_per_poll):
+    communities = [{"id": str(uuid.uuid4()), "name": f"Vendor {i}'s Community", "vendor_id": f"v{i}",
+                    "vendor_name": f"Vendor {i}", "members": [], "messages": []}
+                   for i in range(community_count)]
+    farmer_ids = [str(uuid.uuid4()) for _ in range(farmer_count)]
+    polls = []
+    for i in range(poll_count):
+        community = rng.choice(communities)
+        responders = rng.sample(farmer_ids, rng.randint(0, responses_per_poll * 2))
+        responses = {f: {"farmer_id": f, "farmer_name": "F", "quantity": rng.randint(1, 20),
+                         "reference_code": "X", "created_at": "2025-01-01T00:00:00"} for f in responders}
+        polls.append({
+            "id": str(uuid.uuid4()), "community_id": community["id"], "vendor_id": community["vendor_id"],
+            "vendor_name": community["vendor_name"], "product": "Wheat", "quantity": 100, "unit": "kg",
+            "deadline": "2030-01-01", "status": rng.choice(["open", "open", "fulfilled", "closed"]),
+            "created_at": f"2025-01-01T00:00:{i % 60:02d}.{i:06d}", "responses": responses,
+            "total_committed": sum(r["quantity"] for r in responses.values())
+        })
+    return communities, polls, farmer_ids
+
+
+def legacy_active_commitments(polls_file, communities_file, farmer_id):
+    """The pre-index path: load both files, scan every poll and look up names with next()"""
+    with open(polls_file) as f:
+        polls = json.load(f)
+    with open(communities_file) as f:
+        communities = json.load(f)
+    rows = []
+    for poll in polls:
+        if poll["status"] != "closed" and farmer_id in poll["responses"]:
+            community = next((c for c in communities if c["id"] == poll["community_id"]), None)
+            rows.append((poll["id"], community["name"] if community else "Unknown Community"))
+    return rows
+
+
+def indexed_active_commitments(index, community_index, farmer_id):
+    rows = []
+    for poll in index.for_farmer(farmer_id):
+        if poll["status"] != "closed":
+            community = community_index.get(poll["community_id"])
+            rows.append((poll["id"], community["name"] if community else "Unknown Community"))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--polls", type=int, default=100000)
+    parser.add_argument("--communities", type=int, default=2000)
+    parser.add_argument("--farmers", type=int, default=20000)
+    parser.add_argument("--responses", type=int, default=3, help="average responses per poll")
+    parser.add_argument("--lookups", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(11)
+    communities, polls, farmer_ids = make_data(rng, args.polls, args.communities, args.farmers, args.responses)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        polls_file = os.path.join(data_dir, "polls.json")
+        communities_file = os.path.join(data_dir, "communities.json")
+        with open(polls_file, "w") as f:
+            json.dump(polls, f)
+        with open(communities_file, "w") as f:
+            json.dump(communities, f)
+        del polls
+
+        def load(file_path):
+            with open(file_path) as f:
+                return json.load(f)
+
+        t0 = time.perf_counter()
+        index = PollIndex([polls_file], load)
+        community_index = CommunityIndex(communities_file, lambda: load(communities_file))
+        build_s = time.perf_counter() - t0
+
+        sample = rng.sample(farmer_ids, args.lookups)
+        legacy = []
+        for farmer_id in sample[:max(1, args.lookups // 20)]:
+            t = time.perf_counter()
+            legacy_rows = legacy_active_commitments(polls_file, communities_file, farmer_id)
+            legacy.append(time.perf_counter() - t)
+        indexed = []
+        results = []
+        for farmer_id in sample:
+            t = time.perf_counter()
+            rows = indexed_active_commitments(index, community_index, farmer_id)
+            indexed.append(time.perf_counter() - t)
+            results.append(len(rows))
+        assert sorted(indexed_active_commitments(index, community_index, sample[-1])) == sorted(
+            legacy_active_commitments(polls_file, communities_file, sample[-1]))
+
+    print(f"{args.polls} polls, {args.communities} communities, {args.farmers} farmers")
+    print(f"index build: {build_s:.2f}s (once per server process)")
+    print(f"legacy page lookup : median {statistics.median(legacy) * 1000:9.2f} ms "
+          f"({len(legacy_rows)} rows last)")
+    print(f"indexed page lookup: median {statistics.median(indexed) * 1000:9.3f} ms, "
+          f"max {max(indexed) * 1000:.3f} ms (avg {statistics.mean(results):.1f} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Time price rollup backfill, incremental updates and trend reads.
+
+Loads synthetic prices for one product into a PriceStore in a temporary
+directory, then compares reading precomputed daily rollups with the old
+trend path (parse every timestamp with fromisoformat, sort, chart raw points).
+
+    python benchmarks/bench_price_rollups.py --prices 500000 --locations 20
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from price_rollups import PriceRollups  # noqa: E402
+from price_store import PriceStore  # noqa: E402
+
+
+def make_prices(rng, count, locations, start):
+    step = timedelta(days=730) / count
+    return [{
+        "id": str(uuid.uuid4()),
+        "vendor_id": "bench",
+        "vendor_name": "Bench Vendor",
+        "product": "Wheat",
+        "price": round(rng.uniform(20, 40), 2),
+        "unit": rng.choice(["kg", "quintal"]),
+        "location": f"Market {rng.randrange(locations)}",
+        "notes": "",
+        "timestamp": (start + step * i).isoformat()
+    } for i in range(count)]
+
+
+def legacy_trend(prices):
+    history = [{"date": datetime.fromisoformat(p["timestamp"]).strftime("%Y-%m-%d"), "price": p["price"]}
+               for p in prices]
+    return sorted(history, key=lambda x: x["date"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prices", type=int, default=200000)
+    parser.add_argument("--locations", type=int, default=20)
+    parser.add_argument("--adds", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(9)
+    start = datetime(2023, 1, 1)
+    prices = make_prices(rng, args.prices, args.locations, start)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        store = PriceStore(os.path.join(data_dir, "price_store"))
+        store.extend(prices)
+        rollups = PriceRollups(store)
+
+        t0 = time.perf_counter()
+        rollups.series("Wheat")
+        backfill_s = time.perf_counter() - t0
+
+        new_prices = make_prices(rng, args.adds, args.locations, start + timedelta(days=731))
+        t0 = time.perf_counter()
+        for entry in new_prices:
+            with store.lock():
+                version_before = store.version(entry["product"], entry["location"])
+                store.append(entry)
+                rollups.add(entry, version_before, store.version(entry["product"], entry["location"]))
+        add_ms = (time.perf_counter() - t0) / args.adds * 1000
+
+        t0 = time.perf_counter()
+        series = rollups.series("Wheat", period="day")
+        read_ms = (time.perf_counter() - t0) * 1000
+
+        t0 = time.perf_counter()
+        legacy_trend(store.query(product="Wheat"))
+        legacy_ms = (time.perf_counter() - t0) * 1000
+
+    points = sum(len(s["start"]) for s in series)
+    print(f"{args.prices} prices for one product over {args.locations} locations x 2 units")
+    print(f"vectorized backfill: {backfill_s:.2f}s")
+    print(f"append + incremental rollup update: {add_ms:.2f} ms per price")
+    print(f"trend read from rollups: {read_ms:.1f} ms ({len(series)} series, {points} daily points)")
+    print(f"old trend path (parse + sort raw points): {legacy_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
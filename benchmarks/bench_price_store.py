@@ -0,0 +1,113 @@
+"""Compare market price queries on the columnar price store with the old JSON file.
+
+Generates synthetic prices, writes them both as a market_prices.json list and
+into a PriceStore in a temporary directory, then times the page queries.
+
+    python benchmarks/bench_price_store.py --prices 500000 --products 60 --locations 40
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from price_store import PriceStore  # noqa: E402
+
+
+def make_prices(rng, count, products, locations, vendors):
+    start = datetime(2023, 1, 1)
+    step = timedelta(days=730) / count
+    return [{
+        "id": str(uuid.uuid4()),
+        "vendor_id": f"vendor-{rng.randrange(vendors)}",
+        "vendor_name": "Bench Vendor",
+        "product": f"Product {rng.randrange(products)}",
+        "price": round(rng.uniform(5, 500), 2),
+        "unit": "kg",
+        "location": f"Market {rng.randrange(locations)}",
+        "notes": "",
+        "timestamp": (start + step * i).isoformat()
+    } for i in range(count)]
+
+
+def legacy_latest(path, limit):
+    with open(path) as f:
+        prices = json.load(f)
+    return sorted(prices, key=lambda x: x["timestamp"], reverse=True)[:limit]
+
+
+def legacy_product(path, product):
+    with open(path) as f:
+        prices = json.load(f)
+    return sorted([p for p in prices if p["product"].lower() == product.lower()],
+                  key=lambda x: x["timestamp"], reverse=True)
+
+
+def timed(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prices", type=int, default=200000)
+    parser.add_argument("--products", type=int, default=60)
+    parser.add_argument("--locations", type=int, default=40)
+    parser.add_argument("--vendors", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    prices = make_prices(rng, args.prices, args.products, args.locations, args.vendors)
+    product = "Product 7"
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        legacy_file = os.path.join(data_dir, "market_prices.json")
+        with open(legacy_file, "w") as f:
+            json.dump(prices, f)
+
+        store = PriceStore(os.path.join(data_dir, "price_store"))
+        t0 = time.perf_counter()
+        store.extend(prices)
+        load_s = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for entry in prices[-200:]:
+            store.append(dict(entry, id=str(uuid.uuid4())))
+        append_ms = (time.perf_counter() - t0) / 200 * 1000
+
+        # A fresh store has cold caches, like a newly started server process
+        cold_ms, _ = timed(lambda: PriceStore(store.root).latest(20), 1)
+        rows = [
+            ("latest 20", timed(lambda: legacy_latest(legacy_file, 20), args.repeat)[0],
+             timed(lambda: store.latest(20), args.repeat)[0]),
+            ("product, all rows", timed(lambda: legacy_product(legacy_file, product), args.repeat)[0],
+             timed(lambda: store.query(product=product), args.repeat)[0]),
+            ("product, latest 20", None, timed(lambda: store.query(product=product, limit=20), args.repeat)[0]),
+            ("vendor, all rows", None, timed(lambda: store.query(vendor_id="vendor-3"), args.repeat)[0]),
+            ("product trend, 90 days", None,
+             timed(lambda: store.scan(product, start="2024-06-01", end="2024-08-30"), args.repeat)[0]),
+        ]
+
+    print(f"{args.prices} prices, {args.products} products x {args.locations} locations")
+    print(f"bulk load {load_s:.1f}s, single append {append_ms:.2f} ms, cold latest-20 {cold_ms:.1f} ms")
+    print(f"{'query':<24}{'json (ms)':>12}{'store (ms)':>12}")
+    for name, legacy_ms, store_ms in rows:
+        legacy = f"{legacy_ms:12.1f}" if legacy_ms is not None else f"{'-':>12}"
+        print(f"{name:<24}{legacy}{store_ms:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Measure price validator throughput and detection quality on synthetic events.
+
+Streams prices for many (product, unit, location) keys, with a small share of
+injected unit mistakes (x100 or /100) and typos (x10), through
+PriceValidator.validate, then re-scores the same events in batch mode.
+
+    python benchmarks/bench_price_validator.py --events 2000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from price_validator import FLAGGED, OK, QUARANTINED, PriceValidator  # noqa: E402
+
+CHUNK = 100000
+
+
+def make_chunk(rng, size, products, locations, error_rate):
+    """Column arrays for one chunk of events; `bad` marks injected errors"""
+    product = rng.integers(products, size=size)
+    location = rng.integers(locations, size=size)
+    unit = rng.integers(2, size=size)
+    # Each product has its own typical price; quintal prices are 100x kg prices
+    base = 10 + (product * 7919 % 90) + (location % 5)
+    price = base * np.where(unit == 1, 100, 1) * rng.lognormal(0, 0.08, size=size)
+    bad = rng.random(size) < error_rate
+    factor = rng.choice([100.0, 0.01, 10.0], size=size)
+    price = np.where(bad, price * factor, price)
+    return {
+        "product": np.char.add("Product ", product.astype(str)),
+        "unit": np.where(unit == 1, "quintal", "kg"),
+        "location": np.char.add("Market ", location.astype(str)),
+        "price": np.round(price, 2),
+        "bad": bad,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--events", type=int, default=2000000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--locations", type=int, default=50)
+    parser.add_argument("--error-rate", type=float, default=0.005)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(17)
+    validator = PriceValidator()
+    counts = {OK: 0, FLAGGED: 0, QUARANTINED: 0}
+    caught = injected = false_alarms = 0
+    elapsed = 0.0
+    sample = None
+
+    for start in range(0, args.events, CHUNK):
+        chunk = make_chunk(rng, min(CHUNK, args.events - start), args.products, args.locations, args.error_rate)
+        entries = [{"product": p, "unit": u, "location": loc, "price": x}
+                   for p, u, loc, x in zip(chunk["product"].tolist(), chunk["unit"].tolist(),
+                                           chunk["location"].tolist(), chunk["price"].tolist())]
+        t0 = time.perf_counter()
+        statuses = [validator.validate(entry)["status"] for entry in entries]
+        elapsed += time.perf_counter() - t0
+
+        for status, bad in zip(statuses, chunk["bad"].tolist()):
+            counts[status] += 1
+            injected += bad
+            caught += bad and status != OK
+            false_alarms += (not bad) and status == QUARANTINED
+        if sample is None:
+            sample = chunk
+
+    print(f"{args.events} events, {args.products} products x {args.locations} locations x 2 units")
+    print(f"validate: {args.events / elapsed:,.0f} events/s ({elapsed / args.events * 1e6:.2f} us/event)")
+    print(f"ok {counts[OK]}, flagged {counts[FLAGGED]}, quarantined {counts[QUARANTINED]}")
+    print(f"injected errors caught: {caught}/{injected} ({caught / max(1, injected):.1%}); "
+          f"good prices quarantined: {false_alarms} ({false_alarms / args.events:.3%})")
+
+    t0 = time.perf_counter()
+    scores, statuses = validator.rescore(sample)
+    rescore_s = time.perf_counter() - t0
+    print(f"batch re-score: {len(scores) / rescore_s:,.0f} events/s over {len(scores)} stored prices")
+
+
+if __name__ == "__main__":
+    main()
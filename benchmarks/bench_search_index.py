@@ -0,0 +1,87 @@
+"""Measure search index build rate, incremental add cost and query latency.
+
+Generates transliterated Hinglish-style chat messages spread over many
+communities, indexes them, and times ranked, paginated queries scoped to a
+single community.
+
+    python benchmarks/bench_search_index.py --messages 1000000 --communities 500
+"""
+import argparse
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from search_index import MESSAGES, SearchIndex  # noqa: E402
+
+VOCABULARY = (
+    "gehun gehoon chawal chaawal dhan dhaan bajra baajra jowar makka pyaz pyaaz aloo tamatar "
+    "mandi bhav bhaav rate quintal kilo kg ton delivery truck kal aaj parso subah shaam "
+    "paani pani barish baarish khad urea dap beej beejh keeda dawai spray kheti kisan kisaan "
+    "wheat rice onion potato tomato price harvest storage transport payment advance order "
+    "kitna chahiye milega bhejo bhejenge taiyar ready pakka confirm hua nahi haan theek"
+).split()
+
+
+def make_message(rng, i):
+    words = rng.choices(VOCABULARY, k=rng.randint(4, 16))
+    return {"id": uuid.UUID(int=rng.getrandbits(128)).hex, "content": " ".join(words) + f" {i % 1000}"}
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--communities", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    community_ids = [str(uuid.uuid4()) for _ in range(args.communities)]
+    index = SearchIndex()
+
+    t0 = time.perf_counter()
+    for i in range(args.messages):
+        index.add_message(community_ids[i % len(community_ids)], make_message(rng, i))
+    build_s = time.perf_counter() - t0
+    rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"indexed {args.messages} messages in {build_s:.1f}s "
+          f"({args.messages / build_s:.0f} msg/s), peak RSS {rss_mb:.0f} MB")
+
+    add_times = []
+    for i in range(1000):
+        message = make_message(rng, i)
+        t = time.perf_counter()
+        index.add_message(community_ids[0], message)
+        add_times.append(time.perf_counter() - t)
+    print(f"incremental add: p50 {statistics.median(add_times) * 1e6:.1f} us, "
+          f"p99 {percentile(add_times, 99) * 1e6:.1f} us")
+
+    print(f"{'query':<28} {'page':>4} {'p50 (ms)':>9} {'p99 (ms)':>9} {'avg hits':>9}")
+    for label, words in [("one term", 1), ("two terms", 2), ("four terms", 4)]:
+        for page in (1, 5):
+            times, hits = [], []
+            for _ in range(args.queries):
+                query = " ".join(rng.sample(VOCABULARY, words))
+                community_id = rng.choice(community_ids)
+                t = time.perf_counter()
+                _, total = index.search(MESSAGES, query, scope=community_id, page=page)
+                times.append(time.perf_counter() - t)
+                hits.append(total)
+            print(f"{label:<28} {page:>4} {statistics.median(times) * 1000:>9.2f} "
+                  f"{percentile(times, 99) * 1000:>9.2f} {statistics.mean(hits):>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
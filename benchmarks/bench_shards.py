@@ -0,0 +1,115 @@
+"""Measure community write throughput as worker processes are added, for different shard counts.
+
+For each shard count, a synthetic data directory is generated once and copied
+for each worker count. The workers post chat messages and poll responses to
+random communities as fast as they can, all starting together, and the writes
+they complete are summed to writes per second. With one shard every write
+waits for the same lock; with more, writes to different shards do not wait
+for each other, and each write loads and saves a smaller file. Whether more
+workers then add throughput depends on the cores they get: on a single core
+they only share it, and the "vs 1 worker" column stays at or below 1.
+
+Storage is only imported in the worker processes, so each run gets the
+DATA_SHARDS it asks for.
+
+    python benchmarks/bench_shards.py --shards 1 8 --workers 1 2 4 8 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def prepare(data_dir, farmers, vendors, messages, polls):
+    os.chdir(data_dir)
+    from synthetic_data import generate
+    generate(farmers=farmers, vendors=vendors, messages=messages, polls=polls, prices=100, tips=10, likes=10)
+
+
+def writer(data_dir, index, duration, seed, ready, results):
+    """Alternate messages and poll responses for `duration` seconds once every worker is ready"""
+    os.chdir(data_dir)
+    from services.communities import add_message_to_community, get_community_index, get_search_index
+    from services.polls import get_poll_index, load_polls, respond_to_poll
+    from storage import COMMUNITIES_FILES, load_sharded
+
+    rng = random.Random(seed)
+    members = [(c["id"], rng.choice(c["members"])) for c in load_sharded(COMMUNITIES_FILES) if c["members"]]
+    poll_ids = [p["id"] for p in load_polls() if p["status"] == "open"]
+    # Built on the first write otherwise, which would count against the timed run
+    get_search_index()
+    get_community_index()
+    get_poll_index()
+
+    ready.wait()
+    writes = 0
+    finish = time.perf_counter() + duration
+    while time.perf_counter() < finish:
+        if writes % 2 and poll_ids:
+            respond_to_poll(rng.choice(poll_ids), f"bench-{index}-{writes}", "Bench farmer", rng.randint(1, 5))
+        else:
+            community_id, member = rng.choice(members)
+            add_message_to_community(community_id, member["id"], member["name"], member["type"],
+                                     f"Bench message {index}-{writes}")
+        writes += 1
+    results.put(writes)
+
+
+def run(context, data_dir, workers, duration):
+    ready = context.Barrier(workers)
+    results = context.Queue()
+    processes = [context.Process(target=writer, args=(data_dir, i, duration, i, ready, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.start()
+    writes = sum(results.get() for _ in processes)
+    for process in processes:
+        process.join()
+    return writes / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    parser.add_argument("--farmers", type=int, default=5000)
+    parser.add_argument("--communities", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=40000)
+    parser.add_argument("--polls", type=int, default=1000)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{args.communities} communities, {args.messages} messages, {args.polls} polls; "
+          f"{os.environ.get('DATA_PERSISTENCE', 'snapshot')} persistence, {os.cpu_count()} CPUs")
+    print(f"{'shards':>6}{'workers':>9}{'writes/s':>10}{'vs 1 worker':>13}")
+    with tempfile.TemporaryDirectory() as scratch:
+        for shards in args.shards:
+            # Spawned processes start with the environment as it is when they are created
+            os.environ["DATA_SHARDS"] = str(shards)
+            template = os.path.join(scratch, f"template-{shards}")
+            os.makedirs(template)
+            prepare_process = context.Process(target=prepare, args=(template, args.farmers, args.communities,
+                                                                    args.messages, args.polls))
+            prepare_process.start()
+            prepare_process.join()
+
+            single = None
+            for workers in args.workers:
+                data_dir = os.path.join(scratch, f"run-{shards}-{workers}")
+                shutil.copytree(template, data_dir)
+                throughput = run(context, data_dir, workers, args.duration)
+                single = single or throughput
+                print(f"{shards:6d}{workers:9d}{throughput:10.1f}{throughput / single:12.2f}x")
+                shutil.rmtree(data_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Measure cold-start import time and memory of the app and the modules it uses.
+
+Each measurement runs in a fresh interpreter: every module on its own, the
+old eager import header next to the current one, and a first run of the app
+script (in an empty data directory). The app's cold start is checked against
+a time budget; the exit status is 1 when it is over.
+
+    python benchmarks/bench_startup.py --budget 3 --record startup_history.jsonl
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "pytest - Copy.py")
+
+MODULES = ["numpy", "pandas", "streamlit", "together", "googletrans", "gtts",
+           "matplotlib.pyplot", "seaborn", "plotly.express", "plotly.graph_objects"]
+
+OLD_HEADER = MODULES
+NEW_HEADER = ["numpy", "pandas", "streamlit", "lazy_imports", "services.communities", "services.polls",
+              "services.prices", "services.tips", "services.users", "bulk_io"]
+
+# Prints (seconds, peak RSS growth in MB) of running `code` after a bare interpreter start
+PROBE = """
+import json, sys, time
+try:
+    import resource
+    rss = lambda: resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+except ImportError:  # Windows
+    rss = lambda: float("nan")
+sys.path.insert(0, {root!r})
+rss_before, started = rss(), time.perf_counter()
+{code}
+print(json.dumps([time.perf_counter() - started, rss() - rss_before]))
+"""
+
+APP_CODE = """
+from streamlit.testing.v1 import AppTest
+AppTest.from_file({app!r}, default_timeout=120).run()
+"""
+
+
+def probe(code, cwd=None):
+    script = PROBE.format(root=ROOT, code=code)
+    result = subprocess.run([sys.executable, "-c", script], cwd=cwd, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def imports(modules):
+    return "\n".join(f"import {name}" for name in modules)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=3.0, help="seconds allowed for the app's first run")
+    parser.add_argument("--record", help="append the results as one JSON line to this file")
+    args = parser.parse_args()
+
+    results = {"date": datetime.now().isoformat(timespec="seconds"), "modules": {}}
+    print(f"{'module (alone)':<24}{'import (s)':>12}{'RSS (MB)':>10}")
+    for name in MODULES:
+        measured = probe(imports([name]))
+        results["modules"][name] = measured
+        if measured is None:
+            print(f"{name:<24}{'not installed':>22}")
+        else:
+            print(f"{name:<24}{measured[0]:12.2f}{measured[1]:10.0f}")
+
+    for label, modules in (("old eager header", OLD_HEADER), ("current header", NEW_HEADER)):
+        measured = probe(imports(modules))
+        results[label] = measured
+        print(f"{label:<24}{measured[0]:12.2f}{measured[1]:10.0f}")
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        app = probe(APP_CODE.format(app=APP), cwd=data_dir)
+    results["app first run"] = app
+    results["budget"] = args.budget
+    if app is None:
+        sys.exit("The app failed to start")
+    print(f"{'app first run':<24}{app[0]:12.2f}{app[1]:10.0f}")
+    over = app[0] > args.budget
+    print(f"cold start {app[0]:.2f}s against a budget of {args.budget:.2f}s: {'OVER' if over else 'ok'}")
+
+    if args.record:
+        with open(args.record, 'a') as f:
+            f.write(json.dumps(results) + "\n")
+    sys.exit(1 if over else 0)
+
+
+if __name__ == "__main__":
+    main()
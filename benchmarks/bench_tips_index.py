@@ -0,0 +1,105 @@
+"""Compare liking and paging farming tips with the ranked index and the old tips file.
+
+Creates synthetic tips and a skewed set of likes (a few tips get most of
+them) in a temporary directory, then times a like and a first-page read on
+both paths.
+
+    python benchmarks/bench_tips_index.py --tips 20000 --likes 500000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from tips_index import TipsIndex  # noqa: E402
+
+CATEGORIES = ["Soil Management", "Water Management", "Pest Control", "Crop Selection",
+              "Harvesting", "Equipment", "Weather", "Sustainable Practices"]
+
+
+def legacy_like(path, tip_id, user_id):
+    with open(path) as f:
+        tips = json.load(f)
+    for tip in tips:
+        if tip["id"] == tip_id and user_id not in tip["liked_by"]:
+            tip["liked_by"].append(user_id)
+            tip["likes"] = len(tip["liked_by"])
+    with open(path, "w") as f:
+        json.dump(tips, f, indent=2)
+
+
+def legacy_page(path, category):
+    with open(path) as f:
+        tips = json.load(f)
+    tips = [t for t in tips if t["category"].lower() == category.lower()]
+    return sorted(tips, key=lambda x: (x["likes"], x["timestamp"]), reverse=True)[:10]
+
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tips", type=int, default=20000)
+    parser.add_argument("--likes", type=int, default=500000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    rng = random.Random(4)
+    start = datetime(2024, 1, 1)
+    tips = [{
+        "id": str(uuid.uuid4()), "user_id": "u", "user_name": "Bench", "user_type": "farmer",
+        "title": f"Tip {i}", "content": "...", "category": rng.choice(CATEGORIES),
+        "likes": 0, "liked_by": [], "timestamp": (start + timedelta(minutes=i)).isoformat()
+    } for i in range(args.tips)]
+    # Zipf-like popularity: low ranks collect most of the likes
+    weights = [1 / (rank + 1) for rank in range(args.tips)]
+    likes = {}
+    for tip in rng.choices(tips, weights=weights, k=args.likes):
+        likes.setdefault(tip["id"], set()).add(f"user-{rng.randrange(args.likes)}")
+    for tip in tips:
+        tip["liked_by"] = sorted(likes.get(tip["id"], ()))
+        tip["likes"] = len(tip["liked_by"])
+    popular = max(tips, key=lambda t: t["likes"])
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        tips_file = os.path.join(data_dir, "farming_tips.json")
+        with open(tips_file, "w") as f:
+            json.dump(tips, f, indent=2)
+        size_mb = os.path.getsize(tips_file) / 1e6
+
+        t0 = time.perf_counter()
+        index = TipsIndex(tips_file, lambda: json.load(open(tips_file)), os.path.join(data_dir, "tip_likes.jsonl"))
+        build_s = time.perf_counter() - t0
+
+        new_users = iter(f"new-user-{n}" for n in range(10 ** 9))
+        index_like = median_ms(lambda: index.like(popular["id"], next(new_users), "2025-01-01T00:00:00"),
+                               args.repeat)
+        index_page = median_ms(lambda: index.page(popular["category"]), args.repeat)
+        legacy_like_ms = median_ms(lambda: legacy_like(tips_file, popular["id"], next(new_users)), 3)
+        legacy_page_ms = median_ms(lambda: legacy_page(tips_file, popular["category"]), 3)
+
+    print(f"{args.tips} tips ({size_mb:.0f} MB file), {args.likes} likes; most liked tip has {popular['likes']}")
+    print(f"index build: {build_s:.2f}s (once per server process)")
+    print(f"{'operation':<26}{'tips file (ms)':>16}{'index (ms)':>12}")
+    print(f"{'like a popular tip':<26}{legacy_like_ms:16.1f}{index_like:12.3f}")
+    print(f"{'first page of a category':<26}{legacy_page_ms:16.1f}{index_page:12.3f}")
+
+
+if __name__ == "__main__":
+    main()
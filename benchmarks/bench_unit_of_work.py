@@ -0,0 +1,114 @@
+"""Count and time data-file loads in one chat-page rerun, with and without a request.
+
+Fills a temporary data directory with synthetic farmers, vendors and
+communities, then replays the service calls a logged-in farmer's chat-page
+rerun makes (sidebar and page user lookups, community details, the chat
+window) once with a fresh unit of work per call, as before, and once within
+a request. Then inserts farmers one write at a time and all in one unit of
+work.
+
+    python benchmarks/bench_unit_of_work.py --farmers 20000 --communities 200
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services import scope, start_request, unit_of_work  # noqa: E402
+from services.communities import get_community_details, get_community_messages  # noqa: E402
+from services.users import get_user_by_id  # noqa: E402
+from event_log import insert_change  # noqa: E402
+from storage import COMMUNITIES_FILES, FARMERS_FILE, VENDORS_FILE, record_changes, save_data, split_by_shard  # noqa: E402
+
+loads = []
+
+
+def counting_load_data(load_data):
+    def load(file_path):
+        loads.append(file_path)
+        return load_data(file_path)
+    return load
+
+
+def chat_rerun(farmer_id, community_id):
+    get_user_by_id(farmer_id, "farmer")  # sidebar
+    get_user_by_id(farmer_id, "farmer")  # page header
+    get_community_details(community_id)
+    get_community_messages(community_id)
+
+
+def user(rng, kind, i):
+    return {"id": str(uuid.uuid4()), "name": f"{kind} {i}", "latitude": rng.uniform(16, 21),
+            "longitude": rng.uniform(73, 80), "created_at": ""}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--farmers", type=int, default=20000)
+    parser.add_argument("--communities", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50, help="messages per community")
+    parser.add_argument("--reruns", type=int, default=20)
+    parser.add_argument("--inserts", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    farmers = [user(rng, "Farmer", i) for i in range(args.farmers)]
+    vendors = [user(rng, "Vendor", i) for i in range(args.communities)]
+    communities = [{
+        "id": str(uuid.uuid4()), "name": f"{v['name']}'s Community", "vendor_id": v["id"], "vendor_name": v["name"],
+        "members": [{"id": f["id"], "name": f["name"], "type": "farmer"} for f in rng.sample(farmers, 50)],
+        "messages": [{"id": str(uuid.uuid4()), "user_id": v["id"], "user_name": v["name"], "user_type": "vendor",
+                      "content": f"Message {i}", "timestamp": ""} for i in range(args.messages)],
+        "created_at": ""
+    } for v in vendors]
+
+    cwd = os.getcwd()
+    scope.load_data = counting_load_data(scope.load_data)
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        try:
+            save_data(farmers, FARMERS_FILE)
+            save_data(vendors, VENDORS_FILE)
+            for file_path, rows in split_by_shard(communities, COMMUNITIES_FILES, "id").items():
+                save_data(rows, file_path)
+            farmer_id, community_id = farmers[-1]["id"], communities[-1]["id"]
+
+            results = {}
+            for label, scoped in (("fresh load per call", False), ("one request per rerun", True)):
+                loads.clear()
+                t0 = time.perf_counter()
+                for _ in range(args.reruns):
+                    if scoped:
+                        start_request()
+                    chat_rerun(farmer_id, community_id)
+                results[label] = ((time.perf_counter() - t0) / args.reruns * 1000, len(loads) / args.reruns)
+                scope._local.__dict__.clear()
+
+            t0 = time.perf_counter()
+            for i in range(args.inserts):
+                record_changes(FARMERS_FILE, [insert_change(user(rng, "Late farmer", i))])
+            separate_ms = (time.perf_counter() - t0) * 1000
+
+            t0 = time.perf_counter()
+            with unit_of_work() as uow:
+                for i in range(args.inserts):
+                    uow.record(FARMERS_FILE, [insert_change(user(rng, "Later farmer", i))])
+            batched_ms = (time.perf_counter() - t0) * 1000
+        finally:
+            os.chdir(cwd)
+
+    print(f"{args.farmers} farmers, {args.communities} communities of {args.messages} messages")
+    for label, (ms, per_rerun) in results.items():
+        print(f"{label:<24}{ms:9.1f} ms per rerun{per_rerun:6.1f} file loads")
+    print(f"{args.inserts} farmer inserts: {separate_ms:.0f} ms one write at a time, "
+          f"{batched_ms:.0f} ms in one unit of work")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Compare login lookups and the registered users table with the user index and the old full scans.
+
+Writes synthetic farmers (with repeated names and some phone numbers) to a
+temporary directory, then times the old login page (load every farmer, list
+every name, find the chosen one by name) and the old table (a DataFrame of
+everyone) against typeahead searches and one table page from the index.
+
+    python benchmarks/bench_user_index.py --farmers 50000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from event_log import insert_change  # noqa: E402
+from storage import FARMERS_FILE, file_lock, file_stamp, load_data, record_changes, save_data  # noqa: E402
+from user_index import UserIndex  # noqa: E402
+
+FIRST_NAMES = ["Ramesh", "Suresh", "Anita", "Sunita", "Vijay", "Lakshmi", "Ganesh", "Kavita", "Raju", "Meena"]
+LAST_NAMES = ["Patil", "Shinde", "Jadhav", "Pawar", "Kale", "More", "Deshmukh", "Gaikwad", "Yadav", "Singh"]
+
+
+def legacy_login(name):
+    users = load_data(FARMERS_FILE)
+    user_names = [user["name"] for user in users]
+    return user_names, next((user for user in users if user["name"] == name), None)
+
+
+def legacy_table():
+    return pd.DataFrame([{
+        "Name": farmer["name"],
+        "Location": f"{farmer['latitude']:.4f}, {farmer['longitude']:.4f}"
+    } for farmer in load_data(FARMERS_FILE)])
+
+
+def median_ms(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--farmers", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(5)
+    farmers = []
+    for i in range(args.farmers):
+        farmer = {"id": str(uuid.uuid4()), "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i % 997}",
+                  "latitude": rng.uniform(16, 21), "longitude": rng.uniform(73, 80), "created_at": ""}
+        if i % 2:
+            farmer["phone"] = f"+91 9{rng.randrange(10 ** 9):09d}"
+        farmers.append(farmer)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as data_dir:
+        os.chdir(data_dir)
+        try:
+            save_data(farmers, FARMERS_FILE)
+            target = farmers[-1]
+
+            old_login = median_ms(lambda: legacy_login(target["name"]), args.repeat)
+            old_table = median_ms(legacy_table, args.repeat)
+
+            t0 = time.perf_counter()
+            index = UserIndex(FARMERS_FILE, lambda: load_data(FARMERS_FILE))
+            build_ms = (time.perf_counter() - t0) * 1000
+
+            # What a user types, one keystroke at a time
+            typed = [target["name"][:n] for n in range(1, len(target["name"]) + 1)]
+            search_ms = median_ms(lambda: [index.search(query) for query in typed], args.repeat) / len(typed)
+            phone = next(f["phone"] for f in reversed(farmers) if "phone" in f)
+            phone_ms = median_ms(lambda: index.search(phone[:8]), args.repeat)
+            page_ms = median_ms(lambda: pd.DataFrame(index.page(page=100)[0]), args.repeat)
+
+            def register():
+                farmer = dict(target, id=str(uuid.uuid4()))
+                with file_lock(FARMERS_FILE):
+                    stamp_before = file_stamp(FARMERS_FILE)
+                    record_changes(FARMERS_FILE, [insert_change(farmer)])
+                    index.apply_user(stamp_before, farmer)
+            register_ms = median_ms(register, args.repeat)
+        finally:
+            os.chdir(cwd)
+
+    print(f"{args.farmers} farmers")
+    print(f"old login page (load, list every name, find by name): {old_login:8.1f} ms (before the browser renders them)")
+    print(f"old registered farmers table (everyone):             {old_table:8.1f} ms")
+    print(f"index build (once per server process):               {build_ms:8.1f} ms")
+    print(f"typeahead search per keystroke:                      {search_ms:8.3f} ms")
+    print(f"phone prefix search:                                 {phone_ms:8.3f} ms")
+    print(f"one table page:                                      {page_ms:8.3f} ms")
+    print(f"register (write + index update):                     {register_ms:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""One-time setup and schema migrations for the data directory.
+
+The data directory records the schema version it is at in schema.json. Each
+migration brings it one version forward and is recorded as soon as it
+completes, so an interrupted run picks up where it stopped. The app runs
+`bootstrap()` once per server process; when the data is already current
+that is a single read of schema.json.
+
+Run pending migrations by hand (e.g. before starting a new release), or show
+the current version:
+
+    python bootstrap.py [--status]
+"""
+import argparse
+import os
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+
+from community_index import directory_entry
+from event_log import insert_change, wal_path
+from price_store import PriceStore
+from storage import (
+    COMMUNITIES_FILE, COMMUNITIES_FILES, COMMUNITY_DIRECTORY_FILE, COMMUNITY_SHARDS, FARMERS_FILE, FARMING_TIPS_FILE,
+    MARKET_PRICES_FILE, POLLS_FILE, POLLS_FILES, VENDORS_FILE, file_lock, file_stamp, load_data, load_sharded,
+    record_changes, save_all, save_data, split_by_shard
+)
+
+SCHEMA_FILE = "schema.json"
+
+SAMPLE_PRICES = [
+    {"product": "Tomatoes", "price": 25.50, "unit": "kg", "location": "Delhi"},
+    {"product": "Potatoes", "price": 15.75, "unit": "kg", "location": "Mumbai"},
+    {"product": "Rice", "price": 45.00, "unit": "kg", "location": "Kolkata"},
+    {"product": "Wheat", "price": 30.25, "unit": "kg", "location": "Chennai"},
+    {"product": "Onions", "price": 20.00, "unit": "kg", "location": "Bangalore"}
+]
+
+SAMPLE_TIPS = [
+    {
+        "title": "Soil Preparation for Wheat",
+        "content": "Wheat requires well-drained soil with a pH between 6.0 and 7.0. Before planting, prepare your soil by tilling to a depth of 15cm and incorporate organic matter. Conduct a soil test to ensure proper nutrient levels.",
+        "category": "Soil Management"
+    },
+    {
+        "title": "Effective Water Conservation Techniques",
+        "content": "Implement drip irrigation to save water. Mulching can reduce evaporation by up to 70%. Consider collecting rainwater during monsoon season for use during dry periods.",
+        "category": "Water Management"
+    },
+    {
+        "title": "Integrated Pest Management for Rice",
+        "content": "Monitor your rice fields regularly for pests. Introduce beneficial insects like ladybugs to control aphids. Rotate crops annually to break pest cycles. Apply neem-based solutions as a natural pesticide.",
+        "category": "Pest Control"
+    }
+]
+
+
+def create_data_files():
+    for file_path in (FARMERS_FILE, VENDORS_FILE, COMMUNITIES_FILE, FARMING_TIPS_FILE):
+        with file_lock(file_path):
+            if file_stamp(file_path) is None:
+                save_data([], file_path)
+
+
+def move_market_prices():
+    PriceStore().migrate_legacy(MARKET_PRICES_FILE)
+
+
+def seed_samples():
+    """Sample prices and tips for a new install, so the pages are not empty"""
+    now = datetime.now().isoformat()
+    store = PriceStore()
+    if store.is_empty():
+        store.extend([dict(item, id=str(uuid.uuid4()), vendor_id="sample_vendor", vendor_name="Sample Vendor",
+                           notes="Sample data for demonstration", timestamp=now)
+                      for item in SAMPLE_PRICES])
+    with file_lock(FARMING_TIPS_FILE):
+        if not load_data(FARMING_TIPS_FILE):
+            record_changes(FARMING_TIPS_FILE, [
+                insert_change(dict(tip, id=str(uuid.uuid4()), user_id="sample_user",
+                                   user_name="Agricultural Expert", user_type="vendor", timestamp=now))
+                for tip in SAMPLE_TIPS
+            ])
+
+
+def shard_communities():
+    """Split communities.json and polls.json into shards by community id, and list the communities
+
+    Rows already in a shard (e.g. imported before the migration ran) are kept,
+    and a row is only added once, so an interrupted run can be repeated.
+    """
+    for file_path, shard_files, community_key in ((COMMUNITIES_FILE, COMMUNITIES_FILES, "id"),
+                                                  (POLLS_FILE, POLLS_FILES, "community_id")):
+        with ExitStack() as stack:
+            for path in [file_path, *sorted(shard_files)]:
+                stack.enter_context(file_lock(path))
+            shards = {path: load_data(path) for path in shard_files}
+            known = {row["id"] for rows in shards.values() for row in rows}
+            moved = split_by_shard([row for row in load_data(file_path) if row["id"] not in known],
+                                   shard_files, community_key)
+            save_all([(shards[path] + moved[path], path) for path in shard_files])
+            for path in (file_path, wal_path(file_path)):
+                if os.path.exists(path):
+                    os.remove(path)
+    with file_lock(COMMUNITY_DIRECTORY_FILE):
+        communities = sorted(load_sharded(COMMUNITIES_FILES), key=lambda c: c.get("created_at", ""))
+        save_data([directory_entry(c) for c in communities], COMMUNITY_DIRECTORY_FILE)
+    return {"shards": COMMUNITY_SHARDS}
+
+
+# (version, description, migration), in order; append new migrations at the end.
+# A migration may return fields to keep in the schema record.
+MIGRATIONS = [
+    (1, "Create the data files", create_data_files),
+    (2, "Move market prices from market_prices.json into the price store", move_market_prices),
+    (3, "Seed sample market prices and farming tips", seed_samples),
+    (4, "Split communities and polls into shards by community", shard_communities),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_status():
+    """The data directory's schema record: its version and the migrations applied"""
+    return load_data(SCHEMA_FILE) or {"version": 0, "applied": []}
+
+
+def bootstrap():
+    """Run every migration the data directory has not had yet; returns the versions applied"""
+    schema = schema_status()
+    # Shards are chosen by hashing with the shard count, so it cannot change under existing data
+    if schema.get("shards", COMMUNITY_SHARDS) != COMMUNITY_SHARDS:
+        raise RuntimeError(f"The data directory is split into {schema['shards']} shards, "
+                           f"but DATA_SHARDS is {COMMUNITY_SHARDS}")
+    if schema["version"] >= SCHEMA_VERSION:
+        return []
+    applied = []
+    with file_lock(SCHEMA_FILE):
+        schema = schema_status()
+        for version, description, migrate in MIGRATIONS:
+            if version <= schema["version"]:
+                continue
+            schema.update(migrate() or {})
+            schema["version"] = version
+            schema["applied"].append({"version": version, "description": description,
+                                      "applied_at": datetime.now().isoformat()})
+            save_data(schema, SCHEMA_FILE)
+            applied.append(version)
+    return applied
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Set up the data directory and run pending migrations")
+    parser.add_argument("--status", action="store_true", help="only show the schema version")
+    args = parser.parse_args()
+    if not args.status:
+        for version in bootstrap():
+            description = next(d for v, d, _ in MIGRATIONS if v == version)
+            print(f"Applied migration {version}: {description}")
+    schema = schema_status()
+    print(f"Schema version {schema['version']} (current release: {SCHEMA_VERSION}), "
+          f"{schema.get('shards', COMMUNITY_SHARDS)} community shards")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+"""Bulk import and export of farmers, vendors and market prices.
+
+Records are streamed from NDJSON (one JSON object per line) or CSV (with a
+header row) and validated one at a time. Bad records are reported with their
+line number and skipped, or abort the whole import with --strict. Community
+membership of every imported user is worked out in one vectorized distance
+pass. Farmers, vendors, the community shards that changed and the community
+directory are then saved together: a failure while writing them leaves every
+file as it was, though a crash while they are being swapped in can leave some
+updated and some not. Prices go through the price validator and are added to
+the price store in one batch.
+
+Run from the app's data directory, e.g.:
+
+    python bulk_io.py import farmers coop_farmers.csv
+    python bulk_io.py import prices prices.ndjson --strict
+    python bulk_io.py export vendors vendors.csv
+    python bulk_io.py export prices - --format ndjson
+"""
+import argparse
+import csv
+import json
+import math
+import sys
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import datetime
+
+import numpy as np
+
+from community_index import directory_entry
+from metrics import COUNT_BUCKETS, histogram
+from price_store import COLUMNS as PRICE_FIELDS
+from price_store import PriceStore
+from price_validator import FLAGGED, QUARANTINED, PriceValidator, record_for_review
+from storage import (
+    COMMUNITIES_FILES, COMMUNITY_DIRECTORY_FILE, FARMERS_FILE, VENDORS_FILE, communities_file, file_lock, load_data,
+    save_all
+)
+
+GEO_SCAN_SECONDS = histogram("geo_scan_seconds", "Time to measure distances between users, by operation")
+GEO_SCAN_PAIRS = histogram("geo_scan_pairs", "Distances measured in one scan, by operation", COUNT_BUCKETS)
+
+USER_FIELDS = ("id", "name", "phone", "latitude", "longitude", "created_at")
+
+EARTH_RADIUS_KM = 6371
+COMMUNITY_RADIUS_KM = 50
+
+# Distances computed per vectorized step (rows x columns), to bound memory
+DISTANCE_BLOCK = 4_000_000
+
+
+class RecordError(ValueError):
+    """A record that cannot be imported"""
+
+
+def read_records(stream, fmt):
+    """Yield (line number, record) from an NDJSON or CSV stream"""
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for line_number, line in enumerate(stream, 1):
+        if line.strip():
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, RecordError(f"invalid JSON: {e.msg}")
+
+
+def write_records(stream, fmt, fields, records):
+    """Write records to an NDJSON or CSV stream; returns how many were written"""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+        return count
+    for record in records:
+        stream.write(json.dumps(record) + "\n")
+        count += 1
+    return count
+
+
+def _text(record, field, required=True):
+    value = record.get(field)
+    value = "" if value is None else str(value).strip()
+    if required and not value:
+        raise RecordError(f"{field} is required")
+    return value
+
+
+def _number(record, field, low=-math.inf, high=math.inf):
+    try:
+        value = float(record.get(field))
+    except (TypeError, ValueError):
+        raise RecordError(f"{field} must be a number")
+    if not math.isfinite(value) or not low <= value <= high:
+        raise RecordError(f"{field} must be between {low} and {high}")
+    return value
+
+
+def _timestamp(record, field, default):
+    value = _text(record, field, required=False)
+    if not value:
+        return default
+    try:
+        return datetime.fromisoformat(value).isoformat()
+    except ValueError:
+        raise RecordError(f"{field} must be an ISO date/time")
+
+
+def validate_user(record, now):
+    """A farmer or vendor record in the shape register_user saves"""
+    user = {
+        "id": _text(record, "id", required=False) or str(uuid.uuid4()),
+        "name": _text(record, "name"),
+        "latitude": _number(record, "latitude", -90, 90),
+        "longitude": _number(record, "longitude", -180, 180),
+        "created_at": _timestamp(record, "created_at", now)
+    }
+    phone = _text(record, "phone", required=False)
+    if phone:
+        user["phone"] = phone
+    return user
+
+
+def validate_price(record, now, vendor_names):
+    """A market price record in the shape add_market_price saves"""
+    vendor_id = _text(record, "vendor_id")
+    if vendor_id not in vendor_names:
+        raise RecordError(f"unknown vendor_id {vendor_id}")
+    return {
+        "id": _text(record, "id", required=False) or str(uuid.uuid4()),
+        "vendor_id": vendor_id,
+        "vendor_name": _text(record, "vendor_name", required=False) or vendor_names[vendor_id],
+        "product": _text(record, "product"),
+        "price": _number(record, "price", 0.01),
+        "unit": _text(record, "unit"),
+        "location": _text(record, "location"),
+        "notes": _text(record, "notes", required=False),
+        "timestamp": _timestamp(record, "timestamp", now)
+    }
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Great-circle distances in km, like calculate_distance, for broadcastable arrays of degrees"""
+    lat1, lon1, lat2, lon2 = (np.radians(a) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def nearby_pairs(centers, points, radius=COMMUNITY_RADIUS_KM):
+    """(center index, point index, distance) for every point within `radius` km of a center
+
+    `centers` (vendors) and `points` (farmers) are (n, 2) arrays of latitude and
+    longitude. Pairs come out grouped by point, in point order.
+    """
+    pairs = []
+    if len(centers) and len(points):
+        GEO_SCAN_PAIRS.observe(len(centers) * len(points), operation="bulk_import")
+        with GEO_SCAN_SECONDS.time(operation="bulk_import"):
+            step = max(1, DISTANCE_BLOCK // len(centers))
+            for start in range(0, len(points), step):
+                block = points[start:start + step]
+                distances = haversine(centers[None, :, 0], centers[None, :, 1], block[:, 0, None], block[:, 1, None])
+                point_index, center_index = np.nonzero(distances <= radius)
+                pairs.extend(zip(center_index.tolist(), (point_index + start).tolist(),
+                                 distances[point_index, center_index].tolist()))
+    return pairs
+
+
+def _coordinates(users):
+    return np.array([(u["latitude"], u["longitude"]) for u in users], dtype=np.float64).reshape(-1, 2)
+
+
+def _farmer_member(farmer, distance):
+    return {"id": farmer["id"], "name": farmer["name"], "type": "farmer", "distance": round(distance, 2)}
+
+
+def _validated(records, validate, strict, report):
+    for line_number, record in records:
+        try:
+            if isinstance(record, RecordError):
+                raise record
+            yield validate(record)
+        except RecordError as e:
+            report["rejected"] += 1
+            if strict:
+                raise RecordError(f"line {line_number}: {e}")
+            print(f"line {line_number}: skipped, {e}", file=sys.stderr)
+
+
+def import_users(user_type, records, strict=False):
+    """Import farmers or vendors and join them to communities within 50 km; returns a report"""
+    report = {"imported": 0, "rejected": 0, "duplicates": 0, "memberships": 0, "communities": 0}
+    now = datetime.now().isoformat()
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        for file_path in sorted((FARMERS_FILE, VENDORS_FILE, COMMUNITY_DIRECTORY_FILE, *COMMUNITIES_FILES)):
+            stack.enter_context(file_lock(file_path))
+        farmers = load_data(FARMERS_FILE)
+        vendors = load_data(VENDORS_FILE)
+        directory = load_data(COMMUNITY_DIRECTORY_FILE)
+        shards = {file_path: load_data(file_path) for file_path in COMMUNITIES_FILES}
+        communities = [c for rows in shards.values() for c in rows]
+        changed_shards = set()
+        known = {u["id"] for u in farmers} | {u["id"] for u in vendors}
+
+        new_users = []
+        for user in _validated(records, lambda r: validate_user(r, now), strict, report):
+            if user["id"] in known:
+                report["duplicates"] += 1
+                continue
+            known.add(user["id"])
+            new_users.append(user)
+        validated = time.perf_counter()
+
+        if user_type == "farmer":
+            # Nearby communities of every new farmer, in one pass over all (community, farmer) pairs
+            vendors_by_id = {v["id"]: v for v in vendors}
+            located = [(c, vendors_by_id[c["vendor_id"]]) for c in communities if c["vendor_id"] in vendors_by_id]
+            for community, farmer, distance in nearby_pairs(_coordinates([v for _, v in located]),
+                                                            _coordinates(new_users)):
+                located[community][0]["members"].append(_farmer_member(new_users[farmer], distance))
+                changed_shards.add(communities_file(located[community][0]["id"]))
+                report["memberships"] += 1
+            farmers.extend(new_users)
+        else:
+            # A community per new vendor, with every farmer within 50 km
+            new_communities = [{
+                "id": str(uuid.uuid4()),
+                "name": f"{vendor['name']}'s Community",
+                "vendor_id": vendor["id"],
+                "vendor_name": vendor["name"],
+                "members": [{"id": vendor["id"], "name": vendor["name"], "type": "vendor"}],
+                "messages": [],
+                "created_at": now
+            } for vendor in new_users]
+            for vendor, farmer, distance in nearby_pairs(_coordinates(new_users), _coordinates(farmers)):
+                new_communities[vendor]["members"].append(_farmer_member(farmers[farmer], distance))
+                report["memberships"] += 1
+            vendors.extend(new_users)
+            for community in new_communities:
+                shards[communities_file(community["id"])].append(community)
+                changed_shards.add(communities_file(community["id"]))
+                directory.append(directory_entry(community))
+            report["communities"] = len(new_communities)
+        matched = time.perf_counter()
+
+        if new_users:
+            save_all([(farmers, FARMERS_FILE), (vendors, VENDORS_FILE), (directory, COMMUNITY_DIRECTORY_FILE)]
+                     + [(shards[file_path], file_path) for file_path in sorted(changed_shards)])
+        report["imported"] = len(new_users)
+    report["seconds"] = {"validate": validated - started, "membership": matched - validated,
+                         "save": time.perf_counter() - matched}
+    return report
+
+
+def import_prices(records, strict=False, store=None):
+    """Validate prices and add them to the price store in one batch; returns a report"""
+    report = {"imported": 0, "rejected": 0, "duplicates": 0, "quarantined": 0}
+    started = time.perf_counter()
+    store = store or PriceStore()
+    validator = PriceValidator(store)
+    now = datetime.now().isoformat()
+    vendor_names = {v["id"]: v["name"] for v in load_data(VENDORS_FILE)}
+    known = set(store.scan(columns=("id",))["id"].tolist())
+
+    entries = []
+    for entry in _validated(records, lambda r: validate_price(r, now, vendor_names), strict, report):
+        if entry["id"] in known:
+            report["duplicates"] += 1
+            continue
+        known.add(entry["id"])
+        verdict = validator.validate(entry)
+        if verdict["status"] == QUARANTINED:
+            record_for_review(entry, verdict)
+            report["quarantined"] += 1
+            continue
+        if verdict["status"] == FLAGGED:
+            entry["review"] = FLAGGED
+        entries.append(entry)
+    validated = time.perf_counter()
+
+    # One extend: its segments only become visible when the manifest is saved at the end
+    store.extend(entries)
+    report["imported"] = len(entries)
+    report["seconds"] = {"validate": validated - started, "save": time.perf_counter() - validated}
+    return report
+
+
+def export_records(kind, store=None):
+    """Stream every farmer, vendor or price record"""
+    if kind == "prices":
+        store = store or PriceStore()
+        for product, location in store.partitions():
+            columns = store.scan(product=product, location=location, columns=PRICE_FIELDS)
+            values = [columns[name].tolist() for name in PRICE_FIELDS]
+            for row in zip(*values):
+                yield dict(zip(PRICE_FIELDS, row))
+        return
+    yield from load_data(FARMERS_FILE if kind == "farmers" else VENDORS_FILE)
+
+
+def _format(path, fmt):
+    return fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import and export of farmers, vendors and market prices")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("kind", choices=["farmers", "vendors", "prices"])
+    parser.add_argument("path", help="file to read or write; - for stdin/stdout")
+    parser.add_argument("--format", choices=["ndjson", "csv"], help="defaults to csv for .csv files, else ndjson")
+    parser.add_argument("--strict", action="store_true", help="abort the import on the first bad record")
+    args = parser.parse_args()
+    fmt = _format(args.path, args.format)
+
+    started = time.perf_counter()
+    if args.action == "export":
+        fields = PRICE_FIELDS if args.kind == "prices" else USER_FIELDS
+        with ExitStack() as stack:
+            stream = sys.stdout if args.path == "-" else stack.enter_context(open(args.path, 'w', newline=""))
+            count = write_records(stream, fmt, fields, export_records(args.kind))
+        elapsed = time.perf_counter() - started
+        print(f"Exported {count} {args.kind} in {elapsed:.2f}s ({count / max(elapsed, 1e-9):,.0f} records/s)",
+              file=sys.stderr)
+        return
+
+    with ExitStack() as stack:
+        stream = sys.stdin if args.path == "-" else stack.enter_context(open(args.path, 'r', newline=""))
+        records = read_records(stream, fmt)
+        try:
+            if args.kind == "prices":
+                report = import_prices(records, strict=args.strict)
+            else:
+                report = import_users(args.kind[:-1], records, strict=args.strict)
+        except RecordError as e:
+            sys.exit(f"Import aborted, nothing was saved: {e}")
+
+    finished = time.perf_counter()
+    total = report["imported"] + report["rejected"] + report["duplicates"] + report.get("quarantined", 0)
+    print(f"Imported {report['imported']} of {total} {args.kind} in {finished - started:.2f}s "
+          f"({total / max(finished - started, 1e-9):,.0f} records/s)")
+    print(f"  rejected {report['rejected']}, already present {report['duplicates']}"
+          + (f", quarantined {report['quarantined']}" if args.kind == "prices" else
+             f", memberships {report['memberships']}, new communities {report['communities']}"))
+    print("  " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in report["seconds"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import threading
+from collections import OrderedDict
+
+# Number of messages shown when a chat is opened and added per "load older" click
+CHAT_PAGE_SIZE = 50
+
+# Rendered bubbles are kept per (message id, is_self); message content never changes
+# after it is posted, so the id alone is a safe cache key
+BUBBLE_CACHE_SIZE = 20000
+_bubble_cache = OrderedDict()
+# Sessions render on their own threads; the cache's order and evictions must not interleave
+_bubble_cache_lock = threading.Lock()
+
+
+def message_window(messages, limit, offset=0):
+    """Return the `limit` messages ending `offset` messages before the newest one"""
+    end = max(0, len(messages) - offset)
+    start = max(0, end - limit)
+    return messages[start:end]
+
+
+def _format_bubble(msg, is_self):
+    """Build the HTML for a single chat bubble"""
+    # Bubbles are joined into one markdown block, so no line may be indented
+    # (markdown would turn indented lines after a blank line into code blocks)
+    if is_self:
+        return (
+            "<div style='display: flex; justify-content: flex-end; margin-bottom: 20px;'>"
+            "<div style='background-color: #007BFF; color: white; padding: 12px; border-radius: 15px; max-width: 80%;'>"
+            f"<p style='margin: 0; text-align: right;'>{msg['content']}</p>"
+            f"<p style='margin: 0; font-size: 0.8em; color: #E6F2FF; text-align: right; margin-top: 5px;'>You - {msg['timestamp'].split('T')[1][:5]}</p>"
+            "</div>"
+            "</div>\n"
+        )
+
+    # For messages from others
+    # Choose color based on user type - ensuring good contrast for text
+    if msg['user_type'] == 'farmer':
+        badge_bg = '#28a745'  # green
+        badge_text = 'white'
+        msg_bg = '#f1f1f1'    # light gray
+        msg_text = '#333333'  # dark gray
+    else:  # vendor
+        badge_bg = '#ffc107'  # yellow
+        badge_text = 'black'
+        msg_bg = '#f8f9fa'    # off-white
+        msg_text = '#333333'  # dark gray
+
+    msg_type_badge = f"<span style='background-color: {badge_bg}; color: {badge_text}; padding: 2px 8px; border-radius: 10px; font-size: 0.7em; margin-right: 5px;'>{msg['user_type'].upper()}</span>"
+
+    return (
+        "<div style='display: flex; justify-content: flex-start; margin-bottom: 20px;'>"
+        f"<div style='background-color: {msg_bg}; color: {msg_text}; padding: 12px; border-radius: 15px; max-width: 80%;'>"
+        f"<p style='margin: 0; font-weight: bold;'>{msg_type_badge} {msg['user_name']}</p>"
+        f"<p style='margin: 0;'>{msg['content']}</p>"
+        f"<p style='margin: 0; font-size: 0.8em; color: #777; margin-top: 5px;'>{msg['timestamp'].split('T')[0]} {msg['timestamp'].split('T')[1][:5]}</p>"
+        "</div>"
+        "</div>\n"
+    )
+
+
+def render_message_bubble(msg, current_user_id):
+    """Return the HTML for a chat bubble, memoized per message id"""
+    is_self = msg['user_id'] == current_user_id
+    key = (msg['id'], is_self)
+
+    with _bubble_cache_lock:
+        html = _bubble_cache.get(key)
+        if html is not None:
+            _bubble_cache.move_to_end(key)
+            return html
+
+    html = _format_bubble(msg, is_self)
+    with _bubble_cache_lock:
+        _bubble_cache[key] = html
+        if len(_bubble_cache) > BUBBLE_CACHE_SIZE:
+            _bubble_cache.popitem(last=False)
+    return html
+
+
+def render_message_window(messages, current_user_id):
+    """Render a window of messages as a single HTML block"""
+    return "".join(render_message_bubble(msg, current_user_id) for msg in messages)
+
+
+def clear_bubble_cache():
+    """Drop all memoized bubbles"""
+    with _bubble_cache_lock:
+        _bubble_cache.clear()
@@ -0,0 +1,66 @@
+import threading
+
+from storage import file_stamp
+
+
+def directory_entry(community):
+    """A community's row in the community directory file"""
+    return {"id": community["id"], "name": community["name"], "vendor_id": community["vendor_id"],
+            "vendor_name": community["vendor_name"]}
+
+
+class CommunityIndex:
+    """Every community's id, name and vendor, kept in step with the community directory file
+
+    The communities data is split into shards, so lookups that span
+    communities (which are near a new farmer, a community's name next to a
+    poll) read this instead of loading every shard. The directory file only
+    changes when a community is created, so chat messages and new members,
+    which rewrite a shard, never make the index reload.
+
+    Like the poll index, it is rebuilt if the file was changed by another
+    process.
+    """
+
+    def __init__(self, directory_file, load_directory):
+        self.directory_file = directory_file
+        self.load_directory = load_directory
+        self._lock = threading.RLock()
+        self.rebuild()
+
+    def rebuild(self):
+        """Reindex every community from storage"""
+        with self._lock:
+            self._stamp = file_stamp(self.directory_file)
+            self._by_id = {entry["id"]: entry for entry in self.load_directory()}
+
+    def _refresh(self):
+        if file_stamp(self.directory_file) != self._stamp:
+            self.rebuild()
+
+    def apply_write(self, stamp_before, added):
+        """Add communities just saved to the directory by this process
+
+        Call while still holding the directory file lock, with the file stamp
+        taken under the lock before saving; if the index had not seen that
+        version, it is rebuilt instead.
+        """
+        with self._lock:
+            if stamp_before != self._stamp:
+                self.rebuild()
+                return
+            for entry in added:
+                self._by_id[entry["id"]] = entry
+            self._stamp = file_stamp(self.directory_file)
+
+    def get(self, community_id):
+        """A community's id, name and vendor, or None"""
+        with self._lock:
+            self._refresh()
+            return self._by_id.get(community_id)
+
+    def all(self):
+        """Every community's id, name and vendor, oldest first"""
+        with self._lock:
+            self._refresh()
+            return list(self._by_id.values())
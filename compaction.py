@@ -0,0 +1,66 @@
+"""Background compaction of the data files' write-ahead logs.
+
+With DATA_PERSISTENCE=log, each change to a data file is appended to
+<file>.wal instead of rewriting the file, and load_data replays the log on top
+of the file. The compaction worker folds a log into a new version of its file
+once the log is big enough, so loads stay fast and logs stay short.
+
+Compact by hand, e.g. before a backup:
+
+    python compaction.py farmers.json vendors.json farming_tips.json community_directory.json communities_*.json polls_*.json
+"""
+import argparse
+import os
+import threading
+
+from event_log import wal_path
+from storage import compact_log
+
+# How often the worker looks at the logs
+COMPACT_INTERVAL_SECONDS = 30.0
+
+# Logs smaller than this are left for a later round
+COMPACT_MIN_BYTES = 256 * 1024
+
+
+class CompactionWorker(threading.Thread):
+    """Background thread that folds the logs of data files into the files"""
+
+    def __init__(self, files, interval=COMPACT_INTERVAL_SECONDS, min_bytes=COMPACT_MIN_BYTES):
+        super().__init__(name="compaction-worker", daemon=True)
+        self.files = files
+        self.interval = interval
+        self.min_bytes = min_bytes
+        self._stopped = threading.Event()
+
+    def compact_once(self):
+        """Compact every log that has grown past min_bytes; returns the number of changes folded"""
+        folded = 0
+        for file_path in self.files:
+            try:
+                if os.path.getsize(wal_path(file_path)) >= self.min_bytes:
+                    folded += compact_log(file_path)
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                print(f"Compaction of {file_path} failed: {e}")
+        return folded
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.compact_once()
+
+    def stop(self):
+        self._stopped.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold the write-ahead logs of data files into the files")
+    parser.add_argument("files", nargs="+")
+    args = parser.parse_args()
+    for file_path in args.files:
+        print(f"{file_path}: folded {compact_log(file_path)} changes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Batch job that precomputes crop recommendations for every registered farmer.
+
+Each farmer's location is joined with the nearest cell of an offline grid of
+climate normals (mean temperature, relative humidity and rainfall), and with a
+soil profile: the cell's own N, P, K and pH where the grid has them, the
+default profile otherwise. The crop model scores the farmers in batches,
+spread over worker processes, and the best crops for each are saved to the
+recommendations file. The crop prediction page opens filled in and scored
+from it.
+
+Every recommendation records the version of the model, label encoder and
+climate normals it was made with. A run only scores farmers who have no
+recommendation yet or whose inputs have changed since, so it is cheap to run
+often. Farmers who register in between are scored through the outbox (see
+services/crops.py).
+
+    python crop_recommendations.py --normals climate_normals.csv --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import pickle
+import threading
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from lazy_imports import lazy_import
+from storage import FARMERS_FILE, RECOMMENDATIONS_FILE, file_stamp, load_data, locked_data
+
+neighbors = lazy_import("sklearn.neighbors")
+
+CLIMATE_NORMALS_FILE = "climate_normals.csv"
+MODEL_FILE = "RandomForest.pkl"
+ENCODER_FILE = "label_encoder.pkl"
+
+# The model's inputs, in the order it was trained on
+FEATURES = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+CLIMATE_FEATURES = ["temperature", "humidity", "rainfall"]
+SOIL_FEATURES = ["N", "P", "K", "ph"]
+
+# Median soil of Crop_recommendation.csv, for grid cells without a soil survey
+DEFAULT_SOIL_PROFILE = {"N": 37.0, "P": 51.0, "K": 32.0, "ph": 6.43}
+
+# Crops kept per farmer
+TOP_CROPS = 3
+
+# Farmers scored per call to the model
+BATCH_SIZE = 2048
+
+EARTH_RADIUS_KM = 6371
+
+
+def _load_pickle(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def inputs_version(paths):
+    """Checksum of the files a recommendation is made from, so a change to any of them is noticed"""
+    checksum = 0
+    for path in paths:
+        with open(path, 'rb') as f:
+            checksum = zlib.crc32(f.read(), checksum)
+    return f"{checksum:08x}"
+
+
+class ClimateGrid:
+    """Model features for any location, from the nearest cell of a grid of climate normals
+
+    The grid is a table with a row per cell: latitude, longitude, temperature,
+    humidity and rainfall, and optionally N, P, K and ph. Cells with no
+    climate values (e.g. over the sea) are left out, so a coastal farmer gets
+    the nearest cell on land.
+    """
+
+    def __init__(self, normals):
+        missing = {"latitude", "longitude", *CLIMATE_FEATURES} - set(normals.columns)
+        if missing:
+            raise ValueError(f"Climate normals have no {', '.join(sorted(missing))} column")
+        normals = normals.dropna(subset=["latitude", "longitude", *CLIMATE_FEATURES])
+        if normals.empty:
+            raise ValueError("Climate normals have no cells with climate values")
+        columns = {name: normals[name] if name in normals else pd.Series(np.nan, index=normals.index)
+                   for name in FEATURES}
+        for name in SOIL_FEATURES:
+            columns[name] = columns[name].fillna(DEFAULT_SOIL_PROFILE[name])
+        self._features = np.column_stack([columns[name].to_numpy(dtype=float) for name in FEATURES])
+        self._tree = neighbors.BallTree(np.radians(normals[["latitude", "longitude"]].to_numpy(dtype=float)),
+                                        metric="haversine")
+
+    def lookup(self, latitudes, longitudes):
+        """Features of the cell nearest each location, and how far away it is in km"""
+        points = np.radians(np.column_stack([latitudes, longitudes]).astype(float))
+        distances, cells = self._tree.query(points, k=1)
+        return self._features[cells[:, 0]], distances[:, 0] * EARTH_RADIUS_KM
+
+
+class Recommender:
+    """The crop model, its crop names and the climate grid, for scoring farmers"""
+
+    def __init__(self, models_dir=".", normals_path=CLIMATE_NORMALS_FILE, top=TOP_CROPS):
+        paths = [os.path.join(models_dir, MODEL_FILE), os.path.join(models_dir, ENCODER_FILE), normals_path]
+        self.version = inputs_version(paths)
+        self.model = _load_pickle(paths[0])
+        classes = self.model.classes_
+        # The app's models are trained on encoded labels
+        self.crops = classes if isinstance(classes[0], str) else _load_pickle(paths[1]).inverse_transform(
+            classes.astype(int))
+        self.grid = ClimateGrid(pd.read_csv(normals_path))
+        self.top = top
+
+    def score(self, farmers):
+        """Recommendations for a list of farmers, scored as one batch"""
+        if not farmers:
+            return []
+        features, distances = self.grid.lookup([farmer["latitude"] for farmer in farmers],
+                                               [farmer["longitude"] for farmer in farmers])
+        # Models fitted on a DataFrame expect its column names back
+        inputs = pd.DataFrame(features, columns=FEATURES) if hasattr(self.model, "feature_names_in_") else features
+        probabilities = self.model.predict_proba(inputs)
+        best = np.argsort(-probabilities, axis=1, kind="stable")[:, :self.top]
+        computed_at = datetime.now().isoformat()
+        return [{
+            "id": farmer["id"],
+            "features": dict(zip(FEATURES, row.tolist())),
+            "crops": [{"crop": str(self.crops[c]), "probability": float(p[c])} for c in order],
+            "cell_distance_km": round(float(distance), 1),
+            "version": self.version,
+            "computed_at": computed_at
+        } for farmer, row, p, order, distance in zip(farmers, features, probabilities, best, distances)]
+
+
+_worker_recommender = None
+
+
+def _start_worker(models_dir, normals_path, top):
+    global _worker_recommender
+    _worker_recommender = Recommender(models_dir, normals_path, top)
+
+
+def _score_batch(farmers):
+    return _worker_recommender.score(farmers)
+
+
+def score_all(farmers, models_dir=".", normals_path=CLIMATE_NORMALS_FILE, top=TOP_CROPS, workers=1):
+    """Recommendations for every farmer, scored in batches by `workers` processes"""
+    batches = [farmers[i:i + BATCH_SIZE] for i in range(0, len(farmers), BATCH_SIZE)]
+    if not batches:
+        return []
+    if workers <= 1 or len(batches) == 1:
+        recommender = Recommender(models_dir, normals_path, top)
+        return [row for batch in batches for row in recommender.score(batch)]
+    # Each worker loads the model and grid once, then scores batch after batch
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(min(workers, len(batches)), initializer=_start_worker,
+                      initargs=(models_dir, normals_path, top)) as pool:
+        return [row for rows in pool.imap(_score_batch, batches) for row in rows]
+
+
+def save_recommendations(rows):
+    """Add or replace farmers' recommendations in the recommendations file"""
+    fresh = {row["id"]: row for row in rows}
+    with locked_data(RECOMMENDATIONS_FILE) as saved:
+        saved[:] = [fresh.pop(row["id"], row) for row in saved] + list(fresh.values())
+
+
+class RecommendationIndex:
+    """Saved recommendations by farmer id, reloaded when the recommendations file changes"""
+
+    def __init__(self, recommendations_file, load_recommendations):
+        self.recommendations_file = recommendations_file
+        self.load_recommendations = load_recommendations
+        self._lock = threading.RLock()
+        self.rebuild()
+
+    def rebuild(self):
+        """Reindex every recommendation from storage"""
+        with self._lock:
+            self._stamp = file_stamp(self.recommendations_file)
+            self._by_farmer = {row["id"]: row for row in self.load_recommendations()}
+
+    def get(self, farmer_id):
+        """A farmer's saved recommendation, or None"""
+        with self._lock:
+            if file_stamp(self.recommendations_file) != self._stamp:
+                self.rebuild()
+            return self._by_farmer.get(farmer_id)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models-dir", default=".", help=f"directory holding {MODEL_FILE} and {ENCODER_FILE}")
+    parser.add_argument("--normals", default=CLIMATE_NORMALS_FILE, help="CSV grid of climate normals")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--top", type=int, default=TOP_CROPS, help="crops to keep per farmer")
+    parser.add_argument("--all", action="store_true", help="rescore every farmer, not only those out of date")
+    args = parser.parse_args()
+
+    version = inputs_version([os.path.join(args.models_dir, MODEL_FILE), os.path.join(args.models_dir, ENCODER_FILE),
+                              args.normals])
+    farmers = load_data(FARMERS_FILE)
+    saved = {row["id"]: row for row in load_data(RECOMMENDATIONS_FILE)}
+    stale = [farmer for farmer in farmers if args.all or saved.get(farmer["id"], {}).get("version") != version
+             or len(saved[farmer["id"]]["crops"]) != args.top]
+
+    started = time.perf_counter()
+    rows = score_all(stale, args.models_dir, args.normals, args.top, args.workers)
+    if rows:
+        save_recommendations(rows)
+    elapsed = time.perf_counter() - started
+    print(f"Scored {len(rows)} of {len(farmers)} farmers in {elapsed:.1f}s with {args.workers} workers "
+          f"(inputs version {version})")
+
+
+if __name__ == "__main__":
+    main()
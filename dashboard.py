@@ -0,0 +1,317 @@
+import threading
+import time
+
+from event_bus import ALL_TOPICS
+from storage import communities_file, file_stamp, polls_file
+
+# How often the worker rebuilds every row from storage anyway; shards changed
+# outside this process are already reloaded when they are next read
+REBUILD_SECONDS = 300.0
+
+# Events the worker may fall behind by before it gives up on deltas and rebuilds
+WORKER_QUEUE_SIZE = 10000
+
+# Message ids remembered per community to skip events already counted; an event
+# arriving later than this many newer messages would be counted twice
+RECENT_MESSAGE_IDS = 1000
+
+
+def _empty_user_row():
+    return {
+        "active_polls": 0,
+        "fulfilled_polls": 0,
+        "responses_received": 0,
+        "active_commitments": 0,
+        "committed": {}
+    }
+
+
+def _poll_summary(poll):
+    """The parts of a poll that count towards the summary rows"""
+    return {
+        "community_id": poll["community_id"],
+        "vendor_id": poll["vendor_id"],
+        "unit": poll["unit"],
+        "active": poll["status"] != "closed",
+        "fulfilled": poll["status"] == "fulfilled",
+        "total_committed": poll["total_committed"],
+        "responses": {farmer_id: r["quantity"] for farmer_id, r in poll["responses"].items()}
+    }
+
+
+class DashboardSummaries:
+    """Materialized summary rows behind the "My Communities" and "Active Commitments" pages
+
+    There is one row per community (member, message and active poll counts) and
+    one per user (active polls or commitments and committed quantities by unit).
+    Rows are updated by applying write events from the event bus, so rendering a
+    page reads a few rows instead of recomputing them from the data files.
+
+    Every event can be applied more than once: poll events carry the whole poll
+    and replace its previous contribution, membership is a set, and a message
+    only counts if its id is not among the community's recent message ids.
+    Message events may arrive out of order, as they are published after the
+    write's lock is released.
+
+    The rows also remember the stamp of each communities and polls shard they
+    reflect. The app's own writes move it on via `apply_write`; a shard changed
+    by anything else (another server process, a script) no longer matches, and
+    its rows are reloaded on the next read.
+    """
+
+    def __init__(self, community_files, load_communities, poll_files, load_polls):
+        self.community_files = community_files
+        self.load_communities = load_communities  # communities of one shard
+        self.poll_files = poll_files
+        self.load_polls = load_polls  # polls of one shard
+        self._lock = threading.Lock()
+        self._applied = threading.Condition(self._lock)
+        self.applied_seq = 0
+        self._stamps = {}
+        self._communities = {}
+        self._message_ids = {}
+        self._user_communities = {}
+        self._polls = {}
+        self._users = {}
+
+    def _user_row(self, user_id):
+        row = self._users.get(user_id)
+        if row is None:
+            row = self._users[user_id] = _empty_user_row()
+        return row
+
+    def _add_community(self, community):
+        row = self._communities.get(community["id"])
+        if row is None:
+            messages = community.get("messages", [])
+            row = self._communities[community["id"]] = {
+                "id": community["id"],
+                "name": community["name"],
+                "vendor_name": community["vendor_name"],
+                "position": len(self._communities),
+                "member_count": 0,
+                "message_count": len(messages) + community.get("archived_message_count", 0),
+                "last_message_at": messages[-1]["timestamp"] if messages else "",
+                "active_polls": 0
+            }
+            self._remember_messages(community)
+        for member in community["members"]:
+            self._add_member(community["id"], member["id"])
+
+    def _add_member(self, community_id, user_id):
+        row = self._communities.get(community_id)
+        joined = self._user_communities.setdefault(user_id, set())
+        if row and community_id not in joined:
+            joined.add(community_id)
+            row["member_count"] += 1
+
+    def _remember_messages(self, community):
+        """Start the recent message ids of a community from the messages it holds"""
+        messages = community.get("messages", [])[-RECENT_MESSAGE_IDS:]
+        self._message_ids[community["id"]] = dict.fromkeys(message["id"] for message in messages)
+
+    def _add_message(self, community_id, message):
+        row = self._communities.get(community_id)
+        ids = self._message_ids.get(community_id)
+        if not row or message["id"] in ids:
+            return
+        ids[message["id"]] = None
+        if len(ids) > RECENT_MESSAGE_IDS:
+            del ids[next(iter(ids))]
+        row["message_count"] += 1
+        row["last_message_at"] = max(row["last_message_at"], message["timestamp"])
+
+    def _apply_poll(self, summary, sign):
+        """Add (sign=1) or take away (sign=-1) one poll's contribution to the rows"""
+        if not summary["active"]:
+            return
+        community = self._communities.get(summary["community_id"])
+        if community:
+            community["active_polls"] += sign
+
+        vendor = self._user_row(summary["vendor_id"])
+        vendor["active_polls"] += sign
+        vendor["fulfilled_polls"] += sign * summary["fulfilled"]
+        vendor["responses_received"] += sign * len(summary["responses"])
+        self._add_quantity(vendor, summary["unit"], sign * summary["total_committed"])
+
+        for farmer_id, quantity in summary["responses"].items():
+            farmer = self._user_row(farmer_id)
+            farmer["active_commitments"] += sign
+            self._add_quantity(farmer, summary["unit"], sign * quantity)
+
+    @staticmethod
+    def _add_quantity(row, unit, quantity):
+        total = row["committed"].get(unit, 0) + quantity
+        if total:
+            row["committed"][unit] = total
+        else:
+            row["committed"].pop(unit, None)
+
+    def _put_poll(self, poll):
+        self._remove_poll(poll["id"])
+        summary = self._polls[poll["id"]] = _poll_summary(poll)
+        self._apply_poll(summary, 1)
+
+    def _remove_poll(self, poll_id):
+        summary = self._polls.pop(poll_id, None)
+        if summary:
+            self._apply_poll(summary, -1)
+
+    def _reload_communities(self, file_path):
+        """Replace the community rows of one shard with those of its current version"""
+        self._stamps[file_path] = file_stamp(file_path)
+        communities = {community["id"]: community for community in self.load_communities(file_path)}
+        for community_id in [c for c in self._communities if communities_file(c) == file_path]:
+            if community_id not in communities:
+                del self._communities[community_id]
+                del self._message_ids[community_id]
+        for community in communities.values():
+            row = self._communities.get(community["id"])
+            if row:
+                messages = community.get("messages", [])
+                row.update(name=community["name"], vendor_name=community["vendor_name"],
+                           member_count=len({member["id"] for member in community["members"]}),
+                           message_count=len(messages) + community.get("archived_message_count", 0),
+                           last_message_at=messages[-1]["timestamp"] if messages else "")
+                self._remember_messages(community)
+                for member in community["members"]:
+                    self._user_communities.setdefault(member["id"], set()).add(community["id"])
+            else:
+                self._add_community(community)
+
+    def _reload_polls(self, file_path):
+        """Replace the contributions of one shard's polls with those of its current version"""
+        self._stamps[file_path] = file_stamp(file_path)
+        polls = self.load_polls(file_path)
+        ids = {poll["id"] for poll in polls}
+        for poll_id in [p for p, summary in self._polls.items() if polls_file(summary["community_id"]) == file_path]:
+            if poll_id not in ids:
+                self._remove_poll(poll_id)
+        for poll in polls:
+            self._put_poll(poll)
+
+    def _refresh(self):
+        for file_path in self.community_files:
+            if file_stamp(file_path) != self._stamps.get(file_path):
+                self._reload_communities(file_path)
+        for file_path in self.poll_files:
+            if file_stamp(file_path) != self._stamps.get(file_path):
+                self._reload_polls(file_path)
+
+    def rebuild(self, seq=0):
+        """Recompute every row from storage
+
+        `seq` is the last event sequence number published before the data was
+        loaded; those events are all reflected in the rebuilt rows.
+        """
+        fresh = DashboardSummaries(self.community_files, self.load_communities, self.poll_files, self.load_polls)
+        communities = []
+        for file_path in self.community_files:
+            fresh._stamps[file_path] = file_stamp(file_path)
+            communities.extend(self.load_communities(file_path))
+        # Rows are numbered in load order, which would otherwise be by shard rather than by creation
+        for community in sorted(communities, key=lambda c: c.get("created_at", "")):
+            fresh._add_community(community)
+        for file_path in self.poll_files:
+            fresh._reload_polls(file_path)
+
+        with self._applied:
+            self._stamps = fresh._stamps
+            self._communities = fresh._communities
+            self._message_ids = fresh._message_ids
+            self._user_communities = fresh._user_communities
+            self._polls = fresh._polls
+            self._users = fresh._users
+            self.applied_seq = max(self.applied_seq, seq)
+            self._applied.notify_all()
+
+    def apply_write(self, file_path, stamp_before):
+        """Note a write this process just made to a communities or polls shard
+
+        Call while still holding the shard's lock; the rows themselves are
+        updated by the write's event. `stamp_before` is the shard's stamp taken
+        under the lock before the write; if the rows had not seen that version,
+        somebody else wrote in between and the shard is reloaded on the next read.
+        """
+        with self._lock:
+            if stamp_before == self._stamps.get(file_path):
+                self._stamps[file_path] = file_stamp(file_path)
+
+    def apply(self, event):
+        """Apply one write event from the event bus"""
+        with self._applied:
+            if event["type"] == "community_created":
+                self._add_community(event["community"])
+            elif event["type"] == "member_added":
+                self._add_member(event["community_id"], event["member"]["id"])
+            elif event["type"] == "message_added":
+                self._add_message(event["community_id"], event["message"])
+            elif event["type"] == "poll_updated":
+                self._put_poll(event["poll"])
+            elif event["type"] == "poll_deleted":
+                self._remove_poll(event["poll_id"])
+            self.applied_seq = max(self.applied_seq, event["seq"])
+            self._applied.notify_all()
+
+    def wait_for(self, seq, timeout=1.0):
+        """Wait until events up to `seq` are applied; returns False on timeout"""
+        with self._applied:
+            return self._applied.wait_for(lambda: self.applied_seq >= seq, timeout)
+
+    def user_communities(self, user_id):
+        """Summary rows of the communities a user belongs to, in creation order"""
+        with self._lock:
+            self._refresh()
+            rows = [dict(self._communities[c]) for c in self._user_communities.get(user_id, ())
+                    if c in self._communities]
+        return sorted(rows, key=lambda row: row["position"])
+
+    def user_summary(self, user_id):
+        """A user's summary row"""
+        with self._lock:
+            self._refresh()
+            row = self._users.get(user_id)
+            summary = dict(row, committed=dict(row["committed"])) if row else _empty_user_row()
+            summary["community_count"] = len(self._user_communities.get(user_id, ()))
+        return summary
+
+
+class DashboardWorker(threading.Thread):
+    """Background thread that keeps DashboardSummaries up to date from the event bus
+
+    It applies every event published on the bus, and rebuilds all rows when it
+    falls too far behind and on a timer.
+    """
+
+    def __init__(self, summaries, bus, rebuild_seconds=REBUILD_SECONDS):
+        super().__init__(name="dashboard-worker", daemon=True)
+        self.summaries = summaries
+        self.bus = bus
+        self.rebuild_seconds = rebuild_seconds
+        # Subscribe before the first rebuild so nothing published in between is missed
+        self.subscription = bus.subscribe(ALL_TOPICS, max_queue=WORKER_QUEUE_SIZE)
+        self._stopped = threading.Event()
+
+    def catch_up(self):
+        """Drop pending events and rebuild every row from storage"""
+        seq = self.bus.last_seq
+        self.subscription.reset()
+        self.summaries.rebuild(seq)
+
+    def run(self):
+        next_rebuild = time.monotonic() + self.rebuild_seconds
+        while not self._stopped.is_set():
+            event = self.subscription.get(timeout=max(0.0, next_rebuild - time.monotonic()))
+            try:
+                if self.subscription.overflowed or time.monotonic() >= next_rebuild:
+                    next_rebuild = time.monotonic() + self.rebuild_seconds
+                    self.catch_up()
+                elif event:
+                    self.summaries.apply(event)
+            except Exception as e:
+                print(f"Dashboard summary update failed: {e}")
+
+    def stop(self):
+        self._stopped.set()
+        self.subscription.close()
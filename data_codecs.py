@@ -0,0 +1,175 @@
+"""Codecs for the JSON data files, with format detection on read.
+
+Three formats are supported:
+
+- json: pretty-printed JSON, as the files have always been written. It is
+  encoded and parsed with orjson when that is installed.
+- msgpack: MessagePack behind a short header. It needs the msgpack package.
+- records: length-prefixed records behind a short header. Each list item is
+  stored as a 4-byte length followed by its compact JSON. It needs no extra
+  packages.
+
+Binary files start with a 4-byte magic and a version byte, and JSON files
+never do, so load_data tells the formats apart from the first bytes. The
+file names do not change.
+
+save_data keeps the format a file already has. New files are written in
+the DATA_FORMAT environment variable's format, which defaults to json.
+
+Convert data files in place, under their locks, e.g.:
+
+    python data_codecs.py convert --to records farmers.json vendors.json communities.json
+    python data_codecs.py convert --to json farmers.json
+    python data_codecs.py info *.json
+"""
+import argparse
+import json
+import os
+import struct
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+HEADER_SIZE = 5
+_LENGTH = struct.Struct("<I")
+
+
+class JsonCodec:
+    name = "json"
+    magic = None
+
+    def encode(self, data):
+        if orjson is not None:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+        return json.dumps(data, indent=2).encode("utf-8")
+
+    def decode(self, raw):
+        if orjson is not None:
+            return orjson.loads(raw)
+        return json.loads(raw)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    magic = b"CRPM\x01"
+
+    def encode(self, data):
+        if msgpack is None:
+            raise RuntimeError("The msgpack format needs the msgpack package (pip install msgpack)")
+        return self.magic + msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, raw):
+        if msgpack is None:
+            raise RuntimeError("This file is in msgpack format; install the msgpack package to read it")
+        return msgpack.unpackb(memoryview(raw)[HEADER_SIZE:], raw=False)
+
+
+class RecordsCodec:
+    """A list as length-prefixed compact JSON records; other values as one record"""
+
+    name = "records"
+    magic = b"CRPR\x01"
+
+    def _dumps(self, value):
+        if orjson is not None:
+            return orjson.dumps(value)
+        return json.dumps(value, separators=(',', ':')).encode("utf-8")
+
+    def _loads(self, raw):
+        if orjson is not None:
+            return orjson.loads(raw)
+        return json.loads(bytes(raw))
+
+    def encode(self, data):
+        if not isinstance(data, list):
+            return self.magic + b"V" + self._dumps(data)
+        parts = [self.magic, b"L"]
+        for item in data:
+            record = self._dumps(item)
+            parts.append(_LENGTH.pack(len(record)))
+            parts.append(record)
+        return b"".join(parts)
+
+    def decode(self, raw):
+        view = memoryview(raw)
+        if view[HEADER_SIZE:HEADER_SIZE + 1] == b"V":
+            return self._loads(view[HEADER_SIZE + 1:])
+        records = []
+        offset = HEADER_SIZE + 1
+        end = len(view)
+        while offset < end:
+            (length,) = _LENGTH.unpack_from(view, offset)
+            offset += _LENGTH.size
+            records.append(view[offset:offset + length])
+            offset += length
+        # Parsing the records as one array is much faster than one parse per record
+        return self._loads(b"[" + b",".join(records) + b"]")
+
+
+CODECS = {codec.name: codec for codec in (JsonCodec(), MsgpackCodec(), RecordsCodec())}
+
+
+def default_codec():
+    """Codec for newly created data files"""
+    name = os.environ.get("DATA_FORMAT", "json")
+    if name not in CODECS:
+        raise ValueError(f"Unknown DATA_FORMAT {name!r}; expected one of {', '.join(CODECS)}")
+    return CODECS[name]
+
+
+def detect(head):
+    """The codec of a file, given its first HEADER_SIZE bytes"""
+    for codec in CODECS.values():
+        if codec.magic is not None and head.startswith(codec.magic):
+            return codec
+    return CODECS["json"]
+
+
+def file_codec(file_path):
+    """The codec of an existing file, or None if there is no file"""
+    try:
+        with open(file_path, 'rb') as f:
+            return detect(f.read(HEADER_SIZE))
+    except FileNotFoundError:
+        return None
+
+
+def decode(raw):
+    return detect(raw[:HEADER_SIZE]).decode(raw)
+
+
+def main():
+    from storage import file_lock, load_data, save_data
+
+    parser = argparse.ArgumentParser(description="Convert data files between formats")
+    commands = parser.add_subparsers(dest="command", required=True)
+    convert = commands.add_parser("convert", help="rewrite files in another format, keeping their names")
+    convert.add_argument("--to", required=True, choices=sorted(CODECS))
+    convert.add_argument("files", nargs="+")
+    info = commands.add_parser("info", help="show the format and size of files")
+    info.add_argument("files", nargs="+")
+    args = parser.parse_args()
+
+    for file_path in args.files:
+        codec = file_codec(file_path)
+        if codec is None:
+            print(f"{file_path}: not found")
+            continue
+        if args.command == "info":
+            print(f"{file_path}: {codec.name}, {os.path.getsize(file_path):,} bytes")
+            continue
+        with file_lock(file_path):
+            before = os.path.getsize(file_path)
+            save_data(load_data(file_path), file_path, codec=CODECS[args.to])
+            print(f"{file_path}: {codec.name} -> {args.to}, {before:,} -> {os.path.getsize(file_path):,} bytes")
+
+
+if __name__ == "__main__":
+    main()
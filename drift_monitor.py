@@ -0,0 +1,317 @@
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from metrics import counter
+from storage import file_lock
+
+TRAINING_DATA_FILE = "Crop_recommendation.csv"
+
+# Running totals of every server process, and the drift reports made from them
+DRIFT_STATE_FILE = "drift_state.json"
+DRIFT_REPORTS_FILE = "drift_reports.jsonl"
+
+# How often each process adds what it saw to the totals and writes a report
+DRIFT_INTERVAL_SECONDS = float(os.environ.get("DRIFT_INTERVAL", "300"))
+
+# Totals are started afresh after this long, so a report reflects recent traffic
+DRIFT_WINDOW_SECONDS = float(os.environ.get("DRIFT_WINDOW", str(7 * 86400)))
+
+# Bins per feature; edges are the training data's quantiles, so each bin held
+# about the same share of it
+REFERENCE_BINS = 10
+
+# Population stability index: below MODERATE is stable, above SEVERE has drifted
+PSI_MODERATE = 0.1
+PSI_SEVERE = 0.25
+
+# Fewer inputs than this in a window are too few to score
+MIN_OBSERVATIONS = 100
+
+# Shares are floored at this, so an empty bin does not make the index infinite
+PSI_FLOOR = 1e-4
+
+# Values no soil or weather reading can take, per feature
+POSSIBLE_RANGES = {"N": (0, math.inf), "P": (0, math.inf), "K": (0, math.inf), "temperature": (-60, 60),
+                   "humidity": (0, 100), "ph": (0, 14), "rainfall": (0, math.inf)}
+
+# Kinds of degenerate input; only "ok" and "out_of_training_range" inputs count
+# towards the feature statistics, the rest are junk
+ALL_ZERO = "all_zero"
+NOT_FINITE = "not_finite"
+IMPOSSIBLE = "impossible"
+OUT_OF_TRAINING_RANGE = "out_of_training_range"
+OK = "ok"
+
+PREDICTION_INPUTS = counter("prediction_inputs", "Crop prediction inputs, by the kind of degenerate input they are")
+
+
+class RunningStats:
+    """Count, mean, variance, minimum and maximum of a stream, in constant memory (Welford's method)"""
+
+    __slots__ = ("count", "mean", "m2", "low", "high")
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, low=math.inf, high=-math.inf):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.low = low
+        self.high = high
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.low = min(self.low, value)
+        self.high = max(self.high, value)
+
+    def merge(self, other):
+        """Add another stream's statistics to these (Chan et al.'s pairwise update)"""
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.low = min(self.low, other.low)
+        self.high = max(self.high, other.high)
+
+    @property
+    def std(self):
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "low": self.low if self.count else None, "high": self.high if self.count else None}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["count"], data["mean"], data["m2"],
+                   math.inf if data["low"] is None else data["low"], -math.inf if data["high"] is None else data["high"])
+
+
+def psi(expected, actual):
+    """Population stability index of observed bin shares against expected ones"""
+    return sum((a - e) * math.log(a / e)
+               for e, a in ((max(e, PSI_FLOOR), max(a, PSI_FLOOR)) for e, a in zip(expected, actual)))
+
+
+def binned_ks(expected, actual):
+    """Largest gap between the expected and observed cumulative shares at the bin edges
+
+    A lower bound of the Kolmogorov-Smirnov statistic, which needs every value.
+    """
+    gap = expected_total = actual_total = 0.0
+    for e, a in zip(expected, actual):
+        expected_total += e
+        actual_total += a
+        gap = max(gap, abs(expected_total - actual_total))
+    return gap
+
+
+def _status(score):
+    if score >= PSI_SEVERE:
+        return "drift"
+    return "moderate" if score >= PSI_MODERATE else "stable"
+
+
+class Reference:
+    """What the model was trained on: each feature's bin edges, bin shares and range, and the label shares"""
+
+    def __init__(self, features, edges, shares, stats, labels):
+        self.features = features
+        self.edges = edges
+        self.shares = shares
+        self.stats = stats
+        self.labels = labels
+
+    @classmethod
+    def from_csv(cls, path, features, label_column="label", bins=REFERENCE_BINS):
+        data = pd.read_csv(path)
+        edges, shares, stats = {}, {}, {}
+        for name in features:
+            values = data[name].to_numpy(dtype=float)
+            # Repeated quantiles (integer features) would make empty bins
+            inner = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)[1:-1])).tolist()
+            counts = np.bincount(np.searchsorted(inner, values, side="right"), minlength=len(inner) + 1)
+            edges[name] = inner
+            shares[name] = (counts / len(values)).tolist()
+            stats[name] = RunningStats(len(values), float(values.mean()), float(((values - values.mean()) ** 2).sum()),
+                                       float(values.min()), float(values.max()))
+        labels = (data[label_column].value_counts() / len(data)).to_dict()
+        return cls(list(features), edges, shares, stats, labels)
+
+
+class DriftMonitor:
+    """Streaming statistics of the crop prediction inputs and outputs, to compare with the training data
+
+    For each feature it keeps running statistics and counts in the reference
+    bins; for each predicted crop, a count; and a count of each kind of
+    degenerate input. Memory does not grow with traffic, and observing an input
+    is a few comparisons and additions under a lock.
+
+    What this process observed is periodically added to the totals in the
+    drift state file, which all processes share, and the drift of the totals
+    against the training data is appended to the reports file.
+    """
+
+    def __init__(self, reference, state_file=DRIFT_STATE_FILE, reports_file=DRIFT_REPORTS_FILE,
+                 window=DRIFT_WINDOW_SECONDS):
+        self.reference = reference
+        self.state_file = state_file
+        self.reports_file = reports_file
+        self.window = window
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._stats = {name: RunningStats() for name in self.reference.features}
+        self._bins = {name: [0] * (len(self.reference.edges[name]) + 1) for name in self.reference.features}
+        self._labels = {}
+        self._kinds = {}
+
+    def classify(self, values):
+        """The kind of degenerate input `values` (in feature order) is, or "ok" """
+        if not all(math.isfinite(value) for value in values):
+            return NOT_FINITE
+        if not any(values):
+            return ALL_ZERO
+        out_of_training_range = False
+        for name, value in zip(self.reference.features, values):
+            low, high = POSSIBLE_RANGES.get(name, (-math.inf, math.inf))
+            if not low <= value <= high:
+                return IMPOSSIBLE
+            stats = self.reference.stats[name]
+            out_of_training_range |= not stats.low <= value <= stats.high
+        return OUT_OF_TRAINING_RANGE if out_of_training_range else OK
+
+    def observe(self, values, label=None):
+        """Record one prediction's inputs (in feature order) and predicted label; returns the kind of input"""
+        values = [float(value) for value in values]
+        kind = self.classify(values)
+        PREDICTION_INPUTS.inc(kind=kind)
+        with self._lock:
+            self._kinds[kind] = self._kinds.get(kind, 0) + 1
+            if kind not in (OK, OUT_OF_TRAINING_RANGE):
+                return kind
+            for name, value in zip(self.reference.features, values):
+                self._stats[name].add(value)
+                self._bins[name][bisect_right(self.reference.edges[name], value)] += 1
+            if label is not None:
+                self._labels[str(label)] = self._labels.get(str(label), 0) + 1
+        return kind
+
+    def _empty_state(self):
+        return {
+            "window_started": time.time(),
+            "features": {name: {"stats": RunningStats().to_dict(), "bins": [0] * (len(self.reference.edges[name]) + 1)}
+                         for name in self.reference.features},
+            "labels": {},
+            "kinds": {}
+        }
+
+    def flush(self):
+        """Add what this process observed to the shared totals and return the totals"""
+        with self._lock:
+            stats, bins, labels, kinds = self._stats, self._bins, self._labels, self._kinds
+            self._reset()
+        with file_lock(self.state_file):
+            state = None
+            if os.path.exists(self.state_file):
+                with open(self.state_file, 'r') as f:
+                    state = json.load(f)
+            if state is None or time.time() - state["window_started"] > self.window:
+                state = self._empty_state()
+            for name in self.reference.features:
+                feature = state["features"][name]
+                total = RunningStats.from_dict(feature["stats"])
+                total.merge(stats[name])
+                feature["stats"] = total.to_dict()
+                feature["bins"] = [a + b for a, b in zip(feature["bins"], bins[name])]
+            for key, values in (("labels", labels), ("kinds", kinds)):
+                for name, count in values.items():
+                    state[key][name] = state[key].get(name, 0) + count
+            tmp_path = f"{self.state_file}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_file)
+        return state
+
+    def report(self, state):
+        """Drift of the totals against the training data, per feature and for the predicted labels"""
+        inputs = sum(state["kinds"].values())
+        scored = state["kinds"].get(OK, 0) + state["kinds"].get(OUT_OF_TRAINING_RANGE, 0)
+        enough = scored >= MIN_OBSERVATIONS
+        features = {}
+        for name in self.reference.features:
+            feature = state["features"][name]
+            stats = RunningStats.from_dict(feature["stats"])
+            expected = self.reference.shares[name]
+            actual = [count / stats.count for count in feature["bins"]] if stats.count else [0.0] * len(expected)
+            score = psi(expected, actual)
+            reference = self.reference.stats[name]
+            features[name] = {
+                "psi": round(score, 4),
+                "ks": round(binned_ks(expected, actual), 4),
+                "mean": stats.mean, "std": stats.std, "low": feature["stats"]["low"], "high": feature["stats"]["high"],
+                # How far the mean moved, in training standard deviations
+                "mean_shift": round((stats.mean - reference.mean) / reference.std, 3) if stats.count else None,
+                "status": _status(score) if enough else "too_few"
+            }
+        predicted = sum(state["labels"].values())
+        names = sorted(set(self.reference.labels) | set(state["labels"]))
+        label_psi = psi([self.reference.labels.get(name, 0.0) for name in names],
+                        [state["labels"].get(name, 0) / predicted if predicted else 0.0 for name in names])
+        return {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "window_started": datetime.fromtimestamp(state["window_started"]).isoformat(timespec="seconds"),
+            "inputs": inputs,
+            "degenerate": {kind: count for kind, count in sorted(state["kinds"].items()) if kind != OK},
+            "junk_share": round(1 - scored / inputs, 4) if inputs else 0.0,
+            "features": features,
+            "labels": {"psi": round(label_psi, 4), "status": _status(label_psi) if enough else "too_few",
+                       "counts": dict(sorted(state["labels"].items()))}
+        }
+
+    def check(self):
+        """Flush, append a report to the reports file and return it"""
+        report = self.report(self.flush())
+        with file_lock(self.reports_file):
+            with open(self.reports_file, 'a') as f:
+                f.write(json.dumps(report) + "\n")
+        return report
+
+
+class DriftWorker(threading.Thread):
+    """Background thread that checks the prediction inputs for drift every interval"""
+
+    def __init__(self, monitor, interval=DRIFT_INTERVAL_SECONDS):
+        super().__init__(name="drift-monitor", daemon=True)
+        self.monitor = monitor
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                report = self.monitor.check()
+            except Exception as e:
+                print(f"Drift check failed: {e}")
+                continue
+            drifted = [name for name, feature in report["features"].items() if feature["status"] == "drift"]
+            if report["labels"]["status"] == "drift":
+                drifted.append("predicted crops")
+            if drifted:
+                print(f"Prediction inputs have drifted from the training data: {', '.join(drifted)}")
+
+    def stop(self):
+        self._stopped.set()
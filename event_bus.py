@@ -0,0 +1,124 @@
+import itertools
+import threading
+import time
+import weakref
+from collections import deque
+
+# Events a subscriber may hold before it is marked as overflowed and must resync
+SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Subscribing to this topic receives the events of every topic
+ALL_TOPICS = "*"
+
+
+def community_topic(community_id):
+    """Topic name for all events of one community"""
+    return f"community:{community_id}"
+
+
+class Subscription:
+    """A subscriber's bounded queue of events for one topic"""
+
+    def __init__(self, bus, topic, max_queue=SUBSCRIBER_QUEUE_SIZE):
+        self.bus = bus
+        self.topic = topic
+        self.overflowed = False
+        self.closed = False
+        self._events = deque()
+        self._max_queue = max_queue
+        self._cond = threading.Condition()
+
+    def _deliver(self, event):
+        with self._cond:
+            if len(self._events) >= self._max_queue:
+                # The subscriber fell behind; it has to reload instead of applying deltas
+                self._events.popleft()
+                self.overflowed = True
+            self._events.append(event)
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Wait for the next event, returning None on timeout"""
+        with self._cond:
+            if not self._events and not self._cond.wait_for(lambda: self._events or self.closed, timeout):
+                return None
+            return self._events.popleft() if self._events else None
+
+    def drain(self):
+        """Return all pending events without blocking"""
+        with self._cond:
+            events = list(self._events)
+            self._events.clear()
+            return events
+
+    def reset(self):
+        """Drop pending events and clear the overflow flag after a resync"""
+        with self._cond:
+            self._events.clear()
+            self.overflowed = False
+
+    def close(self):
+        """Stop receiving events"""
+        self.bus.unsubscribe(self)
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+
+class EventBus:
+    """In-process publish/subscribe broker shared by all sessions of the app
+
+    Subscribers are held weakly, so a Streamlit session that goes away without
+    closing its subscription does not keep receiving events.
+    """
+
+    def __init__(self):
+        self._topics = {}
+        self._lock = threading.Lock()
+        self._seq = itertools.count(1)
+        self.last_seq = 0
+
+    def subscribe(self, topic, max_queue=SUBSCRIBER_QUEUE_SIZE):
+        """Subscribe to a topic"""
+        subscription = Subscription(self, topic, max_queue)
+        with self._lock:
+            self._topics.setdefault(topic, weakref.WeakSet()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        """Remove a subscription from its topic"""
+        with self._lock:
+            subscribers = self._topics.get(subscription.topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[subscription.topic]
+
+    def publish(self, topic, event_type, **payload):
+        """Publish an event to every subscriber of a topic"""
+        event = {
+            "seq": next(self._seq),
+            "type": event_type,
+            "topic": topic,
+            "published_at": time.time(),
+            **payload
+        }
+        with self._lock:
+            self.last_seq = max(self.last_seq, event["seq"])
+            subscribers = list(self._topics.get(topic, ())) + list(self._topics.get(ALL_TOPICS, ()))
+        for subscription in subscribers:
+            subscription._deliver(event)
+        return event
+
+    def subscriber_count(self, topic):
+        """Number of live subscribers of a topic"""
+        with self._lock:
+            return len(self._topics.get(topic, ()))
+
+
+_default_bus = EventBus()
+
+
+def get_event_bus():
+    """The process-wide event bus"""
+    return _default_bus
@@ -0,0 +1,83 @@
+import json
+
+# Changes to a data file are appended, one JSON object per line, to <file>.wal
+WAL_SUFFIX = ".wal"
+
+
+def wal_path(file_path):
+    return file_path + WAL_SUFFIX
+
+
+def insert_change(item):
+    """Add an item (with an "id") to a data file"""
+    return {"op": "insert", "item": item}
+
+
+def replace_change(item):
+    """Put an item (with an "id") in place of the one with that id, or add it"""
+    return {"op": "replace", "item": item}
+
+
+def append_change(item_id, field, value):
+    """Append a value (with an "id") to a list field of an item"""
+    return {"op": "append", "id": item_id, "field": field, "value": value}
+
+
+def log_changes(file_path, changes):
+    """Append changes to a data file's log; the caller holds the file's lock"""
+    with open(wal_path(file_path), 'a') as f:
+        f.write("".join(json.dumps(change, separators=(',', ':')) + "\n" for change in changes))
+
+
+def read_changes(file_path):
+    """Logged changes of a data file, oldest first, and the number of log bytes they span"""
+    try:
+        with open(wal_path(file_path), 'rb') as f:
+            raw = f.read()
+    except FileNotFoundError:
+        return [], 0
+    # A change still being written has no newline yet
+    end = raw.rfind(b"\n") + 1
+    return [json.loads(line) for line in raw[:end].splitlines()], end
+
+
+def apply_changes(items, changes):
+    """Replay changes onto a list of items
+
+    Changes are idempotent: an insert of an id that is already there, or an
+    append of a value whose id the field already holds, is skipped, and a
+    replace leaves the same item whatever was there. So a log replayed onto a
+    snapshot that already contains some of its changes gives the same result.
+    """
+    if not changes:
+        return items
+    positions = {item["id"]: i for i, item in enumerate(items)}
+    field_ids = {}
+    for change in changes:
+        if change["op"] == "insert":
+            item = change["item"]
+            if item["id"] not in positions:
+                positions[item["id"]] = len(items)
+                items.append(item)
+        elif change["op"] == "replace":
+            item = change["item"]
+            if item["id"] in positions:
+                items[positions[item["id"]]] = item
+                field_ids.pop(item["id"], None)
+            else:
+                positions[item["id"]] = len(items)
+                items.append(item)
+        elif change["op"] == "append":
+            if change["id"] not in positions:
+                continue
+            item = items[positions[change["id"]]]
+            fields = field_ids.setdefault(change["id"], {})
+            ids = fields.get(change["field"])
+            if ids is None:
+                ids = fields[change["field"]] = {value["id"] for value in item[change["field"]]}
+            if change["value"]["id"] not in ids:
+                ids.add(change["value"]["id"])
+                item[change["field"]].append(change["value"])
+        else:
+            raise ValueError(f"Unknown change {change['op']!r}")
+    return items
@@ -0,0 +1,223 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+# "off" (the default) makes every metric call return at once; "prometheus"
+# rewrites metrics.prom in the Prometheus text format (e.g. for node_exporter's
+# textfile collector) and "json" appends a snapshot to metrics.jsonl, once per
+# export interval
+EXPORT = os.environ.get("APP_METRICS", "off")
+ENABLED = EXPORT != "off"
+
+EXPORT_INTERVAL_SECONDS = float(os.environ.get("APP_METRICS_INTERVAL", "15"))
+PROMETHEUS_FILE = "metrics.prom"
+JSON_LOG_FILE = "metrics.jsonl"
+
+# Upper bounds of the histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1 << 10, 1 << 13, 1 << 16, 1 << 18, 1 << 20, 1 << 22, 1 << 24, 1 << 26, 1 << 28)
+COUNT_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+        self.started = time.perf_counter()
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def stop(self):
+        """Observe the seconds since the timer started (only the first call counts)"""
+        if self.started is not None:
+            self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+            self.started = None
+
+
+class _NoTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def stop(self):
+        pass
+
+
+_NO_TIMER = _NoTimer()
+
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+class Histogram:
+    """Observed values per label set, counted in buckets like a Prometheus histogram"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}  # label key -> [per-bucket counts (the last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def time(self, **labels):
+        """A timer observing the seconds it ran: use it as a context manager, or call .stop()"""
+        return _Timer(self, labels) if ENABLED else _NO_TIMER
+
+    def samples(self):
+        """{label key: (cumulative bucket counts, count, sum)}"""
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        samples = {}
+        for key, (counts, total) in series.items():
+            cumulative = []
+            running = 0
+            for count in counts:
+                running += count
+                cumulative.append(running)
+            samples[key] = (cumulative, running, total)
+        return samples
+
+
+class Counter:
+    """A running total per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name, help):
+        self.name = name
+        self.help = help
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        if not ENABLED:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            return dict(self._series)
+
+
+def _register(metric_type, name, *args):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = metric_type(name, *args)
+        elif not isinstance(metric, metric_type):
+            raise ValueError(f"metric {name} is already registered as a {metric.kind}")
+        return metric
+
+
+def histogram(name, help, buckets=LATENCY_BUCKETS):
+    """The histogram with this name, registered on first use"""
+    return _register(Histogram, name, help, buckets)
+
+
+def counter(name, help):
+    """The counter with this name, registered on first use"""
+    return _register(Counter, name, help)
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def render_prometheus():
+    """Every metric in the Prometheus text exposition format"""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        if metric.kind == "counter":
+            for key, value in sorted(metric.samples().items()):
+                lines.append(f"{metric.name}_total{_format_labels(key)} {value}")
+            continue
+        for key, (cumulative, count, total) in sorted(metric.samples().items()):
+            for bound, running in zip(metric.buckets + ("+Inf",), cumulative):
+                lines.append(f"{metric.name}_bucket{_format_labels(key, [('le', str(bound))])} {running}")
+            lines.append(f"{metric.name}_sum{_format_labels(key)} {total}")
+            lines.append(f"{metric.name}_count{_format_labels(key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot():
+    """Every metric as a JSON-ready dict"""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    result = {"time": time.time(), "metrics": {}}
+    for metric in metrics:
+        if metric.kind == "counter":
+            series = [{"labels": dict(key), "value": value} for key, value in sorted(metric.samples().items())]
+        else:
+            series = [{"labels": dict(key), "count": count, "sum": total,
+                       "buckets": dict(zip([str(b) for b in metric.buckets] + ["+Inf"], cumulative))}
+                      for key, (cumulative, count, total) in sorted(metric.samples().items())]
+        result["metrics"][metric.name] = {"type": metric.kind, "series": series}
+    return result
+
+
+class MetricsExporter(threading.Thread):
+    """Background thread that writes the metrics out every interval, as APP_METRICS says"""
+
+    def __init__(self, export=EXPORT, interval=EXPORT_INTERVAL_SECONDS):
+        super().__init__(name="metrics-exporter", daemon=True)
+        self.export = export
+        self.interval = interval
+        self._stopped = threading.Event()
+
+    def export_once(self):
+        if self.export == "prometheus":
+            # Swap the file in whole, so a scrape never reads half of it
+            tmp_path = f"{PROMETHEUS_FILE}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(render_prometheus())
+            os.replace(tmp_path, PROMETHEUS_FILE)
+        elif self.export == "json":
+            with open(JSON_LOG_FILE, 'a') as f:
+                f.write(json.dumps(snapshot()) + "\n")
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.export_once()
+            except Exception as e:
+                print(f"Metrics export failed: {e}")
+
+    def stop(self):
+        self._stopped.set()
@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+import uuid
+from datetime import datetime
+
+from storage import file_lock
+
+OUTBOX_FILE = "outbox.jsonl"
+
+# How often the worker checks the outbox when nobody wakes it
+OUTBOX_POLL_SECONDS = 5.0
+
+_wakeup = threading.Event()
+
+
+def enqueue(kind, **payload):
+    """Append an entry to the outbox; it is delivered later by the outbox worker"""
+    entry = {"id": str(uuid.uuid4()), "kind": kind, "queued_at": datetime.now().isoformat(), **payload}
+    with file_lock(OUTBOX_FILE):
+        with open(OUTBOX_FILE, 'a') as f:
+            f.write(json.dumps(entry) + "\n")
+    _wakeup.set()
+    return entry["id"]
+
+
+def _read_entries():
+    if not os.path.exists(OUTBOX_FILE):
+        return []
+    with open(OUTBOX_FILE, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def drain(handler):
+    """Deliver every pending entry with `handler`, keeping the ones that fail
+
+    The outbox file is only locked to take the pending entries and, afterwards,
+    to remove the delivered ones, so enqueues (including any the handler makes)
+    never wait for handlers and are never dropped. A separate lock keeps two
+    drains from delivering the same entries at once. Entries are removed only
+    after the handler returns, so delivery is at-least-once even if the process
+    dies part way through.
+    """
+    with file_lock(OUTBOX_FILE + ".drain"):
+        with file_lock(OUTBOX_FILE):
+            entries = _read_entries()
+        if not entries:
+            return 0
+
+        delivered = set()
+        for entry in entries:
+            try:
+                handler(entry)
+            except Exception as e:
+                print(f"Outbox delivery failed for {entry['id']}: {e}")
+            else:
+                delivered.add(entry["id"])
+        if not delivered:
+            return 0
+
+        with file_lock(OUTBOX_FILE):
+            remaining = [entry for entry in _read_entries() if entry["id"] not in delivered]
+            tmp_path = OUTBOX_FILE + ".tmp"
+            with open(tmp_path, 'w') as f:
+                for entry in remaining:
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp_path, OUTBOX_FILE)
+        return len(delivered)
+
+
+class OutboxWorker(threading.Thread):
+    """Background thread that delivers outbox entries as soon as they are enqueued"""
+
+    def __init__(self, handler, poll_seconds=OUTBOX_POLL_SECONDS):
+        super().__init__(name="outbox-worker", daemon=True)
+        self.handler = handler
+        self.poll_seconds = poll_seconds
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            _wakeup.wait(self.poll_seconds)
+            _wakeup.clear()
+            drain(self.handler)
+
+    def stop(self):
+        self._stopped.set()
+        _wakeup.set()
@@ -0,0 +1,124 @@
+import threading
+
+from storage import file_stamp
+
+
+class PollIndex:
+    """In-memory secondary indexes over polls, kept in step with the polls shards
+
+    Polls are indexed by id, community, vendor and responding farmer, so poll
+    lookups cost O(results) instead of a load and scan of every shard. The
+    app's own writes update the index in place via `apply_write`; if a shard
+    is changed by anything else (another worker process, a script), its stamp
+    no longer matches and that shard is reindexed on the next read.
+    """
+
+    def __init__(self, shard_files, load_polls):
+        self.shard_files = shard_files
+        self.load_polls = load_polls
+        self._lock = threading.RLock()
+        self._stamps = {}
+        self._shards = {file_path: set() for file_path in shard_files}  # poll ids in each shard
+        self._by_id = {}
+        self._by_community = {}
+        self._by_vendor = {}
+        self._by_farmer = {}
+        self.rebuild()
+
+    def rebuild(self):
+        """Reindex every shard from storage"""
+        with self._lock:
+            for file_path in self.shard_files:
+                self._rebuild_shard(file_path)
+
+    def _rebuild_shard(self, file_path, polls=None):
+        self._stamps[file_path] = file_stamp(file_path)
+        for poll_id in list(self._shards[file_path]):
+            self._remove(poll_id, file_path)
+        for poll in self.load_polls(file_path) if polls is None else polls:
+            self._put(poll, file_path)
+
+    def _refresh(self):
+        for file_path in self.shard_files:
+            if file_stamp(file_path) != self._stamps[file_path]:
+                self._rebuild_shard(file_path)
+
+    def _put(self, poll, file_path):
+        old = self._by_id.get(poll["id"])
+        if old:
+            for farmer_id in old["responses"]:
+                if farmer_id not in poll["responses"]:
+                    self._by_farmer.get(farmer_id, {}).pop(poll["id"], None)
+
+        self._by_id[poll["id"]] = poll
+        self._shards[file_path].add(poll["id"])
+        self._by_community.setdefault(poll["community_id"], {})[poll["id"]] = poll
+        self._by_vendor.setdefault(poll["vendor_id"], {})[poll["id"]] = poll
+        for farmer_id in poll["responses"]:
+            self._by_farmer.setdefault(farmer_id, {})[poll["id"]] = poll
+
+    def _remove(self, poll_id, file_path):
+        poll = self._by_id.pop(poll_id, None)
+        if not poll:
+            return
+        self._shards[file_path].discard(poll_id)
+        self._by_community.get(poll["community_id"], {}).pop(poll_id, None)
+        self._by_vendor.get(poll["vendor_id"], {}).pop(poll_id, None)
+        for farmer_id in poll["responses"]:
+            self._by_farmer.get(farmer_id, {}).pop(poll_id, None)
+
+    def apply_write(self, file_path, stamp_before, updated=(), removed=(), saved=None):
+        """Apply polls just saved to one shard by this process
+
+        Call while still holding the shard's lock. `stamp_before` is the shard's
+        stamp taken under the lock before loading; if the index had not seen
+        that version, somebody else wrote in between and the shard is reindexed,
+        from `saved` (all of the shard's polls, as just saved) if the caller has
+        them, so the shard is not loaded again.
+        """
+        with self._lock:
+            if stamp_before != self._stamps[file_path]:
+                self._rebuild_shard(file_path, saved)
+                return
+            for poll in updated:
+                self._put(poll, file_path)
+            for poll_id in removed:
+                self._remove(poll_id, file_path)
+            self._stamps[file_path] = file_stamp(file_path)
+
+    def get(self, poll_id):
+        """A poll by id, or None"""
+        with self._lock:
+            self._refresh()
+            return self._by_id.get(poll_id)
+
+    def community_of(self, poll_id):
+        """The community a poll belongs to, or None
+
+        A poll never moves to another community, so a known poll is answered
+        without checking the shards for changes.
+        """
+        with self._lock:
+            poll = self._by_id.get(poll_id)
+            if poll is None:
+                self._refresh()
+                poll = self._by_id.get(poll_id)
+            return poll["community_id"] if poll else None
+
+    def for_community(self, community_id):
+        """Polls of a community, oldest first"""
+        with self._lock:
+            self._refresh()
+            return list(self._by_community.get(community_id, {}).values())
+
+    def for_vendor(self, vendor_id):
+        """Polls created by a vendor, oldest first"""
+        with self._lock:
+            self._refresh()
+            return list(self._by_vendor.get(vendor_id, {}).values())
+
+    def for_farmer(self, farmer_id):
+        """Polls a farmer has responded to, oldest first"""
+        with self._lock:
+            self._refresh()
+            return sorted(self._by_farmer.get(farmer_id, {}).values(), key=lambda p: p["created_at"])
@@ -0,0 +1,116 @@
+import heapq
+import threading
+import time
+from datetime import datetime, timedelta
+
+# Longest the scheduler sleeps without checking for new work
+MAX_SLEEP_SECONDS = 300.0
+
+# Delay before polls are retried after expire_polls failed
+RETRY_SECONDS = 60.0
+
+
+def deadline_timestamp(deadline):
+    """A poll deadline ("YYYY-MM-DD") runs to the end of that day; return that moment as epoch seconds"""
+    return (datetime.strptime(deadline, "%Y-%m-%d") + timedelta(days=1)).timestamp()
+
+
+def _deadline_entry(poll):
+    """The heap entry for a poll, or None (logged) if its deadline cannot be read"""
+    try:
+        return (deadline_timestamp(poll["deadline"]), poll["id"])
+    except (KeyError, TypeError, ValueError) as e:
+        print(f"Poll {poll.get('id')} has an unreadable deadline {poll.get('deadline')!r} and will not expire: {e}")
+        return None
+
+
+class PollDeadlineScheduler(threading.Thread):
+    """Background thread that expires open polls when their deadline passes
+
+    Open polls sit in a min-heap keyed by deadline, so each wake-up only
+    touches the polls that are actually due. They are handed to `expire_polls`
+    as one batch. The heap lives in memory and is rebuilt from storage by
+    `load_polls` on start, so polls that expired while the app was down are
+    closed on the first tick. Polls closed or deleted by hand are not removed
+    from the heap; `expire_polls` skips anything that is no longer open.
+    """
+
+    def __init__(self, load_polls, expire_polls, max_sleep=MAX_SLEEP_SECONDS):
+        super().__init__(name="poll-deadline-scheduler", daemon=True)
+        self.load_polls = load_polls
+        self.expire_polls = expire_polls
+        self.max_sleep = max_sleep
+        self._heap = []
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+
+    def rebuild(self):
+        """Reload every open poll deadline from storage"""
+        # One malformed poll must not stop every other poll from expiring
+        heap = [entry for entry in (_deadline_entry(p) for p in self.load_polls() if p["status"] == "open") if entry]
+        heapq.heapify(heap)
+        with self._lock:
+            self._heap = heap
+        self._wakeup.set()
+
+    def schedule(self, poll):
+        """Track the deadline of a newly created poll"""
+        entry = _deadline_entry(poll)
+        if entry is None:
+            return
+        with self._lock:
+            heapq.heappush(self._heap, entry)
+            is_next = self._heap[0] == entry
+        if is_next:
+            self._wakeup.set()
+
+    def pop_due(self, now=None):
+        """Remove and return the ids of all polls whose deadline has passed"""
+        now = now or time.time()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                due.append(heapq.heappop(self._heap)[1])
+        return due
+
+    def seconds_until_next(self, now=None):
+        """Time until the earliest tracked deadline, capped at max_sleep"""
+        now = now or time.time()
+        with self._lock:
+            if not self._heap:
+                return self.max_sleep
+            return min(self.max_sleep, max(0.0, self._heap[0][0] - now))
+
+    def tick(self):
+        """Expire everything that is due; returns the number of polls handed over"""
+        due = self.pop_due()
+        if due:
+            try:
+                self.expire_polls(due)
+            except Exception:
+                # Put them back so a later tick tries again
+                retry_at = time.time() + RETRY_SECONDS
+                with self._lock:
+                    for poll_id in due:
+                        heapq.heappush(self._heap, (retry_at, poll_id))
+                raise
+        return len(due)
+
+    def run(self):
+        rebuilt = False
+        while not self._stopped.is_set():
+            try:
+                # Until the first rebuild succeeds there is nothing to tick; it is retried instead
+                if not rebuilt:
+                    self.rebuild()
+                    rebuilt = True
+                self.tick()
+            except Exception as e:
+                print(f"Poll deadline scheduler {'tick' if rebuilt else 'rebuild'} failed: {e}")
+            self._wakeup.wait(self.seconds_until_next() if rebuilt else RETRY_SECONDS)
+            self._wakeup.clear()
+
+    def stop(self):
+        self._stopped.set()
+        self._wakeup.set()
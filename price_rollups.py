@@ -0,0 +1,187 @@
+import bisect
+import threading
+
+import numpy as np
+
+from price_store import partition_key, to_timestamp
+from price_validator import FLAGGED
+
+DAY_US = 86_400_000_000
+
+# Length of each rollup period in days
+PERIODS = {"day": 1, "week": 7}
+
+# Trailing moving-average windows, in periods
+MOVING_AVERAGES = {"day": (7, 30), "week": (4, 12)}
+
+
+def bucket_start(day, period):
+    """First day (days since the epoch) of the period containing `day`; weeks start on Monday
+
+    Works on plain ints and on NumPy arrays alike.
+    """
+    if period == "week":
+        # 1970-01-01 was a Thursday
+        return (day + 3) // 7 * 7 - 3
+    return day
+
+
+class _Bucket:
+    """Aggregates of the prices in one period; the sorted values give an exact median"""
+
+    __slots__ = ("count", "total", "low", "high", "values")
+
+    def __init__(self, count, total, low, high, values):
+        self.count = count
+        self.total = total
+        self.low = low
+        self.high = high
+        self.values = values
+
+    def add(self, price):
+        self.count += 1
+        self.total += price
+        self.low = min(self.low, price)
+        self.high = max(self.high, price)
+        bisect.insort(self.values, price)
+
+    def median(self):
+        n = len(self.values)
+        return (self.values[(n - 1) // 2] + self.values[n // 2]) / 2
+
+
+def backfill(columns):
+    """Rollups {unit: {period: {bucket start day: _Bucket}}} from price columns (ts, price, unit, review)
+
+    Prices flagged by the validator are left out.
+    """
+    kept = columns["review"] != FLAGGED
+    columns = {name: values[kept] for name, values in columns.items()}
+    days = columns["ts"] // DAY_US
+    rollups = {}
+    for unit in np.unique(columns["unit"]):
+        mask = columns["unit"] == unit
+        rollups[str(unit)] = by_period = {}
+        for period in PERIODS:
+            # Sort by bucket, then price, so every bucket is a contiguous, sorted slice
+            buckets = bucket_start(days[mask], period)
+            prices = columns["price"][mask]
+            order = np.lexsort((prices, buckets))
+            buckets, prices = buckets[order], prices[order]
+            starts, first, counts = np.unique(buckets, return_index=True, return_counts=True)
+            totals = np.add.reduceat(prices, first)
+            lows = prices[first]
+            highs = prices[first + counts - 1]
+            by_period[period] = {
+                int(start): _Bucket(int(count), float(total), float(low), float(high), values.tolist())
+                for start, count, total, low, high, values
+                in zip(starts, counts, totals, lows, highs, np.split(prices, first[1:]))
+            }
+    return rollups
+
+
+class PriceRollups:
+    """Daily and weekly price aggregates per product, location and unit
+
+    Each (product, location) partition of the price store is backfilled with a
+    vectorized pass over its columns the first time it is read, then kept up to
+    date by `add` as prices are posted. Like the poll index, it notices prices
+    added by other processes through the store's partition version and
+    backfills that partition again.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._partitions = {}
+
+    def _load(self, product, location):
+        """Rollups of one partition, backfilled from the store if missing or stale"""
+        key = partition_key(product, location)
+        version = self.store.version(product, location)
+        with self._lock:
+            cached = self._partitions.get(key)
+            if cached and cached[0] == version:
+                return
+        rollups = backfill(self.store.scan(product, location, columns=("ts", "price", "unit", "review")))
+        with self._lock:
+            self._partitions[key] = (version, rollups)
+
+    def add(self, entry, version_before, version_after):
+        """Fold a newly stored price into the rollups
+
+        Call while holding the store lock, with the partition versions read just
+        before and after the append.
+        """
+        key = partition_key(entry["product"], entry["location"])
+        day = to_timestamp(entry["timestamp"]) // DAY_US
+        with self._lock:
+            cached = self._partitions.get(key)
+            if cached is None or cached[0] != version_before:
+                # Not loaded yet, or changed elsewhere: it is backfilled on the next read
+                self._partitions.pop(key, None)
+                return
+            if entry.get("review") == FLAGGED:
+                self._partitions[key] = (version_after, cached[1])
+                return
+            by_period = cached[1].setdefault(entry["unit"], {period: {} for period in PERIODS})
+            for period, buckets in by_period.items():
+                start = bucket_start(day, period)
+                bucket = buckets.get(start)
+                if bucket is None:
+                    buckets[start] = _Bucket(1, entry["price"], entry["price"], entry["price"], [entry["price"]])
+                else:
+                    bucket.add(entry["price"])
+            self._partitions[key] = (version_after, cached[1])
+
+    def series(self, product, location=None, period="day"):
+        """Rollup series of a product, one per location and unit, each oldest period first
+
+        Every series has per-period "start", "count", "min", "max", "mean" and
+        "median" arrays, plus "ma_<n>" trailing moving averages over the
+        MOVING_AVERAGES windows: the mean of every price in the window, so each
+        period's mean counts in proportion to its number of prices.
+        """
+        partitions = self.store.partitions(product, location)
+        for partition_product, partition_location in partitions:
+            self._load(partition_product, partition_location)
+
+        result = []
+        with self._lock:
+            for partition_product, partition_location in partitions:
+                cached = self._partitions.get(partition_key(partition_product, partition_location))
+                if not cached:
+                    continue
+                for unit, by_period in sorted(cached[1].items()):
+                    buckets = by_period[period]
+                    if not buckets:
+                        continue
+                    starts = sorted(buckets)
+                    rows = [buckets[start] for start in starts]
+                    series = {
+                        "product": partition_product,
+                        "location": partition_location,
+                        "unit": unit,
+                        "start": np.array(starts, dtype="datetime64[D]"),
+                        "count": np.array([b.count for b in rows]),
+                        "min": np.array([b.low for b in rows]),
+                        "max": np.array([b.high for b in rows]),
+                        "mean": np.array([b.total / b.count for b in rows]),
+                        "median": np.array([b.median() for b in rows])
+                    }
+                    totals = np.array([b.total for b in rows])
+                    series.update(_moving_averages(np.array(starts), series["count"], totals, period))
+                    result.append(series)
+        return result
+
+
+def _moving_averages(starts, counts, totals, period):
+    """Mean price over each trailing window of periods, weighted by the number of prices"""
+    count_sums = np.concatenate([[0], np.cumsum(counts)])
+    total_sums = np.concatenate([[0.0], np.cumsum(totals)])
+    end = np.arange(1, len(starts) + 1)
+    averages = {}
+    for window in MOVING_AVERAGES[period]:
+        begin = np.searchsorted(starts, starts - (window - 1) * PERIODS[period])
+        averages[f"ma_{window}"] = (total_sums[end] - total_sums[begin]) / (count_sums[end] - count_sums[begin])
+    return averages
@@ -0,0 +1,354 @@
+import hashlib
+import heapq
+import json
+import os
+import re
+import shutil
+import threading
+from functools import lru_cache
+
+import numpy as np
+
+from storage import file_lock, file_stamp, load_data, save_data
+
+PRICE_STORE_DIR = "price_store"
+MANIFEST_FILE = "manifest.json"
+
+# A partition's tail is sealed into an immutable segment once it grows past this size
+TAIL_MAX_BYTES = 256 * 1024
+
+# Batches at least this big skip the tail and are written straight to a segment
+DIRECT_SEGMENT_ROWS = 1000
+
+# Columns of a price entry, as posted by vendors; "ts" (int64 microseconds) is added for searching.
+# "review" is the validator's verdict for prices published despite it ("flagged"), else empty
+COLUMNS = ("id", "vendor_id", "vendor_name", "product", "price", "unit", "location", "notes", "timestamp", "review")
+
+
+def partition_key(product, location):
+    """Prices are partitioned by product and location, ignoring case"""
+    return (product.strip().lower(), location.strip().lower())
+
+
+def _partition_name(key):
+    slug = "_".join(re.sub(r"[^a-z0-9]+", "-", part).strip("-")[:30] for part in key)
+    digest = hashlib.sha1("\0".join(key).encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}"
+
+
+def to_timestamp(value):
+    """Microseconds since the epoch for an ISO timestamp string or datetime"""
+    return int(np.datetime64(value, "us").astype(np.int64))
+
+
+def _to_columns(rows):
+    """Column arrays for a batch of price rows, in time order"""
+    ts = np.array([r["timestamp"] for r in rows], dtype="datetime64[us]").astype(np.int64)
+    order = np.argsort(ts, kind="stable")
+    columns = {"ts": ts[order]}
+    for name in COLUMNS:
+        values = [rows[i].get(name, "") for i in order]
+        columns[name] = np.array(values, dtype=np.float64) if name == "price" else np.array(values, dtype=str)
+    return columns
+
+
+@lru_cache(maxsize=16384)
+def _read_column(segment_path, name, rows):
+    """Memory-map one column of a segment; segments never change once written"""
+    path = os.path.join(segment_path, f"{name}.npy")
+    if not os.path.exists(path):
+        # Segments sealed before a column was added read it as empty
+        return np.full(rows, "", dtype=str)
+    return np.load(path, mmap_mode="r")
+
+
+class _SegmentColumns:
+    """Lazy column access to a segment, so queries only map the columns they touch"""
+
+    def __init__(self, path, rows):
+        self.path = path
+        self.rows = rows
+
+    def __getitem__(self, name):
+        return _read_column(self.path, name, self.rows)
+
+
+def _row(columns, i):
+    return {name: columns[name][i].item() for name in COLUMNS}
+
+
+class PriceStore:
+    """Append-optimised columnar store for market prices
+
+    Prices are partitioned by product and location. Each partition is a list of
+    immutable segments, one NumPy file per column (memory-mapped on read) and
+    sorted by time, plus a small JSON-lines tail that new prices are appended
+    to. When the tail outgrows TAIL_MAX_BYTES it is sealed into a new segment.
+
+    Because every segment and tail is time-ordered, "newest k" queries walk
+    backwards from the end of each run and stop early, and range scans for
+    trends are two binary searches per run instead of a filter and a sort.
+    """
+
+    def __init__(self, root=PRICE_STORE_DIR, tail_max_bytes=TAIL_MAX_BYTES):
+        self.root = root
+        self.tail_max_bytes = tail_max_bytes
+        self.manifest_path = os.path.join(root, MANIFEST_FILE)
+        self._lock = threading.Lock()
+        self._manifest_cache = (None, {"partitions": {}})
+        self._layout_cache = (None, [])
+        self._tails = {}
+        os.makedirs(root, exist_ok=True)
+
+    # Writing
+
+    def _load_manifest(self):
+        return load_data(self.manifest_path) or {"partitions": {}}
+
+    def _tail_path(self, name, partition):
+        return os.path.join(self.root, name, f"tail-{partition['tail_generation']:06d}.jsonl")
+
+    def _write_segment(self, name, partition, rows):
+        columns = _to_columns(rows)
+        segment_name = f"seg-{partition['next_segment']:06d}"
+        path = os.path.join(self.root, name, segment_name)
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        for column, values in columns.items():
+            np.save(os.path.join(tmp_path, f"{column}.npy"), values)
+        # A segment left behind by a flush that died before saving the manifest is not referenced
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+
+        partition["next_segment"] += 1
+        partition["segments"].append({
+            "name": segment_name,
+            "rows": len(rows),
+            "first_ts": int(columns["ts"][0]),
+            "last_ts": int(columns["ts"][-1])
+        })
+
+    def append(self, entry):
+        """Add one price entry"""
+        self.extend([entry])
+
+    def extend(self, entries):
+        """Add a batch of price entries"""
+        by_partition = {}
+        for entry in entries:
+            by_partition.setdefault(partition_key(entry["product"], entry["location"]), []).append(entry)
+        if not by_partition:
+            return
+
+        # Big batches (imports, migrations) go straight to segments instead of the tails
+        direct = len(entries) >= DIRECT_SEGMENT_ROWS
+        with file_lock(self.manifest_path):
+            # Readers share the cached manifest without the file lock, so changes go to
+            # a copy (of the partitions touched) that replaces it once saved
+            current = self._manifest()
+            manifest = dict(current, partitions=dict(current["partitions"]))
+            manifest_changed = False
+            obsolete = []
+            for key, rows in by_partition.items():
+                name = _partition_name(key)
+                partition = manifest["partitions"].get(name)
+                if partition is not None:
+                    partition = manifest["partitions"][name] = dict(partition, segments=list(partition["segments"]))
+                else:
+                    os.makedirs(os.path.join(self.root, name), exist_ok=True)
+                    partition = manifest["partitions"][name] = {
+                        "product": rows[0]["product"].strip(),
+                        "location": rows[0]["location"].strip(),
+                        "tail_generation": 0,
+                        "next_segment": 0,
+                        "segments": []
+                    }
+                    manifest_changed = True
+
+                if direct:
+                    self._write_segment(name, partition, rows)
+                    manifest_changed = True
+                    continue
+
+                tail_path = self._tail_path(name, partition)
+                with open(tail_path, 'a') as f:
+                    f.write("".join(json.dumps(row) + "\n" for row in rows))
+
+                if os.path.getsize(tail_path) >= self.tail_max_bytes:
+                    with open(tail_path, 'r') as f:
+                        self._write_segment(name, partition, [json.loads(line) for line in f if line.strip()])
+                    partition["tail_generation"] += 1
+                    obsolete.append(tail_path)
+                    manifest_changed = True
+
+            if manifest_changed:
+                save_data(manifest, self.manifest_path)
+                with self._lock:
+                    self._manifest_cache = (file_stamp(self.manifest_path), manifest)
+
+            # Only drop sealed tails once the manifest points past them
+            for path in obsolete:
+                os.remove(path)
+
+    def lock(self):
+        """Hold the store's write lock, e.g. to keep derived data in step with appends"""
+        return file_lock(self.manifest_path)
+
+    def migrate_legacy(self, file_path):
+        """Import prices from the old market_prices.json once, if the store is still empty"""
+        with file_lock(self.manifest_path):
+            if self._load_manifest()["partitions"]:
+                return 0
+            rows = load_data(file_path)
+            self.extend(rows)
+            return len(rows)
+
+    # Reading
+
+    def _manifest(self):
+        stamp = file_stamp(self.manifest_path)
+        with self._lock:
+            if stamp != self._manifest_cache[0]:
+                self._manifest_cache = (stamp, self._load_manifest())
+            return self._manifest_cache[1]
+
+    def _read_tail(self, path):
+        stamp = file_stamp(path)
+        with self._lock:
+            cached = self._tails.get(path)
+            if cached and cached[0] == stamp:
+                return cached[1]
+        rows = []
+        if stamp:
+            with open(path, 'r') as f:
+                # A line still being written by another process has no newline yet
+                rows = [json.loads(line) for line in f if line.endswith("\n")]
+        columns = _to_columns(rows) if rows else None
+        with self._lock:
+            self._tails[path] = (stamp, columns)
+        return columns
+
+    def _layout(self):
+        """(product key, location key, segment runs, tail path) per partition, rebuilt when the manifest changes"""
+        manifest = self._manifest()
+        with self._lock:
+            stamp = self._manifest_cache[0]
+            if self._layout_cache[0] != stamp or stamp is None:
+                layout = []
+                for name, partition in manifest["partitions"].items():
+                    segment_runs = [
+                        (segment["first_ts"], segment["last_ts"],
+                         _SegmentColumns(os.path.join(self.root, name, segment["name"]), segment["rows"]))
+                        for segment in partition["segments"]
+                    ]
+                    layout.append((partition["product"].lower(), partition["location"].lower(),
+                                   segment_runs, self._tail_path(name, partition)))
+                self._layout_cache = (stamp, layout)
+            return self._layout_cache[1]
+
+    def _runs(self, product=None, location=None):
+        """(first_ts, last_ts, columns) for every time-ordered run of the matching partitions"""
+        product = product.strip().lower() if product is not None else None
+        location = location.strip().lower() if location is not None else None
+        runs = []
+        for product_key, location_key, segment_runs, tail_path in self._layout():
+            if (product is not None and product_key != product) or (location is not None and location_key != location):
+                continue
+            runs.extend(segment_runs)
+            tail = self._read_tail(tail_path)
+            if tail is not None:
+                runs.append((int(tail["ts"][0]), int(tail["ts"][-1]), tail))
+        return runs
+
+    def latest(self, limit=20, product=None, location=None):
+        """The newest `limit` prices, newest first"""
+        # Visit runs newest-first, keeping the best `limit` rows in a min-heap;
+        # once a run ends before the oldest kept row, no later run can contribute
+        runs = sorted(self._runs(product, location), key=lambda run: run[1], reverse=True)
+        heap = []
+        for n, (_, last_ts, columns) in enumerate(runs):
+            if len(heap) >= limit and last_ts <= heap[0][0]:
+                break
+            ts = columns["ts"]
+            for i in range(len(ts) - 1, max(-1, len(ts) - 1 - limit), -1):
+                entry = (int(ts[i]), n, i)
+                if len(heap) < limit:
+                    heapq.heappush(heap, entry)
+                elif entry > heap[0]:
+                    heapq.heapreplace(heap, entry)
+                else:
+                    break
+        return [_row(runs[n][2], i) for _, n, i in sorted(heap, reverse=True)]
+
+    def query(self, product=None, location=None, vendor_id=None, limit=None):
+        """Prices matching the filters, newest first"""
+        if vendor_id is None and limit is not None:
+            return self.latest(limit, product, location)
+
+        matches = []
+        for _, _, columns in self._runs(product, location):
+            if vendor_id is None:
+                indexes = np.arange(len(columns["ts"]))
+            else:
+                indexes = np.flatnonzero(columns["vendor_id"] == vendor_id)
+            matches.extend((int(columns["ts"][i]), columns, int(i)) for i in indexes)
+        matches.sort(key=lambda match: match[0], reverse=True)
+        if limit is not None:
+            matches = matches[:limit]
+        return [_row(columns, i) for _, columns, i in matches]
+
+    def scan(self, product=None, location=None, start=None, end=None, columns=("ts", "price", "unit")):
+        """Columns of the prices between `start` and `end` (inclusive), in time order
+
+        `start` and `end` may be ISO timestamps, datetimes or microseconds.
+        """
+        start = to_timestamp(start) if start is not None and not isinstance(start, int) else start
+        end = to_timestamp(end) if end is not None and not isinstance(end, int) else end
+        pieces = []
+        for first_ts, last_ts, run in self._runs(product, location):
+            if (start is not None and last_ts < start) or (end is not None and first_ts > end):
+                continue
+            ts = run["ts"]
+            lo = int(np.searchsorted(ts, start, "left")) if start is not None else 0
+            hi = int(np.searchsorted(ts, end, "right")) if end is not None else len(ts)
+            if lo < hi:
+                pieces.append((ts[lo:hi], {name: run[name][lo:hi] for name in columns}))
+
+        if not pieces:
+            return {name: np.array([], dtype=np.int64 if name == "ts" else np.float64 if name == "price" else str)
+                    for name in columns}
+        order = np.argsort(np.concatenate([ts for ts, _ in pieces]), kind="stable")
+        return {name: np.concatenate([piece[name] for _, piece in pieces])[order] for name in columns}
+
+    def products(self):
+        """Names of all products with prices"""
+        names = {p["product"].lower(): p["product"] for p in self._manifest()["partitions"].values()}
+        return sorted(names.values(), key=str.lower)
+
+    def locations(self):
+        """Names of all locations with prices"""
+        names = {p["location"].lower(): p["location"] for p in self._manifest()["partitions"].values()}
+        return sorted(names.values(), key=str.lower)
+
+    def partitions(self, product=None, location=None):
+        """(product, location) names of the partitions matching the filters"""
+        product = product.strip().lower() if product is not None else None
+        location = location.strip().lower() if location is not None else None
+        return [
+            (p["product"], p["location"]) for p in self._manifest()["partitions"].values()
+            if (product is None or p["product"].lower() == product)
+            and (location is None or p["location"].lower() == location)
+        ]
+
+    def version(self, product, location):
+        """Changes whenever prices are added to the partition of `product` and `location`"""
+        name = _partition_name(partition_key(product, location))
+        partition = self._manifest()["partitions"].get(name)
+        if partition is None:
+            return None
+        return (len(partition["segments"]), partition["tail_generation"], file_stamp(self._tail_path(name, partition)))
+
+    def is_empty(self):
+        """True until the first price is added"""
+        return not self._manifest()["partitions"]
@@ -0,0 +1,198 @@
+"""Streaming sanity checks for posted market prices.
+
+Each (product, unit, location) keeps an exponentially weighted mean of the log
+price and an exponentially weighted mean absolute deviation around it. Both
+update in O(1) per price. Working in log space makes a kg/quintal mix-up (100x)
+the same distance from typical whichever way round it goes. A price is scored
+by how many deviations it sits from typical: far-off prices are flagged, and
+absurd ones are quarantined to a review log instead of being published.
+
+Re-score the stored history in batch, e.g. after tuning thresholds:
+
+    python price_validator.py --rescore [--product Wheat] [--top 20]
+"""
+import argparse
+import json
+import math
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from price_store import PriceStore
+from storage import file_lock
+
+PRICE_REVIEW_FILE = "price_review.jsonl"
+
+# Weight of the newest price in the running statistics (about a 20-price memory)
+ALPHA = 0.05
+
+# Prices seen before a key's statistics are trusted; until then the product's
+# statistics across all locations are used
+WARMUP = 5
+
+# Floor on the deviation, as a fraction of the price, so identical prices do not make every change an outlier
+MIN_SPREAD = 0.05
+
+# Scores (robust z) above which a price is flagged or held back
+FLAG_SCORE = 4.0
+QUARANTINE_SCORE = 12.0
+
+# Mean absolute deviation -> standard deviation for normally distributed data
+MAD_TO_SIGMA = math.sqrt(math.pi / 2)
+
+OK, FLAGGED, QUARANTINED = "ok", "flagged", "quarantined"
+
+
+class RobustStats:
+    """EWMA of log prices with an exponentially weighted mean absolute deviation
+
+    The first WARMUP prices are only buffered; the statistics start from their
+    median and mean absolute deviation, so a bad first price cannot poison them.
+    """
+
+    __slots__ = ("count", "center", "spread", "pending")
+
+    def __init__(self):
+        self.count = 0
+        self.center = 0.0
+        self.spread = 0.0
+        self.pending = []
+
+    def scale(self):
+        return max(MAD_TO_SIGMA * self.spread, MIN_SPREAD)
+
+    def score(self, log_price):
+        return abs(log_price - self.center) / self.scale()
+
+    def update(self, log_price, alpha=ALPHA):
+        self.count += 1
+        if self.pending is not None:
+            self.pending.append(log_price)
+            if len(self.pending) >= WARMUP:
+                values = sorted(self.pending)
+                self.center = (values[(WARMUP - 1) // 2] + values[WARMUP // 2]) / 2
+                self.spread = sum(abs(v - self.center) for v in values) / WARMUP
+                self.pending = None
+            return
+        # Clip the step so an outlier cannot drag the statistics far (Huber-style),
+        # while a lasting change in the market still pulls them along
+        limit = FLAG_SCORE * self.scale()
+        deviation = max(-limit, min(limit, log_price - self.center))
+        self.center += alpha * deviation
+        self.spread += alpha * (abs(deviation) - self.spread)
+
+
+def _key(product, unit, location=None):
+    return (product.strip().lower(), unit.strip().lower(), location.strip().lower() if location is not None else None)
+
+
+class PriceValidator:
+    """Scores prices against running per-(product, unit, location) statistics
+
+    `validate` checks a new price and, unless it is quarantined, folds it into the statistics. Given a price store, the statistics of a product are warmed
+    up by replaying its stored history the first time it is seen.
+    """
+
+    def __init__(self, store=None, alpha=ALPHA):
+        self.store = store
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._warm = set()
+
+    def _score(self, product, unit, location, log_price):
+        """Score against the location's statistics, or the product's while the location warms up"""
+        for key, basis in ((_key(product, unit, location), "location"), (_key(product, unit), "product")):
+            stats = self._stats.get(key)
+            if stats and stats.count >= WARMUP:
+                return stats.score(log_price), math.exp(stats.center), basis
+        return 0.0, None, None
+
+    def _observe(self, product, unit, location, log_price):
+        for key in (_key(product, unit, location), _key(product, unit)):
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = RobustStats()
+            stats.update(log_price, self.alpha)
+
+    def _classify(self, product, unit, location, price):
+        if price <= 0:
+            return QUARANTINED, math.inf, None, None
+        log_price = math.log(price)
+        score, typical, basis = self._score(product, unit, location, log_price)
+        status = QUARANTINED if score > QUARANTINE_SCORE else FLAGGED if score > FLAG_SCORE else OK
+        # Held-back prices are never published, so they do not move what is typical either
+        if status != QUARANTINED:
+            self._observe(product, unit, location, log_price)
+        return status, score, typical, basis
+
+    def _warm_up(self, product):
+        """Replay a product's stored history, once per process"""
+        if self.store is None or product.strip().lower() in self._warm:
+            return
+        history = self.store.scan(product=product, columns=("price", "unit", "location"))
+        with self._lock:
+            if product.strip().lower() in self._warm:
+                return
+            for price, unit, location in zip(history["price"].tolist(), history["unit"].tolist(),
+                                             history["location"].tolist()):
+                self._classify(product, unit, location, price)
+            self._warm.add(product.strip().lower())
+
+    def validate(self, entry):
+        """Check a new price entry; returns its status, score, typical price and what it was compared with"""
+        self._warm_up(entry["product"])
+        with self._lock:
+            status, score, typical, basis = self._classify(entry["product"], entry["unit"], entry["location"],
+                                                           entry["price"])
+        return {"status": status, "score": score, "typical_price": typical, "basis": basis}
+
+    def rescore(self, columns):
+        """Batch mode: score time-ordered price columns (product, price, unit, location) from scratch
+
+        Returns the score and status of every row, as if the prices had been
+        posted one by one; the validator's own statistics are not touched.
+        """
+        replay = PriceValidator(alpha=self.alpha)
+        scores = np.empty(len(columns["price"]))
+        statuses = np.empty(len(columns["price"]), dtype=object)
+        rows = zip(columns["product"].tolist(), columns["price"].tolist(),
+                   columns["unit"].tolist(), columns["location"].tolist())
+        for i, (product, price, unit, location) in enumerate(rows):
+            statuses[i], scores[i], _, _ = replay._classify(product, unit, location, price)
+        return scores, statuses
+
+
+def record_for_review(entry, verdict, file_path=PRICE_REVIEW_FILE):
+    """Append a held-back price and its verdict to the review log"""
+    record = {"entry": entry, "verdict": verdict, "recorded_at": datetime.now().isoformat()}
+    with file_lock(file_path):
+        with open(file_path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored market prices for anomalies")
+    parser.add_argument("--rescore", action="store_true", help="replay the stored price history through the validator")
+    parser.add_argument("--product", help="only re-score this product")
+    parser.add_argument("--top", type=int, default=20, help="how many of the worst prices to list")
+    args = parser.parse_args()
+    if not args.rescore:
+        parser.print_help()
+        return
+
+    columns = PriceStore().scan(product=args.product,
+                                columns=("id", "product", "price", "unit", "location", "timestamp"))
+    scores, statuses = PriceValidator().rescore(columns)
+    print(f"Re-scored {len(scores)} prices: {int((statuses == FLAGGED).sum())} flagged, "
+          f"{int((statuses == QUARANTINED).sum())} would be quarantined")
+    for i in np.argsort(-scores)[:args.top]:
+        if statuses[i] == OK:
+            break
+        print(f"{statuses[i]:<12} score {scores[i]:8.1f}  {columns['timestamp'][i]}  {columns['product'][i]} "
+              f"@ {columns['location'][i]}: {columns['price'][i]} / {columns['unit'][i]}  ({columns['id'][i]})")
+
+
+if __name__ == "__main__":
+    main()
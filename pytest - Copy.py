@@ -2,25 +2,49 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import math
-import uuid
-from datetime import datetime
-import json
 import pickle
-import os
-from together import Together
-from googletrans import Translator
-from gtts import gTTS
-import matplotlib.pyplot as plt
-import seaborn as sns
-import plotly.express as px
-import plotly.graph_objects as go
-# File paths for our "database"
-FARMERS_FILE = "farmers.json"
-VENDORS_FILE = "vendors.json"
-COMMUNITIES_FILE = "communities.json"
-MARKET_PRICES_FILE = "market_prices.json"
-FARMING_TIPS_FILE = "farming_tips.json"
-POLLS_FILE = "polls.json"  # New file for storing polls
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from chat_view import CHAT_PAGE_SIZE, render_message_window
+from event_bus import community_topic, get_event_bus
+from lazy_imports import lazy_import
+from metrics import histogram
+from price_rollups import MOVING_AVERAGES
+from price_validator import FLAGGED, QUARANTINED
+from services import start_request
+from services.communities import (
+    SEARCH_PAGE_SIZE, add_message_to_community, changed_elsewhere, get_community_details, get_community_messages,
+    get_dashboard_worker, get_user_communities, get_user_summary, search_community_messages, start_outbox_worker
+)
+from services.crops import get_crop_recommendation, record_prediction
+from services.polls import (
+    close_poll, create_poll, delete_poll, get_community_name, get_community_polls, get_user_active_polls,
+    respond_to_poll, start_poll_scheduler
+)
+from services.prices import (
+    add_market_price, get_latest_market_prices, get_location_market_prices, get_price_store,
+    get_product_market_prices, get_product_price_trends
+)
+from services.resources import bootstrap_data, start_compaction_worker, start_metrics_exporter
+from services.tips import (
+    TIPS_PAGE_SIZE, add_farming_tip, get_all_farming_tips, get_farming_tips_by_category,
+    has_liked_farming_tip, like_farming_tip, search_farming_tips
+)
+from services.users import USERS_PAGE_SIZE, count_users, get_user_by_id, get_users_page, register_user, search_users
+from storage import communities_file, file_stamp, polls_file
+
+# Only the crop prediction page needs these, so they are imported on first use
+together = lazy_import("together")
+googletrans = lazy_import("googletrans")
+gtts = lazy_import("gtts")
+go = lazy_import("plotly.graph_objects")
+
+# How often an open chat checks the event bus for new messages and poll updates
+CHAT_REFRESH_INTERVAL = "2s"
+
+VIEW_SECONDS = histogram("view_render_seconds", "Time to run a page of the app (reruns cut short by st.rerun are not counted)")
+MODEL_LOAD_SECONDS = histogram("model_load_seconds", "Time to unpickle a crop prediction model file")
+INFERENCE_SECONDS = histogram("model_inference_seconds", "Time for a crop prediction")
+EXTERNAL_CALL_SECONDS = histogram("external_call_seconds", "Time spent in calls to outside services, by service")
 
 # Initialize session state variables if they don't exist
 if 'current_user' not in st.session_state:
@@ -33,490 +57,12 @@ if 'view' not in st.session_state:
     st.session_state.view = "communities"  # Default view is communities list
 if 'selected_poll' not in st.session_state:
     st.session_state.selected_poll = None
-
-# Haversine formula to calculate distance between two points on Earth
-def calculate_distance(lat1, lon1, lat2, lon2):
-    """Calculate the distance between two points using Haversine formula"""
-    R = 6371  # Earth's radius in kilometers
-    
-    # Convert decimal degrees to radians
-    lat1_rad = math.radians(lat1)
-    lon1_rad = math.radians(lon1)
-    lat2_rad = math.radians(lat2)
-    lon2_rad = math.radians(lon2)
-    
-    # Differences
-    dlat = lat2_rad - lat1_rad
-    dlon = lon2_rad - lon1_rad
-    
-    # Haversine formula
-    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
-    distance = R * c
-    
-    return distance
-
-# Database operations
-def load_data(file_path):
-    """Load data from JSON file"""
-    if os.path.exists(file_path):
-        with open(file_path, 'r') as f:
-            return json.load(f)
-    return []
-
-def save_data(data, file_path):
-    """Save data to JSON file"""
-    with open(file_path, 'w') as f:
-        json.dump(data, f, indent=2)
-
-def register_user(user_type, name, latitude, longitude):
-    """Register a new user (farmer or vendor)"""
-    user_id = str(uuid.uuid4())
-    user_data = {
-        "id": user_id,
-        "name": name,
-        "latitude": latitude,
-        "longitude": longitude,
-        "created_at": datetime.now().isoformat()
-    }
-    
-    if user_type == "farmer":
-        farmers = load_data(FARMERS_FILE)
-        farmers.append(user_data)
-        save_data(farmers, FARMERS_FILE)
-        
-        # Add farmer to all nearby vendor communities
-        add_farmer_to_communities(user_data)
-        
-    else:  # vendor
-        vendors = load_data(VENDORS_FILE)
-        vendors.append(user_data)
-        save_data(vendors, VENDORS_FILE)
-        
-        # Create a new community for this vendor
-        create_vendor_community(user_data)
-    
-    return user_id
-
-def create_vendor_community(vendor):
-    """Create a new community for a vendor and add nearby farmers"""
-    communities = load_data(COMMUNITIES_FILE)
-    
-    # Create new community
-    community = {
-        "id": str(uuid.uuid4()),
-        "name": f"{vendor['name']}'s Community",
-        "vendor_id": vendor["id"],
-        "vendor_name": vendor["name"],
-        "members": [{"id": vendor["id"], "name": vendor["name"], "type": "vendor"}],
-        "messages": [],
-        "created_at": datetime.now().isoformat()
-    }
-    
-    # Add all farmers within 50km
-    farmers = load_data(FARMERS_FILE)
-    for farmer in farmers:
-        distance = calculate_distance(
-            vendor["latitude"], vendor["longitude"],
-            farmer["latitude"], farmer["longitude"]
-        )
-        
-        if distance <= 50:  # 50 km radius
-            community["members"].append({
-                "id": farmer["id"], 
-                "name": farmer["name"],
-                "type": "farmer",
-                "distance": round(distance, 2)
-            })
-    
-    communities.append(community)
-    save_data(communities, COMMUNITIES_FILE)
-
-def add_farmer_to_communities(farmer):
-    """Add a new farmer to all vendor communities within 50km"""
-    communities = load_data(COMMUNITIES_FILE)
-    vendors = load_data(VENDORS_FILE)
-    
-    for community in communities:
-        vendor_id = community["vendor_id"]
-        vendor = next((v for v in vendors if v["id"] == vendor_id), None)
-        
-        if vendor:
-            distance = calculate_distance(
-                vendor["latitude"], vendor["longitude"],
-                farmer["latitude"], farmer["longitude"]
-            )
-            
-            if distance <= 50:  # 50 km radius
-                community["members"].append({
-                    "id": farmer["id"], 
-                    "name": farmer["name"],
-                    "type": "farmer",
-                    "distance": round(distance, 2)
-                })
-    
-    save_data(communities, COMMUNITIES_FILE)
-
-def get_user_communities(user_id, user_type):
-    """Get all communities that a user is a member of"""
-    communities = load_data(COMMUNITIES_FILE)
-    user_communities = []
-    
-    for community in communities:
-        if any(member["id"] == user_id for member in community["members"]):
-            community_info = {
-                "id": community["id"],
-                "name": community["name"],
-                "vendor_name": community["vendor_name"],
-                "member_count": len(community["members"]),
-                "message_count": len(community["messages"])
-            }
-            user_communities.append(community_info)
-    
-    return user_communities
-
-def add_message_to_community(community_id, user_id, user_name, user_type, message):
-    """Add a message to a community chat"""
-    communities = load_data(COMMUNITIES_FILE)
-    
-    for community in communities:
-        if community["id"] == community_id:
-            community["messages"].append({
-                "id": str(uuid.uuid4()),
-                "user_id": user_id,
-                "user_name": user_name,
-                "user_type": user_type,
-                "content": message,
-                "timestamp": datetime.now().isoformat()
-            })
-    
-    save_data(communities, COMMUNITIES_FILE)
-
-def get_community_details(community_id):
-    """Get detailed information about a community"""
-    communities = load_data(COMMUNITIES_FILE)
-    
-    for community in communities:
-        if community["id"] == community_id:
-            return community
-    
-    return None
-
-def get_user_by_id(user_id, user_type):
-    """Get user details by ID"""
-    if user_type == "farmer":
-        users = load_data(FARMERS_FILE)
-    else:
-        users = load_data(VENDORS_FILE)
-    
-    for user in users:
-        if user["id"] == user_id:
-            return user
-    
-    return None
-
-# Functions for polls
-def create_poll(community_id, vendor_id, vendor_name, product, quantity, unit, deadline):
-    """Create a new poll for a specific product requirement"""
-    polls = load_data(POLLS_FILE)
-    
-    poll_id = str(uuid.uuid4())
-    
-    poll = {
-        "id": poll_id,
-        "community_id": community_id,
-        "vendor_id": vendor_id,
-        "vendor_name": vendor_name,
-        "product": product,
-        "quantity": quantity,
-        "unit": unit,
-        "deadline": deadline,
-        "status": "open",  # open, fulfilled, or closed
-        "created_at": datetime.now().isoformat(),
-        "responses": []
-    }
-    
-    polls.append(poll)
-    save_data(polls, POLLS_FILE)
-    
-    # Add a message to the community about the new poll
-    community = get_community_details(community_id)
-    if community:
-        message = f"I need {quantity} {unit} of {product} by {deadline}. Please respond on poll if you can contribute."
-        add_message_to_community(
-            community_id=community_id,
-            user_id=vendor_id,
-            user_name=vendor_name,
-            user_type="vendor",
-            message=message
-        )
-    
-    return poll_id
-
-def respond_to_poll(poll_id, farmer_id, farmer_name, quantity):
-    """Respond to a poll with how much a farmer can contribute"""
-    polls = load_data(POLLS_FILE)
-    
-    for poll in polls:
-        if poll["id"] == poll_id:
-            # Generate alphanumeric reference code
-            reference_code = f"P{poll_id[:4]}-F{farmer_id[:4]}-{uuid.uuid4().hex[:6].upper()}"
-            
-            # Check if already responded
-            existing_response = next((r for r in poll["responses"] if r["farmer_id"] == farmer_id), None)
-            
-            if existing_response:
-                # Update existing response
-                existing_response["quantity"] = quantity
-                existing_response["updated_at"] = datetime.now().isoformat()
-                # If reference code doesn't exist, generate one
-                if "reference_code" not in existing_response:
-                    existing_response["reference_code"] = reference_code
-            else:
-                # Add new response
-                poll["responses"].append({
-                    "farmer_id": farmer_id,
-                    "farmer_name": farmer_name,
-                    "quantity": quantity,
-                    "reference_code": reference_code,
-                    "created_at": datetime.now().isoformat()
-                })
-            
-            # Check if poll is fulfilled
-            total_quantity = sum(r["quantity"] for r in poll["responses"])
-            if total_quantity >= poll["quantity"] and poll["status"] == "open":
-                poll["status"] = "fulfilled"
-                
-                # Add message to community about fulfillment
-                message = f"✅ Requirement for {poll['quantity']} {poll['unit']} of {poll['product']} has been met. Thank you to all farmers who contributed!"
-                add_message_to_community(
-                    community_id=poll["community_id"],
-                    user_id=poll["vendor_id"],
-                    user_name=poll["vendor_name"],
-                    user_type="vendor",
-                    message=message
-                )
-            
-            save_data(polls, POLLS_FILE)
-            return True
-    
-    return False
-
-def close_poll(poll_id, vendor_id):
-    """Close a poll (can only be done by the vendor who created it)"""
-    polls = load_data(POLLS_FILE)
-    
-    for poll in polls:
-        if poll["id"] == poll_id and poll["vendor_id"] == vendor_id:
-            poll["status"] = "closed"
-            
-            # Add message to community about poll closure
-            message = f"❌ The poll for {poll['quantity']} {poll['unit']} of {poll['product']} has been closed."
-            add_message_to_community(
-                community_id=poll["community_id"],
-                user_id=vendor_id,
-                user_name=poll["vendor_name"],
-                user_type="vendor",
-                message=message
-            )
-            
-            save_data(polls, POLLS_FILE)
-            return True
-    
-    return False
-
-def delete_poll(poll_id, vendor_id):
-    """Delete a poll (can only be done by the vendor who created it)"""
-    polls = load_data(POLLS_FILE)
-    
-    # Find the poll index
-    poll_index = None
-    for i, poll in enumerate(polls):
-        if poll["id"] == poll_id and poll["vendor_id"] == vendor_id:
-            poll_index = i
-            break
-    
-    if poll_index is not None:
-        # Get poll details for notification
-        poll = polls[poll_index]
-        
-        # Remove the poll
-        removed_poll = polls.pop(poll_index)
-        save_data(polls, POLLS_FILE)
-        
-        # Add message to community about poll deletion
-        message = f"The poll for {removed_poll['quantity']} {removed_poll['unit']} of {removed_poll['product']} has been deleted."
-        add_message_to_community(
-            community_id=removed_poll["community_id"],
-            user_id=vendor_id,
-            user_name=removed_poll["vendor_name"],
-            user_type="vendor",
-            message=message
-        )
-        
-        return True
-    
-    return False
-
-def get_community_polls(community_id):
-    """Get all polls for a specific community"""
-    polls = load_data(POLLS_FILE)
-    return [p for p in polls if p["community_id"] == community_id]
-
-def get_poll_by_id(poll_id):
-    """Get a specific poll by ID"""
-    polls = load_data(POLLS_FILE)
-    return next((p for p in polls if p["id"] == poll_id), None)
-
-def get_user_active_polls(user_id, user_type, include_closed=False):
-    """Get all active polls (and optionally closed polls) that a user has responded to or created"""
-    polls = load_data(POLLS_FILE)
-    user_polls = []
-    
-    for poll in polls:
-        # Only include open or fulfilled polls by default, unless include_closed is True
-        if poll["status"] != "closed" or include_closed:
-            if user_type == "farmer":
-                # Check if the farmer has responded to this poll
-                responded = any(r["farmer_id"] == user_id for r in poll["responses"])
-                if responded:
-                    user_polls.append(poll)
-            elif user_type == "vendor" and poll["vendor_id"] == user_id:
-                # Add vendor's created polls
-                user_polls.append(poll)
-    
-    return user_polls
-
-def add_market_price(vendor_id, vendor_name, product, price, unit, location, notes=""):
-    """Add a new market price entry"""
-    market_prices = load_data(MARKET_PRICES_FILE)
-    
-    price_entry = {
-        "id": str(uuid.uuid4()),
-        "vendor_id": vendor_id,
-        "vendor_name": vendor_name,
-        "product": product,
-        "price": price,
-        "unit": unit,
-        "location": location,
-        "notes": notes,
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    market_prices.append(price_entry)
-    save_data(market_prices, MARKET_PRICES_FILE)
-    return price_entry["id"]
-
-def get_latest_market_prices(limit=20):
-    """Get the latest market prices"""
-    market_prices = load_data(MARKET_PRICES_FILE)
-    
-    # Sort by timestamp (newest first)
-    sorted_prices = sorted(
-        market_prices, 
-        key=lambda x: x["timestamp"], 
-        reverse=True
-    )
-    
-    return sorted_prices[:limit]
-
-def get_product_market_prices(product):
-    """Get market prices for a specific product"""
-    market_prices = load_data(MARKET_PRICES_FILE)
-    
-    # Filter by product name
-    product_prices = [p for p in market_prices if p["product"].lower() == product.lower()]
-    
-    # Sort by timestamp (newest first)
-    sorted_prices = sorted(
-        product_prices, 
-        key=lambda x: x["timestamp"], 
-        reverse=True
-    )
-    
-    return sorted_prices
-
-def get_vendor_market_prices(vendor_id):
-    """Get market prices posted by a specific vendor"""
-    market_prices = load_data(MARKET_PRICES_FILE)
-    
-    # Filter by vendor ID
-    vendor_prices = [p for p in market_prices if p["vendor_id"] == vendor_id]
-    
-    # Sort by timestamp (newest first)
-    sorted_prices = sorted(
-        vendor_prices, 
-        key=lambda x: x["timestamp"], 
-        reverse=True
-    )
-    
-    return sorted_prices
-
-# NEW FUNCTIONS FOR FARMING TIPS
-def add_farming_tip(user_id, user_name, user_type, title, content, category):
-    """Add a new farming tip or resource"""
-    farming_tips = load_data(FARMING_TIPS_FILE)
-    
-    tip_entry = {
-        "id": str(uuid.uuid4()),
-        "user_id": user_id,
-        "user_name": user_name,
-        "user_type": user_type,
-        "title": title,
-        "content": content,
-        "category": category,
-        "likes": 0,
-        "liked_by": [],
-        "timestamp": datetime.now().isoformat()
-    }
-    
-    farming_tips.append(tip_entry)
-    save_data(farming_tips, FARMING_TIPS_FILE)
-    return tip_entry["id"]
-
-def like_farming_tip(tip_id, user_id):
-    """Like a farming tip"""
-    farming_tips = load_data(FARMING_TIPS_FILE)
-    
-    for tip in farming_tips:
-        if tip["id"] == tip_id:
-            if user_id not in tip["liked_by"]:
-                tip["liked_by"].append(user_id)
-                tip["likes"] = len(tip["liked_by"])
-                save_data(farming_tips, FARMING_TIPS_FILE)
-                return True
-            return False
-    
-    return False
-
-def get_all_farming_tips():
-    """Get all farming tips and resources"""
-    farming_tips = load_data(FARMING_TIPS_FILE)
-    
-    # Sort by likes (most liked first)
-    sorted_tips = sorted(
-        farming_tips, 
-        key=lambda x: (x["likes"], x["timestamp"]), 
-        reverse=True
-    )
-    
-    return sorted_tips
-
-def get_farming_tips_by_category(category):
-    """Get farming tips for a specific category"""
-    farming_tips = load_data(FARMING_TIPS_FILE)
-    
-    # Filter by category
-    category_tips = [t for t in farming_tips if t["category"].lower() == category.lower()]
-    
-    # Sort by likes (most liked first)
-    sorted_tips = sorted(
-        category_tips, 
-        key=lambda x: (x["likes"], x["timestamp"]), 
-        reverse=True
-    )
-    
-    return sorted_tips
+if 'chat_window' not in st.session_state:
+    st.session_state.chat_window = CHAT_PAGE_SIZE
+if 'chat_subscription' not in st.session_state:
+    st.session_state.chat_subscription = None
+if 'chat_stamps' not in st.session_state:
+    st.session_state.chat_stamps = {}
 
 # Streamlit app UI
 # Apply custom CSS for better styling
@@ -541,71 +87,25 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Create initial data files if they don't exist
-if not os.path.exists(FARMERS_FILE):
-    save_data([], FARMERS_FILE)
-if not os.path.exists(VENDORS_FILE):
-    save_data([], VENDORS_FILE)
-if not os.path.exists(COMMUNITIES_FILE):
-    save_data([], COMMUNITIES_FILE)
-if not os.path.exists(MARKET_PRICES_FILE):
-    save_data([], MARKET_PRICES_FILE)
-if not os.path.exists(FARMING_TIPS_FILE):
-    save_data([], FARMING_TIPS_FILE)
+# Set up the data directory and seed a new install, once per server process;
+# later reruns do no data-file I/O for this
+bootstrap_data()
 
-# Initialize sample data for demo if empty
-market_prices = load_data(MARKET_PRICES_FILE)
-if not market_prices:
-    sample_products = [
-        {"product": "Tomatoes", "price": 25.50, "unit": "kg", "location": "Delhi"},
-        {"product": "Potatoes", "price": 15.75, "unit": "kg", "location": "Mumbai"},
-        {"product": "Rice", "price": 45.00, "unit": "kg", "location": "Kolkata"},
-        {"product": "Wheat", "price": 30.25, "unit": "kg", "location": "Chennai"},
-        {"product": "Onions", "price": 20.00, "unit": "kg", "location": "Bangalore"}
-    ]
-    
-    # Add sample market prices (will be properly populated by vendors later)
-    for item in sample_products:
-        add_market_price(
-            vendor_id="sample_vendor",
-            vendor_name="Sample Vendor",
-            product=item["product"],
-            price=item["price"],
-            unit=item["unit"],
-            location=item["location"],
-            notes="Sample data for demonstration"
-        )
+# Deliver queued community notifications, keep dashboard summaries current,
+# close expired polls, compact write-ahead logs and export metrics in the background
+start_outbox_worker()
+get_dashboard_worker()
+start_poll_scheduler()
+start_compaction_worker()
+start_metrics_exporter()
 
-farming_tips = load_data(FARMING_TIPS_FILE)
-if not farming_tips:
-    sample_tips = [
-        {
-            "title": "Soil Preparation for Wheat",
-            "content": "Wheat requires well-drained soil with a pH between 6.0 and 7.0. Before planting, prepare your soil by tilling to a depth of 15cm and incorporate organic matter. Conduct a soil test to ensure proper nutrient levels.",
-            "category": "Soil Management"
-        },
-        {
-            "title": "Effective Water Conservation Techniques",
-            "content": "Implement drip irrigation to save water. Mulching can reduce evaporation by up to 70%. Consider collecting rainwater during monsoon season for use during dry periods.",
-            "category": "Water Management"
-        },
-        {
-            "title": "Integrated Pest Management for Rice",
-            "content": "Monitor your rice fields regularly for pests. Introduce beneficial insects like ladybugs to control aphids. Rotate crops annually to break pest cycles. Apply neem-based solutions as a natural pesticide.",
-            "category": "Pest Control"
-        }
-    ]
-    
-    # Add sample farming tips
-    for tip in sample_tips:
-        add_farming_tip(
-            user_id="sample_user",
-            user_name="Agricultural Expert",
-            user_type="vendor",
-            title=tip["title"],
-            content=tip["content"],
-            category=tip["category"]
-        )
+# Every data file this rerun reads is loaded at most once, from here on
+start_request()
+
+def describe_user(user):
+    """A user's name with their phone number, or location if they gave none, to tell apart users with the same name"""
+    detail = user.get("phone") or f"{user['latitude']:.2f}, {user['longitude']:.2f}"
+    return f"{user['name']} ({detail})"
 
 # Sidebar with login, registration, and user info
 with st.sidebar:
@@ -687,17 +187,25 @@ with st.sidebar:
             st.subheader("Login")
             login_type = st.selectbox("I am a:", ["Farmer", "Vendor"], key="login_type")
             
-            users = load_data(FARMERS_FILE if login_type.lower() == "farmer" else VENDORS_FILE)
-            user_names = [user["name"] for user in users]
-            
-            if user_names:
-                selected_name = st.selectbox("Select your name:", user_names)
-                selected_user = next((user for user in users if user["name"] == selected_name), None)
+            if count_users(login_type.lower()):
+                # Only the users matching what has been typed so far are listed
+                query = st.text_input("Your name or phone number:", key="login_query")
+                matches = search_users(login_type.lower(), query) if query.strip() else []
                 
-                if st.button("Login") and selected_user:
-                    st.session_state.current_user = selected_user["id"]
-                    st.session_state.current_user_type = login_type.lower()
-                    st.rerun()
+                if matches:
+                    # Names are not unique, so each match shows its phone number or location too
+                    selected_user = st.selectbox(
+                        "Select your account:",
+                        matches,
+                        format_func=describe_user
+                    )
+                    
+                    if st.button("Login") and selected_user:
+                        st.session_state.current_user = selected_user["id"]
+                        st.session_state.current_user_type = login_type.lower()
+                        st.rerun()
+                elif query.strip():
+                    st.info(f"No {login_type.lower()}s match \"{query.strip()}\".")
             else:
                 st.info(f"No {login_type.lower()}s registered yet. Please register first.")
         
@@ -705,6 +213,7 @@ with st.sidebar:
             st.subheader("Register")
             reg_type = st.selectbox("I am a:", ["Farmer", "Vendor"], key="reg_type")
             name = st.text_input("Your Name")
+            phone = st.text_input("Phone Number (optional)")
             
             # For demo purposes, using a map would be better in a real app
             col1, col2 = st.columns(2)
@@ -714,13 +223,172 @@ with st.sidebar:
                 longitude = st.number_input("Longitude", value=77.2090, format="%.4f")
             
             if st.button("Register") and name:
-                user_id = register_user(reg_type.lower(), name, latitude, longitude)
+                user_id = register_user(reg_type.lower(), name, latitude, longitude, phone.strip())
                 st.session_state.current_user = user_id
                 st.session_state.current_user_type = reg_type.lower()
                 st.success("Registration successful!")
                 st.rerun()
 
+def start_fragment_request():
+    """Start a new request when only a fragment reruns; in a full rerun the fragment shares the rerun's"""
+    ctx = get_script_run_ctx()
+    if ctx is None or ctx.fragment_ids_this_run:
+        start_request()
+
+# Live chat: each session subscribes to its open community on the event bus and
+# applies message/poll deltas to its own copy instead of reloading the data files.
+# Other server processes publish on their own bus, so a change to the community's
+# shards that was not written by this process reloads them instead
+def reload_community_state(community_id):
+    """Load this session's chat window and poll list for a community from storage"""
+    st.session_state.chat_stamps = {
+        file_path: file_stamp(file_path) for file_path in (communities_file(community_id), polls_file(community_id))
+    }
+    st.session_state.chat_messages, st.session_state.chat_total = get_community_messages(
+        community_id,
+        limit=st.session_state.chat_window
+    )
+    st.session_state.community_polls = {p["id"]: p for p in get_community_polls(community_id)}
+
+def sync_community_state(community_id):
+    """Apply pending event-bus deltas for a community to this session's state"""
+    topic = community_topic(community_id)
+    subscription = st.session_state.chat_subscription
+    
+    if subscription is None or subscription.topic != topic or subscription.closed:
+        if subscription:
+            subscription.close()
+        # Subscribe before loading so nothing published in between is missed
+        st.session_state.chat_subscription = get_event_bus().subscribe(topic)
+        reload_community_state(community_id)
+        return
+    
+    if subscription.overflowed:
+        subscription.reset()
+        reload_community_state(community_id)
+        return
+    
+    stamps = st.session_state.chat_stamps
+    for file_path, stamp in stamps.items():
+        stamps[file_path], elsewhere = changed_elsewhere(file_path, stamp)
+        if elsewhere:
+            subscription.reset()
+            reload_community_state(community_id)
+            return
+    
+    for event in subscription.drain():
+        if event["type"] == "message_added":
+            messages = st.session_state.chat_messages
+            if any(m["id"] == event["message"]["id"] for m in messages):
+                continue
+            messages.append(event["message"])
+            st.session_state.chat_total += 1
+            if len(messages) > st.session_state.chat_window:
+                del messages[:len(messages) - st.session_state.chat_window]
+        elif event["type"] == "poll_updated":
+            st.session_state.community_polls[event["poll"]["id"]] = event["poll"]
+        elif event["type"] == "poll_deleted":
+            st.session_state.community_polls.pop(event["poll_id"], None)
+
+@st.fragment(run_every=CHAT_REFRESH_INTERVAL)
+def render_chat_messages(community_id):
+    """Render the chat message window, refreshed from the event bus"""
+    start_fragment_request()
+    sync_community_state(community_id)
+    window_messages = st.session_state.chat_messages
+    total_messages = st.session_state.chat_total
+    
+    # Only the newest messages are rendered; older ones are paged in on demand
+    if total_messages > len(window_messages):
+        if st.button(f"Load older messages ({total_messages - len(window_messages)} more)", key="load_older_messages"):
+            st.session_state.chat_window += CHAT_PAGE_SIZE
+            reload_community_state(community_id)
+            st.rerun(scope="fragment")
+    
+    st.markdown(
+        render_message_window(window_messages, st.session_state.current_user),
+        unsafe_allow_html=True
+    )
+
+@st.fragment(run_every=CHAT_REFRESH_INTERVAL)
+def render_community_polls(community_id, user_name):
+    """Render a community's active and closed polls, refreshed from the event bus"""
+    start_fragment_request()
+    sync_community_state(community_id)
+    
+    st.subheader("Active Polls")
+    
+    # Filter active polls
+    community_polls = list(st.session_state.community_polls.values())
+    active_polls = [p for p in community_polls if p['status'] != 'closed']
+    
+    if active_polls:
+        for poll in active_polls:
+            with st.container(border=True):
+                col1, col2 = st.columns([3, 1])
+                with col1:
+                    st.write(f"**{poll['product']}**: {poll['quantity']} {poll['unit']} by {poll['deadline']}")
+                with col2:
+                    if poll['status'] == 'fulfilled':
+                        st.success("✅ Fulfilled")
+                    else:
+                        st.warning("⏳ Open")
+                
+                # Progress bar
+                total_committed = poll['total_committed']
+                percent_complete = min(100, round((total_committed / poll['quantity']) * 100))
+                st.progress(percent_complete / 100)
+                st.write(f"Progress: {total_committed} of {poll['quantity']} {poll['unit']} ({percent_complete}%)")
+                
+                # Allow farmers to respond to open polls
+                if st.session_state.current_user_type == "farmer" and poll['status'] == 'open':
+                    # Check if farmer has already responded
+                    farmer_response = poll['responses'].get(st.session_state.current_user)
+                    
+                    current_quantity = 0
+                    if farmer_response:
+                        current_quantity = farmer_response['quantity']
+                        st.write(f"Your current commitment: {current_quantity} {poll['unit']}")
+                    
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        farmer_quantity = st.number_input(
+                            "I can provide (quantity):", 
+                            min_value=0, 
+                            value=current_quantity,
+                            step=1,
+                            key=f"input_{poll['id']}"
+                        )
+                    with col2:
+                        if st.button("Submit", key=f"submit_{poll['id']}"):
+                            if respond_to_poll(
+                                poll_id=poll['id'],
+                                farmer_id=st.session_state.current_user,
+                                farmer_name=user_name,
+                                quantity=farmer_quantity
+                            ):
+                                st.success("Response submitted successfully!")
+                                st.rerun()
+                    
+                    # Show response details if already responded
+                    if farmer_response and "reference_code" in farmer_response:
+                        st.info(f"Reference Code: **{farmer_response['reference_code']}**")
+    else:
+        st.info("No active polls in this community")
+    
+    # Display closed polls in expander
+    closed_polls = [p for p in community_polls if p['status'] == 'closed']
+    if closed_polls:
+        with st.expander("Show Closed Polls"):
+            for poll in closed_polls:
+                st.write(f"**{poll['product']}**: {poll['quantity']} {poll['unit']} (Deadline: {poll['deadline']})")
+                st.write(f"Status: Closed • Responses: {len(poll['responses'])}")
+                st.divider()
+
 # Main content area - Show different views based on login status
+# Timed up to the footer; a rerun started part way (st.rerun) is not counted
+view_timer = VIEW_SECONDS.time(view=st.session_state.view if st.session_state.current_user else "landing")
+
 if not st.session_state.current_user:
     st.info("Please login or register to use the app")
     
@@ -729,25 +397,33 @@ if not st.session_state.current_user:
     
     with col1:
         st.subheader("Registered Farmers")
-        farmers = load_data(FARMERS_FILE)
-        if farmers:
+        total_farmers = count_users("farmer")
+        if total_farmers:
+            # Only one page of farmers is built and sent to the browser
+            farmer_page = st.number_input("Page", min_value=1, max_value=math.ceil(total_farmers / USERS_PAGE_SIZE), value=1, step=1, key="farmers_page")
+            farmers, _ = get_users_page("farmer", page=farmer_page)
             farmer_df = pd.DataFrame([{
                 "Name": farmer["name"],
                 "Location": f"{farmer['latitude']:.4f}, {farmer['longitude']:.4f}"
             } for farmer in farmers])
             st.dataframe(farmer_df)
+            st.caption(f"{total_farmers} farmers • Page {farmer_page} of {math.ceil(total_farmers / USERS_PAGE_SIZE)}")
         else:
             st.write("No farmers registered yet")
     
     with col2:
         st.subheader("Registered Vendors")
-        vendors = load_data(VENDORS_FILE)
-        if vendors:
+        total_vendors = count_users("vendor")
+        if total_vendors:
+            # Only one page of vendors is built and sent to the browser
+            vendor_page = st.number_input("Page", min_value=1, max_value=math.ceil(total_vendors / USERS_PAGE_SIZE), value=1, step=1, key="vendors_page")
+            vendors, _ = get_users_page("vendor", page=vendor_page)
             vendor_df = pd.DataFrame([{
                 "Name": vendor["name"],
                 "Location": f"{vendor['latitude']:.4f}, {vendor['longitude']:.4f}"
             } for vendor in vendors])
             st.dataframe(vendor_df)
+            st.caption(f"{total_vendors} vendors • Page {vendor_page} of {math.ceil(total_vendors / USERS_PAGE_SIZE)}")
         else:
             st.write("No vendors registered yet")
 
@@ -767,10 +443,12 @@ else:
                 col1, col2 = st.columns([3, 1])
                 with col1:
                     st.write(f"**{community['name']}**")
-                    st.write(f"Vendor: {community['vendor_name']} • Members: {community['member_count']} • Messages: {community['message_count']}")
+                    st.write(f"Vendor: {community['vendor_name']} • Members: {community['member_count']} • Messages: {community['message_count']} • Active polls: {community['active_polls']}")
                 with col2:
                     if st.button("Open Chat", key=f"chat_{community['id']}"):
                         st.session_state.chat_community = community['id']
+                        st.session_state.chat_window = CHAT_PAGE_SIZE
+                        st.session_state.chat_subscription = None
                         st.session_state.view = "chat"
                         st.rerun()
                 
@@ -782,19 +460,33 @@ else:
     elif st.session_state.view == "supply_commitments":
         # My Active Polls View (for both farmers and vendors)
         st.subheader("Active Commitments")
-        st.write("")
-        st.write("")
-        # Get all communities to display names - Move this outside of any conditional blocks
-        communities = load_data(COMMUNITIES_FILE)
         
+        # Totals come from the precomputed dashboard summary
+        summary = get_user_summary(st.session_state.current_user)
+        committed = ", ".join(f"{quantity} {unit}" for unit, quantity in summary["committed"].items()) or "0"
+        col1, col2, col3 = st.columns(3)
+        if st.session_state.current_user_type == "farmer":
+            with col1:
+                st.metric("Active Commitments", summary["active_commitments"])
+            with col2:
+                st.metric("Communities", summary["community_count"])
+            with col3:
+                st.metric("You Committed", committed)
+        else:
+            with col1:
+                st.metric("Active Polls", summary["active_polls"])
+            with col2:
+                st.metric("Responses Received", summary["responses_received"])
+            with col3:
+                st.metric("Committed So Far", committed)
+        st.write("")
         # Get active polls for the current user
         user_polls = get_user_active_polls(st.session_state.current_user, st.session_state.current_user_type)
         
         if user_polls:
             for poll in user_polls:
                 # Get community name
-                community = next((c for c in communities if c["id"] == poll["community_id"]), None)
-                community_name = community["name"] if community else "Unknown Community"
+                community_name = get_community_name(poll["community_id"])
                 
                 with st.container(border=True):
                     # Poll header
@@ -811,7 +503,7 @@ else:
                             st.warning("⏳ Open")
                     
                     # Progress bar
-                    total_committed = sum(r["quantity"] for r in poll["responses"])
+                    total_committed = poll["total_committed"]
                     percent_complete = min(100, round((total_committed / poll["quantity"]) * 100))
                     st.progress(percent_complete / 100)
                     st.write(f"Progress: {total_committed} of {poll['quantity']} {poll['unit']} ({percent_complete}%)")
@@ -819,7 +511,7 @@ else:
                     # Different information for farmers vs vendors
                     if st.session_state.current_user_type == "farmer":
                         # Find the farmer's response
-                        farmer_response = next((r for r in poll["responses"] if r["farmer_id"] == st.session_state.current_user), None)
+                        farmer_response = poll["responses"].get(st.session_state.current_user)
                         if farmer_response:
                             # Display complete farmer's contribution details
                             st.divider()
@@ -850,7 +542,7 @@ else:
                                     "Reference Code": r.get("reference_code", "N/A"),
                                     "Response Date": r["created_at"].split('T')[0],
                                     "% of Total": f"{round((r['quantity'] / poll['quantity']) * 100, 1)}%"
-                                } for r in poll["responses"]])
+                                } for r in poll["responses"].values()])
                                 st.dataframe(response_df, use_container_width=True)
                                 
                                 # Summary statistics
@@ -890,15 +582,14 @@ else:
             st.subheader("Closed & Fulfilled Polls")
             st.write(" ")
             
-            # Load all polls and filter for this vendor's closed polls
-            all_polls = load_data(POLLS_FILE)
-            closed_polls = [p for p in all_polls if p["vendor_id"] == st.session_state.current_user and p["status"] in ["closed", "fulfilled"]]
+            # Filter this vendor's polls for closed and fulfilled ones
+            vendor_polls = get_user_active_polls(st.session_state.current_user, "vendor", include_closed=True)
+            closed_polls = [p for p in vendor_polls if p["status"] in ["closed", "fulfilled"]]
             
             if closed_polls:
                 for poll in closed_polls:
                     # Get community name
-                    community = next((c for c in communities if c["id"] == poll["community_id"]), None)
-                    community_name = community["name"] if community else "Unknown Community"
+                    community_name = get_community_name(poll["community_id"])
                     
                     with st.expander(f"{poll['product']}: {poll['quantity']} {poll['unit']} - {poll['status'].upper()}"):
                         st.write(f"Community: {community_name}")
@@ -911,7 +602,7 @@ else:
                                 "Quantity": f"{r['quantity']} {poll['unit']}",
                                 "Reference Code": r.get("reference_code", "N/A"),
                                 "Response Date": r["created_at"].split('T')[0]
-                            } for r in poll["responses"]])
+                            } for r in poll["responses"].values()])
                             st.dataframe(response_df, use_container_width=True)
                         else:
                             st.info("No responses were received for this poll.")
@@ -930,8 +621,7 @@ else:
             if closed_polls:
                 for poll in closed_polls:
                     # Get community name
-                    community = next((c for c in communities if c["id"] == poll["community_id"]), None)
-                    community_name = community["name"] if community else "Unknown Community"
+                    community_name = get_community_name(poll["community_id"])
                     
                     with st.expander(f"{poll['product']}: {poll['quantity']} {poll['unit']} - CLOSED"):
                         st.write(f"Community: {community_name}")
@@ -939,7 +629,7 @@ else:
                         st.write(f"Deadline was: {poll['deadline']}")
                         
                         # Find the farmer's response
-                        farmer_response = next((r for r in poll["responses"] if r["farmer_id"] == st.session_state.current_user), None)
+                        farmer_response = poll["responses"].get(st.session_state.current_user)
                         if farmer_response:
                             # Display farmer's contribution details
                             st.divider()
@@ -951,7 +641,7 @@ else:
                                 st.write(f"**Response Date:** {farmer_response['created_at'].split('T')[0]}")
                             with col2:
                                 st.write(f"**Total Required:** {poll['quantity']} {poll['unit']}")
-                                total_committed = sum(r["quantity"] for r in poll["responses"])
+                                total_committed = poll["total_committed"]
                                 st.write(f"**Total Committed:** {total_committed} {poll['unit']}")
                                 st.write(f"**Your Percentage:** {round((farmer_response['quantity'] / poll['quantity']) * 100, 1)}%")
             else:
@@ -1001,6 +691,21 @@ else:
             'float',
             'float'  # Altitude
         ]
+        # Farmers start from their area's climate normals and soil, already scored
+        recommendation = None
+        if st.session_state.current_user_type == "farmer":
+            try:
+                recommendation = get_crop_recommendation(user)
+            except Exception as e:
+                st.error(f"Error loading your crop recommendation: {e}")
+        if recommendation:
+            st.subheader("Recommended for your area")
+            for col, crop in zip(st.columns(len(recommendation["crops"])), recommendation["crops"]):
+                with col:
+                    st.metric(crop["crop"].title(), f"{crop['probability']:.0%}")
+            st.caption(f"Scored with the climate and soil of the nearest grid cell, {recommendation['cell_distance_km']} km "
+                       "from you. Change the values below to score your own field.")
+        defaults = recommendation["features"] if recommendation else {}
         cols = st.columns(2)
         input_values = []
 
@@ -1021,7 +726,7 @@ else:
                 elif input_type == 'float':
                     value = st.number_input(
                         name, 
-                        value=0.0, 
+                        value=float(defaults.get(name, 0.0)), 
                         step=0.1, 
                         format="%.2f", 
                         key=f"input_{i}"
@@ -1045,14 +750,14 @@ else:
                 input_values.append(value)
         if st.button("Make Prediction"):
             try:
-                with open('RandomForest.pkl', 'rb') as f:
+                with open('RandomForest.pkl', 'rb') as f, MODEL_LOAD_SECONDS.time(model="RandomForest.pkl"):
                     model = pickle.load(f)
                 
             except Exception as e:
                 st.error(f"Error loading model: {e}")
                 model = None
             try:
-                with open('label_encoder.pkl', 'rb') as f:
+                with open('label_encoder.pkl', 'rb') as f, MODEL_LOAD_SECONDS.time(model="label_encoder.pkl"):
                     decoder = pickle.load(f)
             except Exception as e:
                 st.error(f"Error loading decoder: {e}")
@@ -1068,11 +773,14 @@ else:
                     # Make prediction
                     if hasattr(model, 'predict_proba'):
                         # If model supports probability prediction
-                        prediction = model.predict(input_array)[0]
+                        with INFERENCE_SECONDS.time(model="RandomForest.pkl", output="class"):
+                            prediction = model.predict(input_array)[0]
                         st.write(prediction)
                         prediction_label = decoder.inverse_transform([prediction])[0]
+                        record_prediction(input_values, prediction_label)
                         st.header(f"Predicted Crop: {prediction_label}")
-                        probabilities = model.predict_proba(input_array)[0]
+                        with INFERENCE_SECONDS.time(model="RandomForest.pkl", output="probabilities"):
+                            probabilities = model.predict_proba(input_array)[0]
                         
 
                 except Exception as e:
@@ -1109,15 +817,16 @@ else:
                     st.plotly_chart(fig)
 
                 str2= "Provide a detailed guide on how to grow " + str(prediction_label) + " including specific treatments, preventative measures, and any relevant environmental factors."
-                client = Together(api_key=(''))
+                client = together.Together(api_key=(''))
 
-                response = client.chat.completions.create(
-                    model="meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo",
-                    messages=[{"role": "user", "content": str2}],
-                    max_tokens=512,
-                    temperature=0.7
+                with EXTERNAL_CALL_SECONDS.time(service="together"):
+                    response = client.chat.completions.create(
+                        model="meta-llama/Meta-Llama-3.1-8B-Instruct-Turbo",
+                        messages=[{"role": "user", "content": str2}],
+                        max_tokens=512,
+                        temperature=0.7
 
-                )
+                    )
                 print(response.choices[0].message.content)
                 result = ''
                 for choice in response.choices:
@@ -1139,16 +848,18 @@ else:
     "Punjabi": "pa"
 }
 
-                translator = Translator()
+                translator = googletrans.Translator()
                 lang_code = INDIAN_LANGUAGES[selected_language]
-                translation = translator.translate(result, dest=lang_code)
+                with EXTERNAL_CALL_SECONDS.time(service="translate"):
+                    translation = translator.translate(result, dest=lang_code)
                 translated_text = translation.text
 
                 st.header(translated_text)
-                tts = gTTS(text=translated_text, lang=lang_code)
-                # audio_buffer = BytesIO()
-                # tts.write_to_fp(audio_buffer)
-                tts.save("translated_audio.mp3")
+                with EXTERNAL_CALL_SECONDS.time(service="tts"):
+                    tts = gtts.gTTS(text=translated_text, lang=lang_code)
+                    # audio_buffer = BytesIO()
+                    # tts.write_to_fp(audio_buffer)
+                    tts.save("translated_audio.mp3")
                 # with open(audio_buffer, 'rb') as audio:
                 st.audio("translated_audio.mp3", format='audio/mp3')
                 
@@ -1189,49 +900,27 @@ else:
                         if len(farmers) > 5:
                             st.write(f"...and {len(farmers) - 5} more farmers")
                 
+                # Search the community's chat history
+                with st.expander("Search Messages"):
+                    search_query = st.text_input("Search messages:", key="message_search")
+                    if search_query:
+                        search_page = st.number_input("Page", min_value=1, value=1, step=1, key="message_search_page")
+                        results, total_results = search_community_messages(community['id'], search_query, page=search_page)
+                        total_pages = max(1, math.ceil(total_results / SEARCH_PAGE_SIZE))
+                        st.caption(f"{total_results} matching messages • Page {search_page} of {total_pages}")
+                        
+                        for msg in results:
+                            st.write(f"**{msg['user_name']}** ({msg['user_type'].capitalize()}) • {msg['timestamp'].split('T')[0]} {msg['timestamp'].split('T')[1][:5]}")
+                            st.write(msg['content'])
+                        if not results:
+                            st.info("No messages found")
+                
                 # Display chat messages with improved styling and scrollable container
                 st.divider()
                 chat_container = st.container(height=500, border=True)
                 
                 with chat_container:
-                    for msg in community['messages']:
-                        is_self = msg['user_id'] == st.session_state.current_user
-                        
-                        # Format message based on sender with more visible colors and spacing
-                        if is_self:
-                            st.markdown(f"""
-                            <div style='display: flex; justify-content: flex-end; margin-bottom: 20px;'>
-                                <div style='background-color: #007BFF; color: white; padding: 12px; border-radius: 15px; max-width: 80%;'>
-                                    <p style='margin: 0; text-align: right;'>{msg['content']}</p>
-                                    <p style='margin: 0; font-size: 0.8em; color: #E6F2FF; text-align: right; margin-top: 5px;'>You - {msg['timestamp'].split('T')[1][:5]}</p>
-                                </div>
-                            </div>
-                            """, unsafe_allow_html=True)
-                        else:
-                            # For messages from others
-                            # Choose color based on user type - ensuring good contrast for text
-                            if msg['user_type'] == 'farmer':
-                                badge_bg = '#28a745'  # green
-                                badge_text = 'white'
-                                msg_bg = '#f1f1f1'    # light gray
-                                msg_text = '#333333'  # dark gray
-                            else:  # vendor
-                                badge_bg = '#ffc107'  # yellow
-                                badge_text = 'black'
-                                msg_bg = '#f8f9fa'    # off-white
-                                msg_text = '#333333'  # dark gray
-                            
-                            msg_type_badge = f"<span style='background-color: {badge_bg}; color: {badge_text}; padding: 2px 8px; border-radius: 10px; font-size: 0.7em; margin-right: 5px;'>{msg['user_type'].upper()}</span>"
-                            
-                            st.markdown(f"""
-                            <div style='display: flex; justify-content: flex-start; margin-bottom: 20px;'>
-                                <div style='background-color: {msg_bg}; color: {msg_text}; padding: 12px; border-radius: 15px; max-width: 80%;'>
-                                    <p style='margin: 0; font-weight: bold;'>{msg_type_badge} {msg['user_name']}</p>
-                                    <p style='margin: 0;'>{msg['content']}</p>
-                                    <p style='margin: 0; font-size: 0.8em; color: #777; margin-top: 5px;'>{msg['timestamp'].split('T')[0]} {msg['timestamp'].split('T')[1][:5]}</p>
-                                </div>
-                            </div>
-                            """, unsafe_allow_html=True)
+                    render_chat_messages(community['id'])
                 
                 # Input for new message
                 st.divider()
@@ -1249,9 +938,6 @@ else:
             with polls_tab:
                 # st.subheader("Community Polls")
                 
-                # Get polls for this community
-                community_polls = get_community_polls(community['id'])
-                
                 # Display create poll form for vendors
                 if st.session_state.current_user_type == "vendor" and community['vendor_id'] == st.session_state.current_user:
                     st.subheader("Create New Poll")
@@ -1281,73 +967,7 @@ else:
                             st.rerun()
                 
                 # Display all polls
-                st.subheader("Active Polls")
-                
-                # Filter active polls
-                active_polls = [p for p in community_polls if p['status'] != 'closed']
-                
-                if active_polls:
-                    for poll in active_polls:
-                        with st.container(border=True):
-                            col1, col2 = st.columns([3, 1])
-                            with col1:
-                                st.write(f"**{poll['product']}**: {poll['quantity']} {poll['unit']} by {poll['deadline']}")
-                            with col2:
-                                if poll['status'] == 'fulfilled':
-                                    st.success("✅ Fulfilled")
-                                else:
-                                    st.warning("⏳ Open")
-                            
-                            # Progress bar
-                            total_committed = sum(r['quantity'] for r in poll['responses'])
-                            percent_complete = min(100, round((total_committed / poll['quantity']) * 100))
-                            st.progress(percent_complete / 100)
-                            st.write(f"Progress: {total_committed} of {poll['quantity']} {poll['unit']} ({percent_complete}%)")
-                            
-                            # Allow farmers to respond to open polls
-                            if st.session_state.current_user_type == "farmer" and poll['status'] == 'open':
-                                # Check if farmer has already responded
-                                farmer_response = next((r for r in poll['responses'] if r['farmer_id'] == st.session_state.current_user), None)
-                                
-                                current_quantity = 0
-                                if farmer_response:
-                                    current_quantity = farmer_response['quantity']
-                                    st.write(f"Your current commitment: {current_quantity} {poll['unit']}")
-                                
-                                col1, col2 = st.columns([3, 1])
-                                with col1:
-                                    farmer_quantity = st.number_input(
-                                        "I can provide (quantity):", 
-                                        min_value=0, 
-                                        value=current_quantity,
-                                        step=1,
-                                        key=f"input_{poll['id']}"
-                                    )
-                                with col2:
-                                    if st.button("Submit", key=f"submit_{poll['id']}"):
-                                        if respond_to_poll(
-                                            poll_id=poll['id'],
-                                            farmer_id=st.session_state.current_user,
-                                            farmer_name=user['name'],
-                                            quantity=farmer_quantity
-                                        ):
-                                            st.success("Response submitted successfully!")
-                                            st.rerun()
-                                
-                                # Show response details if already responded
-                                if farmer_response and "reference_code" in farmer_response:
-                                    st.info(f"Reference Code: **{farmer_response['reference_code']}**")
-                else:
-                    st.info("No active polls in this community")
-                
-                # Display closed polls in expander
-                closed_polls = [p for p in community_polls if p['status'] == 'closed']
-                if closed_polls:
-                    with st.expander("Show Closed Polls"):
-                        for poll in closed_polls:
-                            st.write(f"**{poll['product']}**: {poll['quantity']} {poll['unit']} (Deadline: {poll['deadline']})")
-                            st.write(f"Status: Closed • Responses: {len(poll['responses'])}")
-                            st.divider()
+                render_community_polls(community['id'], user['name'])
     
     elif st.session_state.view == "market_prices":
         # Market Prices View
@@ -1369,12 +989,10 @@ else:
             
             with filter_col2:
                 if filter_option == "By Product":
-                    all_prices = load_data(MARKET_PRICES_FILE)
-                    products = sorted(list(set(price["product"] for price in all_prices)))
+                    products = get_price_store().products()
                     selected_product = st.selectbox("Select Product:", products) if products else "No products available"
                 elif filter_option == "By Location":
-                    all_prices = load_data(MARKET_PRICES_FILE)
-                    locations = sorted(list(set(price["location"] for price in all_prices)))
+                    locations = get_price_store().locations()
                     selected_location = st.selectbox("Select Location:", locations) if locations else "No locations available"
             
             # Display prices based on filter
@@ -1384,8 +1002,7 @@ else:
             elif filter_option == "By Product" and products:
                 prices = get_product_market_prices(selected_product)
             elif filter_option == "By Location" and locations:
-                prices = [p for p in load_data(MARKET_PRICES_FILE) if p["location"] == selected_location]
-                prices = sorted(prices, key=lambda x: x["timestamp"], reverse=True)
+                prices = get_location_market_prices(selected_location)
             else:
                 prices = []
             
@@ -1397,7 +1014,8 @@ else:
                     "Location": price["location"],
                     "Vendor": price["vendor_name"],
                     "Date": price["timestamp"].split('T')[0],
-                    "Notes": price["notes"]
+                    "Notes": price["notes"],
+                    "Review": "⚠️ Unusual price" if price.get("review") == "flagged" else ""
                 } for price in prices])
                 
                 st.dataframe(price_df, use_container_width=True)
@@ -1406,20 +1024,39 @@ else:
                 if filter_option == "By Product" and len(prices) > 1:
                     st.subheader(f"Price Trend for {selected_product}")
                     
-                    # Get price history data
-                    price_history = [{
-                        "date": datetime.fromisoformat(p["timestamp"]).strftime("%Y-%m-%d"),
-                        "price": p["price"]
-                    } for p in prices]
-                    
-                    # Sort by date
-                    price_history = sorted(price_history, key=lambda x: x["date"])
-                    
-                    # Create DataFrame for charting
-                    history_df = pd.DataFrame(price_history)
+                    trend_period = st.radio("Trend period:", ["Daily", "Weekly"], horizontal=True, key="trend_period")
+                    period = "day" if trend_period == "Daily" else "week"
+                    window = MOVING_AVERAGES[period][0]
                     
-                    # Plot
-                    st.line_chart(history_df.set_index("date"))
+                    # Mean price per period and its moving average, from the precomputed rollups
+                    trends = get_product_price_trends(selected_product, period)
+                    if not trends:
+                        # Rollups only cover accepted prices, so they can be empty when the listing is not
+                        st.info(f"No price trend available for {selected_product} yet")
+                    else:
+                        history_df = pd.concat([
+                            pd.DataFrame({
+                                f"{s['location']} ({s['unit']})": s["mean"],
+                                f"{s['location']} ({s['unit']}) {window}-{period} avg": s[f"ma_{window}"]
+                            }, index=pd.to_datetime(s["start"]))
+                            for s in trends
+                        ], axis=1).sort_index()
+                        
+                        # Plot
+                        st.line_chart(history_df)
+                        
+                        # Latest period per location and unit
+                        st.dataframe(pd.DataFrame([{
+                            "Location": s["location"],
+                            "Unit": s["unit"],
+                            "Period": str(s["start"][-1]),
+                            "Prices": int(s["count"][-1]),
+                            "Min (₹)": round(float(s["min"][-1]), 2),
+                            "Max (₹)": round(float(s["max"][-1]), 2),
+                            "Mean (₹)": round(float(s["mean"][-1]), 2),
+                            "Median (₹)": round(float(s["median"][-1]), 2),
+                            f"{window}-{period} avg (₹)": round(float(s[f"ma_{window}"][-1]), 2)
+                        } for s in trends]), use_container_width=True)
             else:
                 st.info("No market prices available for the selected filter")
         
@@ -1443,7 +1080,7 @@ else:
                     submit_price = st.form_submit_button("Add Market Price")
                     
                     if submit_price and product and price > 0 and location:
-                        add_market_price(
+                        _, verdict = add_market_price(
                             vendor_id=st.session_state.current_user,
                             vendor_name=user['name'],
                             product=product,
@@ -1452,8 +1089,16 @@ else:
                             location=location,
                             notes=notes
                         )
-                        st.success(f"Market price for {product} added successfully!")
-                        st.rerun()
+                        if verdict["status"] == QUARANTINED:
+                            st.error(f"₹{price:.2f}/{unit} is far from the usual price for {product} "
+                                     f"(around ₹{verdict['typical_price']:.2f}/{unit}), so it has been held for review "
+                                     f"instead of being published. Please check the price and unit.")
+                        elif verdict["status"] == FLAGGED:
+                            st.warning(f"Market price for {product} added, but it is unusual compared with the "
+                                       f"typical ₹{verdict['typical_price']:.2f}/{unit}.")
+                        else:
+                            st.success(f"Market price for {product} added successfully!")
+                            st.rerun()
             else:
                 st.info("Only vendors can add market prices. If you're a farmer, you can browse the latest prices.")
 
@@ -1472,14 +1117,27 @@ else:
                         "Crop Selection", "Harvesting", "Equipment", "Weather", "Sustainable Practices"]
             
             selected_category = st.selectbox("Category:", categories)
+            tip_query = st.text_input("Search tips:")
             
             st.divider()
             
             # Get tips based on filter
-            if selected_category == "All Categories":
-                tips = get_all_farming_tips()
+            if tip_query:
+                tip_page = st.number_input("Page", min_value=1, value=1, step=1, key="tip_search_page")
+                tips, total_results = search_farming_tips(
+                    tip_query,
+                    category=None if selected_category == "All Categories" else selected_category,
+                    page=tip_page
+                )
+                st.caption(f"{total_results} matching tips • Page {tip_page} of {max(1, math.ceil(total_results / SEARCH_PAGE_SIZE))}")
             else:
-                tips = get_farming_tips_by_category(selected_category)
+                tip_page = st.number_input("Page", min_value=1, value=1, step=1, key="tip_browse_page")
+                if selected_category == "All Categories":
+                    tips, total_tips = get_all_farming_tips(page=tip_page)
+                else:
+                    tips, total_tips = get_farming_tips_by_category(selected_category, page=tip_page)
+                if total_tips:
+                    st.caption(f"{total_tips} tips • Page {tip_page} of {max(1, math.ceil(total_tips / TIPS_PAGE_SIZE))}")
             
             if tips:
                 for tip in tips:
@@ -1496,7 +1154,7 @@ else:
                             likes_text = f"❤️ {tip['likes']}" 
                             
                             # Check if user already liked this tip
-                            user_liked = st.session_state.current_user in tip["liked_by"]
+                            user_liked = has_liked_farming_tip(tip['id'], st.session_state.current_user)
                             like_button_text = "Liked" if user_liked else "Like"
                             
                             if st.button(like_button_text, key=f"like_{tip['id']}", disabled=user_liked):
@@ -1546,6 +1204,8 @@ else:
                     st.success(f"Your farming tip '{tip_title}' has been shared successfully!")
                     st.rerun()
 
+view_timer.stop()
+
 # Add a footer
 st.divider()
 st.write("Connecting Farmers and Vendors-Sakshi Nimbalkar")
\ No newline at end of file
@@ -0,0 +1,259 @@
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from array import array
+from functools import lru_cache
+
+from storage import file_stamp
+from tips_index import category_key
+
+# Words in Latin script plus the Indic blocks (Devanagari .. Sinhala); the blocks are
+# listed explicitly because vowel signs are combining marks, which \w does not match
+_TOKEN_RE = re.compile(r"[\w\u0900-\u0DFF]+")
+_REPEAT_RE = re.compile(r"([a-z])\1+")
+
+# Spelling variants of transliterated Hindi/Marathi/etc. are folded to one key, so
+# "gehoon"/"gehun", "dhaan"/"dhan" and "chaawal"/"chawal" match each other
+_FOLDS = [
+    ("chh", "c"), ("ch", "c"), ("sh", "s"), ("kh", "k"), ("gh", "g"), ("jh", "j"),
+    ("th", "t"), ("dh", "d"), ("ph", "f"), ("bh", "b"),
+    ("aa", "a"), ("ee", "i"), ("ii", "i"), ("oo", "u"), ("uu", "u"),
+    ("w", "v"), ("z", "j"), ("q", "k"), ("x", "ks"),
+]
+
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "i", "in", "is", "it",
+    "of", "on", "or", "the", "to", "we", "with", "you",
+    "hai", "hain", "ka", "ki", "ke", "ko", "se", "me", "mein", "aur", "bhi", "ye", "woh", "tha",
+}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+MESSAGES = "message"
+TIPS = "tip"
+
+
+@lru_cache(maxsize=200000)
+def fold_term(token):
+    """Fold a lowercase token to its search key"""
+    if not token.isascii():
+        # Strip diacritics from romanised text (ā -> a); native scripts are kept as-is
+        stripped = "".join(c for c in unicodedata.normalize("NFKD", token) if not unicodedata.combining(c))
+        if not stripped.isascii():
+            return token
+        token = stripped
+    if token.isdigit():
+        return token
+
+    for src, dst in _FOLDS:
+        if src in token:
+            token = token.replace(src, dst)
+    token = _REPEAT_RE.sub(r"\1", token)
+    # Trailing schwa/aspiration is spelled inconsistently ("bajra"/"bajr", "kisanh")
+    if len(token) > 3 and token[-1] in "ah":
+        token = token[:-1]
+    return token
+
+
+def tokenize(text):
+    """Split text into folded search terms"""
+    terms = []
+    for token in _TOKEN_RE.findall(unicodedata.normalize("NFKC", text).casefold()):
+        if token in STOP_WORDS:
+            continue
+        terms.append(fold_term(token))
+    return terms
+
+
+def _document_terms(kind, document):
+    if kind == TIPS:
+        return tokenize(f"{document['title']} {document['title']} {document['content']}")  # title counts double
+    return tokenize(document["content"])
+
+
+class _ScopeIndex:
+    """Postings for the documents of one community (messages) or category (tips)"""
+
+    __slots__ = ("doc_ids", "doc_lengths", "postings", "total_length")
+
+    def __init__(self):
+        self.doc_ids = []
+        self.doc_lengths = array("H")
+        # term -> (doc numbers, term frequencies); doc numbers grow with insertion order
+        self.postings = {}
+        self.total_length = 0
+
+    def add(self, doc_id, terms):
+        docnum = len(self.doc_ids)
+        self.doc_ids.append(doc_id)
+        self.doc_lengths.append(min(len(terms), 65535))
+        self.total_length += len(terms)
+
+        counts = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, tf in counts.items():
+            entry = self.postings.get(term)
+            if entry is None:
+                entry = self.postings[term] = (array("I"), array("H"))
+            entry[0].append(docnum)
+            entry[1].append(min(tf, 65535))
+
+    def score(self, terms):
+        """BM25 scores keyed by doc number"""
+        n = len(self.doc_ids)
+        if not n:
+            return {}
+        avg_length = self.total_length / n
+        lengths = self.doc_lengths
+        scores = {}
+        for term in set(terms):
+            entry = self.postings.get(term)
+            if entry is None:
+                continue
+            docnums, tfs = entry
+            idf = math.log(1 + (n - len(docnums) + 0.5) / (len(docnums) + 0.5))
+            for docnum, tf in zip(docnums, tfs):
+                norm = K1 * (1 - B + B * lengths[docnum] / avg_length)
+                scores[docnum] = scores.get(docnum, 0.0) + idf * tf * (K1 + 1) / (tf + norm)
+        return scores
+
+
+class SearchIndex:
+    """Incrementally updated inverted index over community messages and farming tips
+
+    Documents of a data file added with `add_source` are kept in step with it.
+    The app's own writes are indexed in place via `apply_write`; if the file is
+    changed by anything else (another worker process, the archiver, a script),
+    its stamp no longer matches and its documents are reindexed on the next
+    search.
+    """
+
+    def __init__(self):
+        self._scopes = {}
+        self._lock = threading.RLock()
+        self._sources = {}  # file path -> function returning its documents
+        self._stamps = {}
+        self._source_scopes = {}  # file path -> keys of the scopes indexed from it
+
+    def _scope(self, kind, scope):
+        key = (kind, scope)
+        index = self._scopes.get(key)
+        if index is None:
+            index = self._scopes[key] = _ScopeIndex()
+        return index
+
+    def add_message(self, community_id, message):
+        """Index a chat message under its community"""
+        terms = _document_terms(MESSAGES, message)
+        with self._lock:
+            self._scope(MESSAGES, community_id).add(message["id"], terms)
+
+    def add_tip(self, tip):
+        """Index a farming tip under its category"""
+        terms = _document_terms(TIPS, tip)
+        with self._lock:
+            self._scope(TIPS, category_key(tip["category"])).add(tip["id"], terms)
+
+    def add_source(self, file_path, load_documents):
+        """Index a data file's documents and reindex them whenever the file changes
+
+        `load_documents()` returns them as (kind, scope, document) tuples; see
+        `message_documents` and `tip_documents`.
+        """
+        with self._lock:
+            self._sources[file_path] = load_documents
+            self._reindex(file_path)
+
+    def _reindex(self, file_path):
+        stamp = file_stamp(file_path)
+        for key in self._source_scopes.get(file_path, ()):
+            self._scopes.pop(key, None)
+        keys = self._source_scopes[file_path] = set()
+        for kind, scope, document in self._sources[file_path]():
+            keys.add((kind, scope))
+            self._scope(kind, scope).add(document["id"], _document_terms(kind, document))
+        # If the file changed while it was loaded, which version was indexed is not
+        # known, so the stamp matches neither and the next search reindexes again
+        self._stamps[file_path] = stamp if file_stamp(file_path) == stamp else None
+
+    def _refresh(self):
+        for file_path, stamp in list(self._stamps.items()):
+            if file_stamp(file_path) != stamp:
+                self._reindex(file_path)
+
+    def apply_write(self, file_path, stamp_before, documents=()):
+        """Index (kind, scope, document)s just saved to a source file by this process
+
+        Call while still holding the file's lock, also for writes that add no
+        documents. `stamp_before` is the file's stamp taken under the lock
+        before the write. If the index has not seen exactly that version
+        (somebody else wrote in between, or a search already reindexed the file
+        with the documents in it), nothing is added: the file's stamp no longer
+        matches, so the next search reindexes it, documents included.
+        """
+        documents = [(kind, scope, document, _document_terms(kind, document)) for kind, scope, document in documents]
+        with self._lock:
+            if file_path not in self._sources or stamp_before != self._stamps[file_path]:
+                return
+            for kind, scope, document, terms in documents:
+                self._scope(kind, scope).add(document["id"], terms)
+                self._source_scopes[file_path].add((kind, scope))
+            self._stamps[file_path] = file_stamp(file_path)
+
+    def search(self, kind, query, scope=None, page=1, page_size=20):
+        """Ranked search, returning one page of (doc_id, score) and the total match count
+
+        `scope` is a community id for messages or a category for tips; without
+        it every scope of that kind is searched.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return [], 0
+
+        matches = []
+        with self._lock:
+            self._refresh()
+            if scope is not None:
+                key = (kind, category_key(scope) if kind == TIPS else scope)
+                scopes = [self._scopes[key]] if key in self._scopes else []
+            else:
+                scopes = [index for (k, _), index in self._scopes.items() if k == kind]
+
+            for index in scopes:
+                # Ties go to the newest document
+                matches.extend((score, docnum, index.doc_ids[docnum]) for docnum, score in index.score(terms).items())
+
+        start = (page - 1) * page_size
+        top = heapq.nlargest(start + page_size, matches)
+        return [(doc_id, score) for score, _, doc_id in top[start:]], len(matches)
+
+    def document_count(self, kind=None):
+        """Number of indexed documents, optionally of one kind"""
+        with self._lock:
+            self._refresh()
+            return sum(len(index.doc_ids) for (k, _), index in self._scopes.items() if kind is None or k == kind)
+
+
+def message_documents(communities, archived_messages=None):
+    """Search documents of every message of some communities
+
+    `archived_messages(community_id)` may supply a community's archived messages,
+    which are indexed ahead of its hot ones.
+    """
+    for community in communities:
+        if archived_messages and community.get("archived_message_count"):
+            for message in archived_messages(community["id"]):
+                yield MESSAGES, community["id"], message
+        for message in community["messages"]:
+            yield MESSAGES, community["id"], message
+
+
+def tip_documents(farming_tips):
+    """Search documents of farming tips"""
+    for tip in farming_tips:
+        yield TIPS, category_key(tip["category"]), tip
@@ -0,0 +1,2 @@
+from services.resources import once
+from services.scope import UnitOfWork, current, start_request, unit_of_work
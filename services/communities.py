@@ -0,0 +1,226 @@
+import threading
+import uuid
+from datetime import datetime
+
+from archive import is_archived, iter_archived_messages, read_archived_messages
+from chat_view import CHAT_PAGE_SIZE, message_window
+from community_index import CommunityIndex
+from dashboard import DashboardSummaries, DashboardWorker
+from event_bus import community_topic, get_event_bus
+from event_log import append_change
+from outbox import OutboxWorker, enqueue
+from search_index import MESSAGES, SearchIndex, message_documents, tip_documents
+from services import crops, polls
+from services.resources import once
+from services.scope import current
+from storage import (
+    COMMUNITIES_FILES, COMMUNITY_DIRECTORY_FILE, FARMING_TIPS_FILE, POLLS_FILES, communities_file, file_lock,
+    file_stamp, load_data, record_changes
+)
+
+# Results per page for message and tip search
+SEARCH_PAGE_SIZE = 10
+
+# This process's latest writes to each communities and polls shard, as
+# {shard file: {stamp before: stamp after}}, to tell them from writes made elsewhere
+SHARD_WRITES_KEPT = 256
+_shard_writes = {}
+_shard_writes_lock = threading.Lock()
+
+
+@once
+def get_search_index():
+    """Full-text index over all messages and tips, built once per server process
+
+    Each communities shard and the tips file is reindexed when it is changed
+    by another process.
+    """
+    index = SearchIndex()
+    for shard_file in COMMUNITIES_FILES:
+        index.add_source(shard_file, lambda shard_file=shard_file: message_documents(
+            load_data(shard_file), archived_messages=iter_archived_messages))
+    index.add_source(FARMING_TIPS_FILE, lambda: tip_documents(load_data(FARMING_TIPS_FILE)))
+    return index
+
+
+@once
+def get_community_index():
+    """Every community's name and vendor across the shards, built once per server process"""
+    return CommunityIndex(COMMUNITY_DIRECTORY_FILE, lambda: load_data(COMMUNITY_DIRECTORY_FILE))
+
+
+def get_community_details(community_id):
+    """Get detailed information about a community"""
+    for community in current().load(communities_file(community_id)):
+        if community["id"] == community_id:
+            return community
+    
+    return None
+
+
+def get_user_communities(user_id, user_type):
+    """Get summary rows of all communities that a user is a member of"""
+    return get_dashboard_summaries().user_communities(user_id)
+
+
+def get_user_summary(user_id):
+    """Get a user's dashboard summary (active polls or commitments and committed totals)"""
+    return get_dashboard_summaries().user_summary(user_id)
+
+
+def add_message_to_community(community_id, user_id, user_name, user_type, message, message_id=None,
+                             queued_at=None):
+    """Add a message to a community chat
+    
+    Passing a `message_id` makes the call idempotent: a message with that id is
+    only ever added once (used for outbox redeliveries), even if it has since
+    been archived. `queued_at`, when the message was first queued, limits the
+    archive check to segments that could hold it. The message is written
+    straight away, as the check needs the latest data.
+    """
+    new_message = None
+    shard_file = communities_file(community_id)
+    
+    with file_lock(shard_file):
+        stamp_before = file_stamp(shard_file)
+        communities = load_data(shard_file)
+        community = next((c for c in communities if c["id"] == community_id), None)
+        if not community:
+            return
+        if message_id and (any(m["id"] == message_id for m in community["messages"])
+                           or community.get("archived_message_count") and is_archived(community_id, message_id,
+                                                                                      since=queued_at)):
+            return
+        
+        new_message = {
+            "id": message_id or str(uuid.uuid4()),
+            "user_id": user_id,
+            "user_name": user_name,
+            "user_type": user_type,
+            "content": message,
+            "timestamp": datetime.now().isoformat()
+        }
+        record_changes(shard_file, [append_change(community_id, "messages", new_message)], communities)
+        note_shard_write(shard_file, stamp_before, [(MESSAGES, community_id, new_message)])
+    current().forget(shard_file)
+    
+    if new_message:
+        get_event_bus().publish(community_topic(community_id), "message_added", community_id=community_id, message=new_message)
+
+
+def get_community_messages(community_id, limit=CHAT_PAGE_SIZE, offset=0):
+    """Get a page of community messages (oldest first) and the total message count"""
+    community = get_community_details(community_id)
+    if not community:
+        return [], 0
+    
+    messages = community["messages"]
+    archived_count = community.get("archived_message_count", 0)
+    total = archived_count + len(messages)
+    end = max(0, total - offset)
+    start = max(0, end - limit)
+    
+    if start >= archived_count:
+        return message_window(messages, limit, offset), total
+    
+    # Archived messages are all older than the hot ones, so the page starts in the archive
+    older = read_archived_messages(community_id, start, min(end, archived_count))
+    return older + messages[:max(0, end - archived_count)], total
+
+
+def search_community_messages(community_id, query, page=1, page_size=SEARCH_PAGE_SIZE):
+    """Search a community's messages, returning one ranked page and the total match count"""
+    hits, total = get_search_index().search(MESSAGES, query, scope=community_id, page=page, page_size=page_size)
+    if not hits:
+        return [], total
+    
+    community = get_community_details(community_id)
+    messages_by_id = {m["id"]: m for m in community["messages"]} if community else {}
+    if any(doc_id not in messages_by_id for doc_id, _ in hits):
+        # Some hits have been moved to the archive
+        wanted = {doc_id for doc_id, _ in hits}
+        messages_by_id.update((m["id"], m) for m in iter_archived_messages(community_id) if m["id"] in wanted)
+    return [messages_by_id[doc_id] for doc_id, _ in hits if doc_id in messages_by_id], total
+
+
+@once
+def get_dashboard_worker():
+    """Build the dashboard summaries and start the thread that keeps them current, once per server process"""
+    summaries = DashboardSummaries(COMMUNITIES_FILES, load_data, POLLS_FILES, polls.load_shard_polls)
+    worker = DashboardWorker(summaries, get_event_bus())
+    worker.catch_up()
+    worker.start()
+    return worker
+
+
+def note_shard_write(file_path, stamp_before, documents=()):
+    """Record a write this process just made to a communities or polls shard; call under the shard's lock
+
+    The search index (given the search `documents` it added) and the dashboard
+    summaries move on past it, if they are built yet, and open chats can tell
+    that its changes reach them as events on the bus.
+    """
+    if file_path in COMMUNITIES_FILES and get_search_index.is_built():
+        get_search_index().apply_write(file_path, stamp_before, documents)
+    if get_dashboard_worker.is_built():
+        get_dashboard_worker().summaries.apply_write(file_path, stamp_before)
+    with _shard_writes_lock:
+        writes = _shard_writes.setdefault(file_path, {})
+        writes[stamp_before] = file_stamp(file_path)
+        if len(writes) > SHARD_WRITES_KEPT:
+            del writes[next(iter(writes))]
+
+
+def changed_elsewhere(file_path, stamp):
+    """A shard's current stamp, and whether anything but this process's writes changed it since `stamp`"""
+    current_stamp = file_stamp(file_path)
+    with _shard_writes_lock:
+        writes = _shard_writes.get(file_path, {})
+        for _ in range(len(writes)):
+            if stamp == current_stamp or stamp not in writes:
+                break
+            stamp = writes[stamp]
+    return current_stamp, stamp != current_stamp
+
+
+def get_dashboard_summaries():
+    """Dashboard summaries, at least as fresh as every write published so far"""
+    summaries = get_dashboard_worker().summaries
+    summaries.wait_for(get_event_bus().last_seq)
+    return summaries
+
+
+def notify_community(community_id, user_id, user_name, user_type, message):
+    """Queue a message for a community chat; the outbox worker posts it shortly after"""
+    enqueue(
+        "community_message",
+        community_id=community_id,
+        user_id=user_id,
+        user_name=user_name,
+        user_type=user_type,
+        message=message
+    )
+
+
+def deliver_outbox_entry(entry):
+    """Deliver one outbox entry"""
+    if entry["kind"] == "community_message":
+        add_message_to_community(
+            community_id=entry["community_id"],
+            user_id=entry["user_id"],
+            user_name=entry["user_name"],
+            user_type=entry["user_type"],
+            message=entry["message"],
+            message_id=entry["id"],
+            queued_at=entry.get("queued_at")
+        )
+    elif entry["kind"] == "crop_recommendation":
+        crops.recommend_crops(entry["farmer"])
+
+
+@once
+def start_outbox_worker():
+    """Start the outbox delivery thread once per server process"""
+    worker = OutboxWorker(deliver_outbox_entry)
+    worker.start()
+    return worker
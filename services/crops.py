@@ -0,0 +1,81 @@
+import os
+
+from crop_recommendations import (
+    CLIMATE_NORMALS_FILE, ENCODER_FILE, FEATURES, MODEL_FILE, RecommendationIndex, Recommender
+)
+from drift_monitor import TRAINING_DATA_FILE, DriftMonitor, DriftWorker, Reference
+from event_log import replace_change
+from outbox import enqueue
+from services.resources import once
+from services.scope import unit_of_work
+from storage import RECOMMENDATIONS_FILE, load_data
+
+
+@once
+def get_recommendation_index():
+    """Saved crop recommendations by farmer, built once per server process"""
+    return RecommendationIndex(RECOMMENDATIONS_FILE, lambda: load_data(RECOMMENDATIONS_FILE))
+
+
+@once
+def get_recommender():
+    """The crop model and climate grid, for scoring farmers one at a time, loaded once per server process
+
+    None if the model, label encoder or climate normals are not in place; the
+    batch job (crop_recommendations.py) scores everyone once they are.
+    """
+    if not all(os.path.exists(path) for path in (MODEL_FILE, ENCODER_FILE, CLIMATE_NORMALS_FILE)):
+        return None
+    return Recommender()
+
+
+def recommend_crops(farmer):
+    """Score one farmer and save their recommendation in place of any older one; None if there is nothing to score with"""
+    recommender = get_recommender()
+    if recommender is None:
+        return None
+    recommendation = recommender.score([farmer])[0]
+    with unit_of_work() as uow:
+        uow.record(RECOMMENDATIONS_FILE, [replace_change(recommendation)])
+    return recommendation
+
+
+def queue_crop_recommendation(farmer):
+    """Queue a newly registered farmer for scoring; the outbox worker does it shortly after"""
+    enqueue(
+        "crop_recommendation",
+        farmer={"id": farmer["id"], "latitude": farmer["latitude"], "longitude": farmer["longitude"]}
+    )
+
+
+def get_crop_recommendation(farmer):
+    """A farmer's best crops and the model inputs for their location
+
+    The farmer is scored now if nothing is saved for them, or if what is saved
+    came from another model or climate grid than the one loaded.
+    """
+    saved = get_recommendation_index().get(farmer["id"])
+    recommender = get_recommender()
+    if saved is None or recommender is not None and saved.get("version") != recommender.version:
+        return recommend_crops(farmer) or saved
+    return saved
+
+
+@once
+def get_drift_monitor():
+    """The prediction input monitor, with its background drift check started, once per server process
+
+    None if the training data is not there to compare with.
+    """
+    if not os.path.exists(TRAINING_DATA_FILE):
+        return None
+    monitor = DriftMonitor(Reference.from_csv(TRAINING_DATA_FILE, FEATURES))
+    DriftWorker(monitor).start()
+    return monitor
+
+
+def record_prediction(values, label):
+    """Count a crop prediction's inputs (in FEATURES order) and result towards the drift statistics"""
+    monitor = get_drift_monitor()
+    if monitor is not None:
+        monitor.observe(values, label)
@@ -0,0 +1,320 @@
+import time
+import uuid
+from datetime import datetime
+
+from event_bus import community_topic, get_event_bus
+from event_log import insert_change
+from poll_index import PollIndex
+from poll_scheduler import PollDeadlineScheduler, deadline_timestamp
+from services import communities
+from services.resources import once
+from services.scope import unit_of_work
+from storage import POLLS_FILES, file_lock, file_stamp, load_data, load_sharded, polls_file, save_data
+
+
+def upgrade_poll(poll):
+    """Bring a poll saved with a response list up to the farmer_id -> response map with a running total"""
+    if isinstance(poll["responses"], list):
+        poll["responses"] = {r["farmer_id"]: r for r in poll["responses"]}
+    if "total_committed" not in poll:
+        poll["total_committed"] = sum(r["quantity"] for r in poll["responses"].values())
+    return poll
+
+
+def load_polls():
+    """Load all polls, from every shard"""
+    return [upgrade_poll(p) for p in load_sharded(POLLS_FILES)]
+
+
+def load_shard_polls(file_path):
+    """Load the polls of one shard"""
+    return [upgrade_poll(p) for p in load_data(file_path)]
+
+
+@once
+def get_poll_index():
+    """Poll lookups by id, community, vendor and farmer, built once per server process"""
+    return PollIndex(POLLS_FILES, load_shard_polls)
+
+
+def poll_shard(poll_id):
+    """The polls shard holding a poll, found through the poll index; None if there is no such poll"""
+    community_id = get_poll_index().community_of(poll_id)
+    return polls_file(community_id) if community_id else None
+
+
+def is_accepting_responses(poll):
+    """Whether farmers can still respond to a poll: it is open and its deadline has not passed
+
+    The scheduler closes a poll shortly after its deadline; until it does, the
+    deadline itself is checked. A poll whose deadline cannot be read counts
+    as having none.
+    """
+    if poll["status"] != "open":
+        return False
+    try:
+        return time.time() < deadline_timestamp(poll["deadline"])
+    except (KeyError, TypeError, ValueError):
+        return True
+
+
+def get_community_name(community_id):
+    """Get a community's name"""
+    community = communities.get_community_index().get(community_id)
+    return community["name"] if community else "Unknown Community"
+
+
+def create_poll(community_id, vendor_id, vendor_name, product, quantity, unit, deadline):
+    """Create a new poll for a specific product requirement"""
+    poll_id = str(uuid.uuid4())
+    
+    poll = {
+        "id": poll_id,
+        "community_id": community_id,
+        "vendor_id": vendor_id,
+        "vendor_name": vendor_name,
+        "product": product,
+        "quantity": quantity,
+        "unit": unit,
+        "deadline": deadline,
+        "status": "open",  # open, fulfilled, or closed
+        "created_at": datetime.now().isoformat(),
+        "responses": {},  # farmer_id -> response
+        "total_committed": 0
+    }
+    
+    def created():
+        start_poll_scheduler().schedule(poll)
+        get_event_bus().publish(community_topic(community_id), "poll_updated", poll=poll)
+        
+        # Add a message to the community about the new poll
+        message = f"I need {quantity} {unit} of {product} by {deadline}. Please respond on poll if you can contribute."
+        communities.notify_community(
+            community_id=community_id,
+            user_id=vendor_id,
+            user_name=vendor_name,
+            user_type="vendor",
+            message=message
+        )
+    
+    shard_file = polls_file(community_id)
+    
+    def indexed(stamp_before):
+        get_poll_index().apply_write(shard_file, stamp_before, updated=[poll])
+        communities.note_shard_write(shard_file, stamp_before)
+    
+    with unit_of_work() as uow:
+        uow.record(shard_file, [insert_change(poll)], on_write=indexed)
+        uow.after_commit(created)
+    
+    return poll_id
+
+
+def respond_to_poll(poll_id, farmer_id, farmer_name, quantity):
+    """Respond to a poll with how much a farmer can contribute"""
+    shard_file = poll_shard(poll_id)
+    if not shard_file:
+        return False
+    
+    # The read-modify-write runs under the shard's lock, so concurrent responses are never lost
+    with file_lock(shard_file):
+        stamp_before = file_stamp(shard_file)
+        polls = load_data(shard_file)
+        poll = next((p for p in polls if p["id"] == poll_id), None)
+        # Fulfilled, closed and expired polls take no more responses
+        if not poll or not is_accepting_responses(poll):
+            return False
+        upgrade_poll(poll)
+        
+        # Generate alphanumeric reference code
+        reference_code = f"P{poll_id[:4]}-F{farmer_id[:4]}-{uuid.uuid4().hex[:6].upper()}"
+        
+        # Check if already responded
+        existing_response = poll["responses"].get(farmer_id)
+        
+        if existing_response:
+            # Update existing response; the running total moves by the difference
+            poll["total_committed"] += quantity - existing_response["quantity"]
+            existing_response["quantity"] = quantity
+            existing_response["updated_at"] = datetime.now().isoformat()
+            # If reference code doesn't exist, generate one
+            if "reference_code" not in existing_response:
+                existing_response["reference_code"] = reference_code
+        else:
+            # Add new response
+            poll["responses"][farmer_id] = {
+                "farmer_id": farmer_id,
+                "farmer_name": farmer_name,
+                "quantity": quantity,
+                "reference_code": reference_code,
+                "created_at": datetime.now().isoformat()
+            }
+            poll["total_committed"] += quantity
+        
+        # Check if poll is fulfilled
+        fulfilled = poll["total_committed"] >= poll["quantity"]
+        if fulfilled:
+            poll["status"] = "fulfilled"
+        
+        save_data(polls, shard_file)
+        get_poll_index().apply_write(shard_file, stamp_before, updated=[poll], saved=[upgrade_poll(p) for p in polls])
+        communities.note_shard_write(shard_file, stamp_before)
+    
+    get_event_bus().publish(community_topic(poll["community_id"]), "poll_updated", poll=poll)
+    
+    if fulfilled:
+        # Add message to community about fulfillment
+        message = f"✅ Requirement for {poll['quantity']} {poll['unit']} of {poll['product']} has been met. Thank you to all farmers who contributed!"
+        communities.notify_community(
+            community_id=poll["community_id"],
+            user_id=poll["vendor_id"],
+            user_name=poll["vendor_name"],
+            user_type="vendor",
+            message=message
+        )
+    
+    return True
+
+
+def close_poll(poll_id, vendor_id):
+    """Close a poll (can only be done by the vendor who created it)"""
+    shard_file = poll_shard(poll_id)
+    if not shard_file:
+        return False
+    
+    with file_lock(shard_file):
+        stamp_before = file_stamp(shard_file)
+        polls = load_data(shard_file)
+        poll = next((p for p in polls if p["id"] == poll_id and p["vendor_id"] == vendor_id), None)
+        if not poll:
+            return False
+        upgrade_poll(poll)
+        poll["status"] = "closed"
+        save_data(polls, shard_file)
+        get_poll_index().apply_write(shard_file, stamp_before, updated=[poll], saved=[upgrade_poll(p) for p in polls])
+        communities.note_shard_write(shard_file, stamp_before)
+    
+    get_event_bus().publish(community_topic(poll["community_id"]), "poll_updated", poll=poll)
+    
+    # Add message to community about poll closure
+    message = f"❌ The poll for {poll['quantity']} {poll['unit']} of {poll['product']} has been closed."
+    communities.notify_community(
+        community_id=poll["community_id"],
+        user_id=vendor_id,
+        user_name=poll["vendor_name"],
+        user_type="vendor",
+        message=message
+    )
+    return True
+
+
+def expire_polls(poll_ids):
+    """Close the given polls that are still open because their deadline has passed"""
+    by_shard = {}
+    for poll_id in poll_ids:
+        shard_file = poll_shard(poll_id)
+        if shard_file:
+            by_shard.setdefault(shard_file, set()).add(poll_id)
+    expired = []
+    
+    for shard_file, wanted in by_shard.items():
+        with file_lock(shard_file):
+            stamp_before = file_stamp(shard_file)
+            polls = load_data(shard_file)
+            closed_at = datetime.now().isoformat()
+            shard_expired = []
+            for poll in polls:
+                # Polls fulfilled, closed or deleted in the meantime are left alone
+                if poll["id"] in wanted and poll["status"] == "open":
+                    upgrade_poll(poll)
+                    poll["status"] = "closed"
+                    poll["closed_reason"] = "deadline"
+                    poll["closed_at"] = closed_at
+                    shard_expired.append(poll)
+            if shard_expired:
+                save_data(polls, shard_file)
+                get_poll_index().apply_write(shard_file, stamp_before, updated=shard_expired,
+                                             saved=[upgrade_poll(p) for p in polls])
+                communities.note_shard_write(shard_file, stamp_before)
+        expired.extend(shard_expired)
+    
+    for poll in expired:
+        get_event_bus().publish(community_topic(poll["community_id"]), "poll_updated", poll=poll)
+        
+        message = f"⌛ The poll for {poll['quantity']} {poll['unit']} of {poll['product']} has closed: its deadline ({poll['deadline']}) has passed."
+        communities.notify_community(
+            community_id=poll["community_id"],
+            user_id=poll["vendor_id"],
+            user_name=poll["vendor_name"],
+            user_type="vendor",
+            message=message
+        )
+    
+    return len(expired)
+
+
+@once
+def start_poll_scheduler():
+    """Start the poll deadline scheduler once per server process"""
+    scheduler = PollDeadlineScheduler(load_polls, expire_polls)
+    scheduler.start()
+    return scheduler
+
+
+def delete_poll(poll_id, vendor_id):
+    """Delete a poll (can only be done by the vendor who created it)"""
+    shard_file = poll_shard(poll_id)
+    if not shard_file:
+        return False
+    
+    with file_lock(shard_file):
+        stamp_before = file_stamp(shard_file)
+        polls = load_data(shard_file)
+        
+        # Find the poll index
+        poll_index = next((i for i, p in enumerate(polls) if p["id"] == poll_id and p["vendor_id"] == vendor_id), None)
+        if poll_index is None:
+            return False
+        
+        # Remove the poll
+        removed_poll = polls.pop(poll_index)
+        save_data(polls, shard_file)
+        get_poll_index().apply_write(shard_file, stamp_before, removed=[poll_id],
+                                     saved=[upgrade_poll(p) for p in polls])
+        communities.note_shard_write(shard_file, stamp_before)
+    
+    get_event_bus().publish(community_topic(removed_poll["community_id"]), "poll_deleted", poll_id=poll_id)
+    
+    # Add message to community about poll deletion
+    message = f"The poll for {removed_poll['quantity']} {removed_poll['unit']} of {removed_poll['product']} has been deleted."
+    communities.notify_community(
+        community_id=removed_poll["community_id"],
+        user_id=vendor_id,
+        user_name=removed_poll["vendor_name"],
+        user_type="vendor",
+        message=message
+    )
+    return True
+
+
+def get_community_polls(community_id):
+    """Get all polls for a specific community"""
+    return get_poll_index().for_community(community_id)
+
+
+def get_poll_by_id(poll_id):
+    """Get a specific poll by ID"""
+    return get_poll_index().get(poll_id)
+
+
+def get_user_active_polls(user_id, user_type, include_closed=False):
+    """Get all active polls (and optionally closed polls) that a user has responded to or created"""
+    if user_type == "farmer":
+        # Polls the farmer has responded to
+        polls = get_poll_index().for_farmer(user_id)
+    else:
+        # Vendor's created polls
+        polls = get_poll_index().for_vendor(user_id)
+    
+    # Only include open or fulfilled polls by default, unless include_closed is True
+    return [p for p in polls if p["status"] != "closed" or include_closed]
@@ -0,0 +1,86 @@
+import uuid
+from datetime import datetime
+
+from price_rollups import PriceRollups
+from price_store import PriceStore
+from price_validator import FLAGGED, QUARANTINED, PriceValidator, record_for_review
+from services.resources import once
+
+
+@once
+def get_price_store():
+    """Columnar market price store, opened once per server process"""
+    return PriceStore()
+
+
+@once
+def get_price_rollups():
+    """Daily and weekly price aggregates, kept per server process"""
+    return PriceRollups(get_price_store())
+
+
+@once
+def get_price_validator():
+    """Running price statistics used to catch implausible prices, kept per server process"""
+    return PriceValidator(get_price_store())
+
+
+def add_market_price(vendor_id, vendor_name, product, price, unit, location, notes=""):
+    """Add a new market price entry
+    
+    Returns the entry's id and the validator's verdict. Prices far outside the
+    usual range are still published but stored with "review": "flagged", so
+    readers can mark them and the rollups leave them out; absurd ones are
+    quarantined to the review log and not published, and their id is None.
+    """
+    price_entry = {
+        "id": str(uuid.uuid4()),
+        "vendor_id": vendor_id,
+        "vendor_name": vendor_name,
+        "product": product,
+        "price": price,
+        "unit": unit,
+        "location": location,
+        "notes": notes,
+        "timestamp": datetime.now().isoformat()
+    }
+    
+    verdict = get_price_validator().validate(price_entry)
+    if verdict["status"] == QUARANTINED:
+        record_for_review(price_entry, verdict)
+        return None, verdict
+    if verdict["status"] == FLAGGED:
+        price_entry["review"] = FLAGGED
+    
+    # Appending under the store lock keeps the rollups in step with the stored prices
+    store = get_price_store()
+    with store.lock():
+        version_before = store.version(product, location)
+        store.append(price_entry)
+        get_price_rollups().add(price_entry, version_before, store.version(product, location))
+    return price_entry["id"], verdict
+
+
+def get_latest_market_prices(limit=20):
+    """Get the latest market prices (newest first)"""
+    return get_price_store().latest(limit)
+
+
+def get_product_market_prices(product, limit=None):
+    """Get market prices for a specific product (newest first)"""
+    return get_price_store().query(product=product, limit=limit)
+
+
+def get_location_market_prices(location, limit=None):
+    """Get market prices for a specific location (newest first)"""
+    return get_price_store().query(location=location, limit=limit)
+
+
+def get_vendor_market_prices(vendor_id):
+    """Get market prices posted by a specific vendor (newest first)"""
+    return get_price_store().query(vendor_id=vendor_id)
+
+
+def get_product_price_trends(product, period="day"):
+    """Get a product's precomputed price rollups, one series per location and unit"""
+    return get_price_rollups().series(product, period=period)
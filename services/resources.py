@@ -0,0 +1,70 @@
+import functools
+import threading
+
+from bootstrap import bootstrap
+from compaction import CompactionWorker
+from metrics import ENABLED as METRICS_ENABLED
+from metrics import MetricsExporter
+from storage import (
+    COMMUNITIES_FILES, COMMUNITY_DIRECTORY_FILE, FARMERS_FILE, FARMING_TIPS_FILE, POLLS_FILES, RECOMMENDATIONS_FILE,
+    VENDORS_FILE
+)
+
+# Forget functions of every resource built by `once`
+_resets = []
+
+
+def once(factory):
+    """Build a function's result on its first call and return that for the life of the process
+
+    Concurrent first calls wait for a single build, so background threads are
+    never started twice. `is_built()` tells whether the first call has been
+    made, for work that only matters once it has.
+    """
+    lock = threading.Lock()
+    built = []
+
+    @functools.wraps(factory)
+    def get():
+        if not built:
+            with lock:
+                if not built:
+                    built.append(factory())
+        return built[0]
+    get.is_built = lambda: bool(built)
+    _resets.append(built.clear)
+    return get
+
+
+def reset_resources():
+    """Forget every resource built by `once`, so the next calls build them anew (e.g. between tests)
+
+    Threads they started keep running.
+    """
+    for reset in _resets:
+        reset()
+
+
+@once
+def bootstrap_data():
+    """Run pending data migrations once per server process"""
+    return bootstrap()
+
+
+@once
+def start_compaction_worker():
+    """Start the thread that folds write-ahead logs into the data files, once per server process"""
+    worker = CompactionWorker([FARMERS_FILE, VENDORS_FILE, FARMING_TIPS_FILE, COMMUNITY_DIRECTORY_FILE,
+                               RECOMMENDATIONS_FILE, *COMMUNITIES_FILES, *POLLS_FILES])
+    worker.start()
+    return worker
+
+
+@once
+def start_metrics_exporter():
+    """Start the thread that writes out the metrics, once per server process, if APP_METRICS is on"""
+    if not METRICS_ENABLED:
+        return None
+    exporter = MetricsExporter()
+    exporter.start()
+    return exporter
@@ -0,0 +1,107 @@
+import threading
+from contextlib import contextmanager
+
+from storage import file_lock, file_stamp, load_data, record_changes
+
+_local = threading.local()
+
+
+class UnitOfWork:
+    """The data one request works with: each file loaded at most once, changes written together
+
+    Files read with `load` are kept for the life of the unit of work, so every
+    part of a request sees the same copy and no file is read twice. Changes
+    queued with `record` are written when the outermost `unit_of_work()` block
+    completes, with one write per file; a written file's copy is dropped, so it
+    is read again if needed.
+    """
+
+    def __init__(self):
+        self._datasets = {}
+        self._pending = {}  # file path -> (changes, on_write callbacks)
+        self._after_commit = []
+        self.loads = 0
+
+    def load(self, file_path):
+        """A data file's contents, read on first use; callers must not modify it"""
+        if file_path not in self._datasets:
+            self._datasets[file_path] = load_data(file_path)
+            self.loads += 1
+        return self._datasets[file_path]
+
+    def forget(self, file_path):
+        """Drop a file's copy, e.g. after it was written outside this unit of work"""
+        self._datasets.pop(file_path, None)
+
+    def record(self, file_path, changes, on_write=None):
+        """Queue changes (see event_log) to a data file
+
+        `on_write(stamp_before)` runs under the file's lock right after the
+        changes are written, for indexes kept in step with the file.
+        """
+        queued, callbacks = self._pending.setdefault(file_path, ([], []))
+        queued.extend(changes)
+        if on_write:
+            callbacks.append(on_write)
+
+    def after_commit(self, callback):
+        """Run a callback once the queued changes are written (e.g. to publish an event)"""
+        self._after_commit.append(callback)
+
+    def commit(self):
+        """Write the queued changes, one file at a time, then run the after-commit callbacks"""
+        pending, self._pending = self._pending, {}
+        callbacks, self._after_commit = self._after_commit, []
+        for file_path, (changes, on_write) in pending.items():
+            with file_lock(file_path):
+                stamp_before = file_stamp(file_path)
+                record_changes(file_path, changes)
+                for callback in on_write:
+                    callback(stamp_before)
+            self.forget(file_path)
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        """Discard the queued changes and callbacks"""
+        self._pending = {}
+        self._after_commit = []
+
+
+def start_request():
+    """Start a new request (e.g. a Streamlit rerun) on this thread; returns its unit of work"""
+    _local.request = UnitOfWork()
+    return _local.request
+
+
+def current():
+    """The unit of work for this thread: the open `unit_of_work()` block's, else the request's
+
+    A thread with neither (a background worker, a script) gets a new one on
+    every call, so it always reads the files as they are now.
+    """
+    return getattr(_local, "active", None) or getattr(_local, "request", None) or UnitOfWork()
+
+
+@contextmanager
+def unit_of_work():
+    """Group reads and writes; the changes are written when the outermost block completes
+
+    Nested blocks join the outer one. Within a request the request's unit of
+    work is used, so the files it already read are not read again. Nothing is
+    written if the block raises, so call st.rerun() after the block, not in it.
+    """
+    active = getattr(_local, "active", None)
+    if active is not None:
+        yield active
+        return
+
+    uow = _local.active = getattr(_local, "request", None) or UnitOfWork()
+    try:
+        yield uow
+    except BaseException:
+        uow.rollback()
+        raise
+    finally:
+        _local.active = None
+    uow.commit()
@@ -0,0 +1,75 @@
+import uuid
+from datetime import datetime
+
+from event_log import insert_change
+from search_index import TIPS, tip_documents
+from services.communities import SEARCH_PAGE_SIZE, get_search_index
+from services.resources import once
+from services.scope import unit_of_work
+from storage import FARMING_TIPS_FILE, load_data
+from tips_index import ALL_CATEGORIES, TipsIndex
+
+# Tips per page when browsing
+TIPS_PAGE_SIZE = 10
+
+
+@once
+def get_tips_index():
+    """Tips ranked by likes per category, built once per server process"""
+    return TipsIndex(FARMING_TIPS_FILE, lambda: load_data(FARMING_TIPS_FILE))
+
+
+def add_farming_tip(user_id, user_name, user_type, title, content, category):
+    """Add a new farming tip or resource"""
+    # Build the indexes before saving, so the new tip is indexed exactly once
+    search_index = get_search_index()
+    tips_index = get_tips_index()
+    
+    tip_entry = {
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "user_name": user_name,
+        "user_type": user_type,
+        "title": title,
+        "content": content,
+        "category": category,
+        "timestamp": datetime.now().isoformat()
+    }
+    
+    def indexed(stamp_before):
+        tips_index.apply_tip(stamp_before, tip_entry)
+        search_index.apply_write(FARMING_TIPS_FILE, stamp_before, tip_documents([tip_entry]))
+    
+    with unit_of_work() as uow:
+        uow.record(FARMING_TIPS_FILE, [insert_change(tip_entry)], on_write=indexed)
+    return tip_entry["id"]
+
+
+def like_farming_tip(tip_id, user_id):
+    """Like a farming tip (likes are appended to the likes table; the tips file is not rewritten)"""
+    return get_tips_index().like(tip_id, user_id, datetime.now().isoformat())
+
+
+def has_liked_farming_tip(tip_id, user_id):
+    """Check whether a user has liked a tip"""
+    return get_tips_index().has_liked(tip_id, user_id)
+
+
+def get_all_farming_tips(page=1, page_size=TIPS_PAGE_SIZE):
+    """Get one page of farming tips (most liked first) and the total number of tips"""
+    return get_tips_index().page(ALL_CATEGORIES, page=page, page_size=page_size)
+
+
+def get_farming_tips_by_category(category, page=1, page_size=TIPS_PAGE_SIZE):
+    """Get one page of farming tips in a category (most liked first) and the category's tip count"""
+    return get_tips_index().page(category, page=page, page_size=page_size)
+
+
+def search_farming_tips(query, category=None, page=1, page_size=SEARCH_PAGE_SIZE):
+    """Search farming tips, optionally within one category, returning one ranked page and the total match count"""
+    hits, total = get_search_index().search(TIPS, query, scope=category, page=page, page_size=page_size)
+    if not hits:
+        return [], total
+    
+    tips = [get_tips_index().get(doc_id) for doc_id, _ in hits]
+    return [tip for tip in tips if tip], total
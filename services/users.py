@@ -0,0 +1,202 @@
+import math
+import uuid
+from datetime import datetime
+
+from event_bus import community_topic, get_event_bus
+from event_log import append_change, insert_change
+from community_index import directory_entry
+from metrics import COUNT_BUCKETS, histogram
+from services import communities, crops
+from services.resources import once
+from services.scope import unit_of_work
+from storage import COMMUNITY_DIRECTORY_FILE, FARMERS_FILE, VENDORS_FILE, communities_file, load_data
+from user_index import UserIndex
+
+USER_FILES = {"farmer": FARMERS_FILE, "vendor": VENDORS_FILE}
+
+# Users per page in the registered users tables
+USERS_PAGE_SIZE = 20
+
+GEO_SCAN_SECONDS = histogram("geo_scan_seconds", "Time to measure distances between users, by operation")
+GEO_SCAN_PAIRS = histogram("geo_scan_pairs", "Distances measured in one scan, by operation", COUNT_BUCKETS)
+
+
+# Haversine formula to calculate distance between two points on Earth
+def calculate_distance(lat1, lon1, lat2, lon2):
+    """Calculate the distance between two points using Haversine formula"""
+    R = 6371  # Earth's radius in kilometers
+    
+    # Convert decimal degrees to radians
+    lat1_rad = math.radians(lat1)
+    lon1_rad = math.radians(lon1)
+    lat2_rad = math.radians(lat2)
+    lon2_rad = math.radians(lon2)
+    
+    # Differences
+    dlat = lat2_rad - lat1_rad
+    dlon = lon2_rad - lon1_rad
+    
+    # Haversine formula
+    a = math.sin(dlat/2)**2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(dlon/2)**2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1-a))
+    distance = R * c
+    
+    return distance
+
+
+@once
+def get_user_indexes():
+    """Farmer and vendor lookups by id, name and phone, built once per server process"""
+    return {user_type: UserIndex(file_path, lambda file_path=file_path: load_data(file_path))
+            for user_type, file_path in USER_FILES.items()}
+
+
+def get_user_index(user_type):
+    """The farmer or vendor index"""
+    return get_user_indexes()["farmer" if user_type == "farmer" else "vendor"]
+
+
+def register_user(user_type, name, latitude, longitude, phone=""):
+    """Register a new user (farmer or vendor)"""
+    user_id = str(uuid.uuid4())
+    user_data = {
+        "id": user_id,
+        "name": name,
+        "latitude": latitude,
+        "longitude": longitude,
+        "created_at": datetime.now().isoformat()
+    }
+    if phone:
+        user_data["phone"] = phone
+    
+    def indexed(stamp_before):
+        get_user_index(user_type).apply_user(stamp_before, user_data)
+    
+    with unit_of_work() as uow:
+        if user_type == "farmer":
+            uow.record(FARMERS_FILE, [insert_change(user_data)], on_write=indexed)
+            
+            # Add farmer to all nearby vendor communities
+            add_farmer_to_communities(user_data)
+            
+            # Score their crops for the crop prediction page in the background
+            uow.after_commit(lambda: crops.queue_crop_recommendation(user_data))
+            
+        else:  # vendor
+            uow.record(VENDORS_FILE, [insert_change(user_data)], on_write=indexed)
+            
+            # Create a new community for this vendor
+            create_vendor_community(user_data)
+    
+    return user_id
+
+
+def create_vendor_community(vendor):
+    """Create a new community for a vendor and add nearby farmers"""
+    # Create new community
+    community = {
+        "id": str(uuid.uuid4()),
+        "name": f"{vendor['name']}'s Community",
+        "vendor_id": vendor["id"],
+        "vendor_name": vendor["name"],
+        "members": [{"id": vendor["id"], "name": vendor["name"], "type": "vendor"}],
+        "messages": [],
+        "created_at": datetime.now().isoformat()
+    }
+    
+    entry = directory_entry(community)
+    shard_file = communities_file(community["id"])
+    
+    def created():
+        get_event_bus().publish(community_topic(community["id"]), "community_created", community=community)
+    
+    def indexed(stamp_before):
+        communities.get_community_index().apply_write(stamp_before, added=[entry])
+    
+    with unit_of_work() as uow:
+        farmers = uow.load(FARMERS_FILE)
+        GEO_SCAN_PAIRS.observe(len(farmers), operation="create_vendor_community")
+        with GEO_SCAN_SECONDS.time(operation="create_vendor_community"):
+            # Add all farmers within 50km
+            for farmer in farmers:
+                distance = calculate_distance(
+                    vendor["latitude"], vendor["longitude"],
+                    farmer["latitude"], farmer["longitude"]
+                )
+                
+                if distance <= 50:  # 50 km radius
+                    community["members"].append({
+                        "id": farmer["id"], 
+                        "name": farmer["name"],
+                        "type": "farmer",
+                        "distance": round(distance, 2)
+                    })
+        
+        # The community is written before its directory entry, so an entry never points at nothing
+        uow.record(shard_file, [insert_change(community)],
+                   on_write=lambda stamp_before: communities.note_shard_write(shard_file, stamp_before))
+        uow.record(COMMUNITY_DIRECTORY_FILE, [insert_change(entry)], on_write=indexed)
+        uow.after_commit(created)
+
+
+def add_farmer_to_communities(farmer):
+    """Add a new farmer to all vendor communities within 50km"""
+    joined = []
+    
+    def published():
+        for community_id, member in joined:
+            get_event_bus().publish(community_topic(community_id), "member_added", community_id=community_id, member=member)
+    
+    with unit_of_work() as uow:
+        vendors = {v["id"]: v for v in uow.load(VENDORS_FILE)}
+        # The index has every community's vendor, so no shard is loaded
+        candidates = communities.get_community_index().all()
+        GEO_SCAN_PAIRS.observe(len(candidates), operation="add_farmer_to_communities")
+        with GEO_SCAN_SECONDS.time(operation="add_farmer_to_communities"):
+            for community in candidates:
+                vendor = vendors.get(community["vendor_id"])
+                
+                if vendor:
+                    distance = calculate_distance(
+                        vendor["latitude"], vendor["longitude"],
+                        farmer["latitude"], farmer["longitude"]
+                    )
+                    
+                    if distance <= 50:  # 50 km radius
+                        member = {
+                            "id": farmer["id"], 
+                            "name": farmer["name"],
+                            "type": "farmer",
+                            "distance": round(distance, 2)
+                        }
+                        joined.append((community["id"], member))
+        # Each shard's new members are written together
+        by_shard = {}
+        for community_id, member in joined:
+            change = append_change(community_id, "members", member)
+            by_shard.setdefault(communities_file(community_id), []).append(change)
+        for shard_file, changes in by_shard.items():
+            uow.record(shard_file, changes, on_write=lambda stamp_before, shard_file=shard_file:
+                       communities.note_shard_write(shard_file, stamp_before))
+        if joined:
+            uow.after_commit(published)
+
+
+def get_user_by_id(user_id, user_type):
+    """Get user details by ID"""
+    return get_user_index(user_type).get(user_id)
+
+
+def search_users(user_type, query, limit=10):
+    """Farmers or vendors whose name or phone number starts with what was typed so far"""
+    return get_user_index(user_type).search(query, limit=limit)
+
+
+def count_users(user_type):
+    """How many farmers or vendors are registered"""
+    return get_user_index(user_type).count()
+
+
+def get_users_page(user_type, page=1, page_size=USERS_PAGE_SIZE):
+    """One page of farmers or vendors in registration order, and the total number registered"""
+    return get_user_index(user_type).page(page=page, page_size=page_size)
@@ -0,0 +1,283 @@
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+
+from data_codecs import decode, default_codec, file_codec
+from event_log import apply_changes, log_changes, read_changes, wal_path
+from metrics import SIZE_BUCKETS, histogram
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads of this process are serialised
+    fcntl = None
+
+# File paths for our "database"
+FARMERS_FILE = "farmers.json"
+VENDORS_FILE = "vendors.json"
+COMMUNITIES_FILE = "communities.json"  # Before sharding; see communities_file()
+MARKET_PRICES_FILE = "market_prices.json"
+FARMING_TIPS_FILE = "farming_tips.json"
+POLLS_FILE = "polls.json"  # Before sharding; see polls_file()
+
+# Communities (with their members and messages) and their polls are split into
+# shards by a hash of the community id. Each shard has its own files, and so its
+# own locks and logs, so writes to communities in different shards never wait
+# for each other. The count is fixed when a data directory is set up.
+COMMUNITY_SHARDS = int(os.environ.get("DATA_SHARDS", "8"))
+
+
+def _shard_files(file_path):
+    root, extension = os.path.splitext(file_path)
+    return [f"{root}_{shard}{extension}" for shard in range(COMMUNITY_SHARDS)]
+
+
+COMMUNITIES_FILES = _shard_files(COMMUNITIES_FILE)
+POLLS_FILES = _shard_files(POLLS_FILE)
+
+# Every community's id, name and vendor, for lookups across the shards
+COMMUNITY_DIRECTORY_FILE = "community_directory.json"
+
+# Each farmer's best crops, precomputed by crop_recommendations.py
+RECOMMENDATIONS_FILE = "crop_recommendations.json"
+
+# "snapshot" rewrites a data file on every change; "log" appends each change to
+# the file's write-ahead log, which the compaction worker folds into the file
+PERSISTENCE = os.environ.get("DATA_PERSISTENCE", "snapshot")
+
+LOAD_SECONDS = histogram("data_load_seconds", "Time to load a data file, with its logged changes applied")
+LOAD_BYTES = histogram("data_load_bytes", "Size of a data file when loaded", SIZE_BUCKETS)
+SAVE_SECONDS = histogram("data_save_seconds", "Time to rewrite a data file")
+SAVE_BYTES = histogram("data_save_bytes", "Size of a data file when saved", SIZE_BUCKETS)
+RECORD_SECONDS = histogram("data_record_seconds", "Time to apply a batch of changes to a data file, by persistence mode")
+
+
+def load_data(file_path):
+    """Load data from a data file, in whichever format it was saved, with its logged changes applied"""
+    # Read the log first: changes appended meanwhile are left for the next load.
+    # If the file or the log was swapped between the reads (a compaction, or a
+    # rewrite, which deletes the log), the old log could bring back records the
+    # rewrite removed, so the reads are repeated. No lock is taken, as indexes
+    # load under their own lock, which writers take while holding the file's.
+    with LOAD_SECONDS.time(file=file_path):
+        while True:
+            versions = _versions(file_path)
+            changes, _ = read_changes(file_path)
+            raw = None
+            if os.path.exists(file_path):
+                with open(file_path, 'rb') as f:
+                    raw = f.read()
+            if _versions(file_path) == versions:
+                break
+        if raw is None:
+            return apply_changes([], changes)
+        LOAD_BYTES.observe(len(raw), file=file_path)
+        return apply_changes(decode(raw), changes)
+
+
+def community_shard(community_id):
+    """The shard a community's data is kept in"""
+    # crc32 rather than hash(), which differs between processes
+    return zlib.crc32(community_id.encode()) % COMMUNITY_SHARDS
+
+
+def communities_file(community_id):
+    """The shard of the communities data that holds a community"""
+    return COMMUNITIES_FILES[community_shard(community_id)]
+
+
+def polls_file(community_id):
+    """The shard of the polls data that holds a community's polls"""
+    return POLLS_FILES[community_shard(community_id)]
+
+
+def load_sharded(file_paths):
+    """Load every shard of sharded data as one list"""
+    return [row for file_path in file_paths for row in load_data(file_path)]
+
+
+def split_by_shard(rows, file_paths, community_key):
+    """Group rows by the shard of the community id in `row[community_key]`: {shard file: rows}"""
+    shards = {file_path: [] for file_path in file_paths}
+    for row in rows:
+        shards[file_paths[community_shard(row[community_key])]].append(row)
+    return shards
+
+
+def _stat_stamp(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def _versions(file_path):
+    """Which data file and which log are in place; appends to the log do not change them"""
+    versions = []
+    for path in (file_path, wal_path(file_path)):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            versions.append(None)
+            continue
+        versions.append((stat.st_ino, stat.st_mtime_ns, stat.st_size) if path == file_path else stat.st_ino)
+    return tuple(versions)
+
+
+def file_stamp(file_path):
+    """Identify a version of a file (and its write-ahead log) by modification time and size"""
+    stamp = _stat_stamp(file_path)
+    log_stamp = _stat_stamp(wal_path(file_path))
+    return stamp if log_stamp is None else (stamp, log_stamp)
+
+
+def _write_temporary(data, file_path, codec=None):
+    codec = codec or file_codec(file_path) or default_codec()
+    raw = codec.encode(data)
+    SAVE_BYTES.observe(len(raw), file=file_path)
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(raw)
+    return tmp_path
+
+
+def _swap_in(tmp_path, file_path):
+    os.replace(tmp_path, file_path)
+    # The data loaded for this save already had the logged changes applied
+    if os.path.exists(wal_path(file_path)):
+        os.remove(wal_path(file_path))
+
+
+def save_data(data, file_path, codec=None):
+    """Save data to a data file, keeping the file's current format unless a codec is given"""
+    # Write a temporary file and swap it in, so readers never see a half-written file
+    with SAVE_SECONDS.time(file=file_path):
+        _swap_in(_write_temporary(data, file_path, codec), file_path)
+
+
+def save_all(datasets):
+    """Save several (data, file path) pairs together; the caller holds every file's lock
+
+    Every file is encoded and written out before any is swapped in, so a
+    failure while writing leaves all of them unchanged. The swaps themselves
+    are one rename per file, so a crash between two of them leaves the files
+    before it updated and the rest not.
+    """
+    written = []
+    try:
+        for data, file_path in datasets:
+            written.append((_write_temporary(data, file_path), file_path))
+    except Exception:
+        for tmp_path, _ in written:
+            os.remove(tmp_path)
+        raise
+    for tmp_path, file_path in written:
+        _swap_in(tmp_path, file_path)
+
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+_held = threading.local()
+
+
+@contextmanager
+def file_lock(file_path):
+    """Hold the exclusive lock of a data file across threads and processes (re-entrant)"""
+    key = os.path.abspath(file_path)
+    held = _held.__dict__.setdefault("paths", set())
+    if key in held:
+        yield
+        return
+
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(key, threading.Lock())
+
+    with thread_lock:
+        held.add(key)
+        try:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{file_path}.lock", 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        finally:
+            held.discard(key)
+
+
+@contextmanager
+def locked_data(file_path):
+    """Load a data file under its lock and save it back when the block completes
+
+    Use this for every read-modify-write, so concurrent updates are never lost.
+    """
+    with file_lock(file_path):
+        data = load_data(file_path)
+        yield data
+        save_data(data, file_path)
+
+
+def record_changes(file_path, changes, data=None):
+    """Apply changes (see event_log) to a data file
+
+    In log mode each change is appended to the file's log, so the cost does not
+    grow with the data; otherwise the file is rewritten. Pass `data` if it was
+    already loaded under the file's lock, so it is not loaded again.
+    """
+    with file_lock(file_path), RECORD_SECONDS.time(file=file_path, mode=PERSISTENCE):
+        if PERSISTENCE == "log":
+            log_changes(file_path, changes)
+        else:
+            save_data(apply_changes(load_data(file_path) if data is None else data, changes), file_path)
+
+
+def compact_log(file_path):
+    """Fold a data file's log into a new version of the file; returns the number of changes folded
+
+    The file is encoded without holding its lock, so writers only wait while
+    the log is read and while the files are swapped. If the file was rewritten
+    in the meantime, nothing is swapped and the next compaction tries again.
+    """
+    log_path = wal_path(file_path)
+    with file_lock(file_path + ".compaction"):
+        with file_lock(file_path):
+            changes, end = read_changes(file_path)
+            if not changes:
+                return 0
+            stamp = _stat_stamp(file_path)
+            log_inode = os.stat(log_path).st_ino
+            codec = file_codec(file_path) or default_codec()
+            data = []
+            if stamp is not None:
+                with open(file_path, 'rb') as f:
+                    data = decode(f.read())
+
+        raw = codec.encode(apply_changes(data, changes))
+        tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+
+        with file_lock(file_path):
+            try:
+                current_log_inode = os.stat(log_path).st_ino
+            except FileNotFoundError:
+                current_log_inode = None
+            if _stat_stamp(file_path) != stamp or current_log_inode != log_inode:
+                os.remove(tmp_path)
+                return 0
+            with open(log_path, 'rb') as f:
+                f.seek(end)
+                rest = f.read()
+            os.replace(tmp_path, file_path)
+            if rest:
+                # Changes logged while the file was being encoded start the new log
+                with open(log_path + ".tmp", 'wb') as f:
+                    f.write(rest)
+                os.replace(log_path + ".tmp", log_path)
+            else:
+                os.remove(log_path)
+        return len(changes)
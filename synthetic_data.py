@@ -0,0 +1,330 @@
+"""Generate a synthetic data directory for load tests and capacity planning.
+
+Farmers and vendors are placed around farming districts across India, in a
+Gaussian cluster around each district town weighted by its share of farmers,
+so communities come out the sizes real ones would rather than uniform. Users
+go in through bulk_io, so communities are worked out as in an import; then
+messages, polls, market prices, farming tips and likes are added, with a few
+busy communities and popular tips taking most of the traffic. The same seed
+gives the same data, with timestamps over the days up to today.
+
+Run in an empty directory (e.g. the data directory of a test server):
+
+    python synthetic_data.py --farmers 1000000 --vendors 5000 --messages 2000000 --prices 1000000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from bootstrap import bootstrap
+from bulk_io import import_users
+from price_store import PriceStore
+from storage import (
+    COMMUNITIES_FILE, COMMUNITIES_FILES, FARMERS_FILE, FARMING_TIPS_FILE, POLLS_FILES, VENDORS_FILE, load_sharded,
+    save_all, save_data, split_by_shard
+)
+from tips_index import TIP_LIKES_FILE
+
+# (district town, latitude, longitude, share of farmers)
+DISTRICTS = [
+    ("Nashik", 20.00, 73.79, 6), ("Pune", 18.52, 73.86, 5), ("Nagpur", 21.15, 79.09, 4),
+    ("Ludhiana", 30.90, 75.85, 6), ("Amritsar", 31.63, 74.87, 4), ("Karnal", 29.69, 76.99, 4),
+    ("Meerut", 28.98, 77.71, 6), ("Lucknow", 26.85, 80.95, 7), ("Varanasi", 25.32, 82.97, 6),
+    ("Patna", 25.59, 85.14, 7), ("Bardhaman", 23.23, 87.86, 6), ("Cuttack", 20.46, 85.88, 4),
+    ("Guntur", 16.31, 80.44, 5), ("Warangal", 17.97, 79.59, 4), ("Belagavi", 15.85, 74.50, 4),
+    ("Mysuru", 12.30, 76.64, 3), ("Coimbatore", 11.02, 76.96, 3), ("Thanjavur", 10.79, 79.14, 4),
+    ("Rajkot", 22.30, 70.80, 4), ("Indore", 22.72, 75.86, 5), ("Jaipur", 26.91, 75.79, 4),
+    ("Guwahati", 26.14, 91.74, 3),
+]
+
+# Spread of a district's cluster, in degrees (about 40 km)
+DISTRICT_SPREAD = 0.35
+
+FIRST_NAMES = ["Ramesh", "Suresh", "Anita", "Sunita", "Vijay", "Lakshmi", "Ganesh", "Kavita", "Raju", "Meena",
+               "Arjun", "Pooja", "Mahesh", "Rekha", "Harpreet", "Gurdeep", "Murugan", "Selvi", "Bhavesh", "Kiran"]
+LAST_NAMES = ["Patil", "Shinde", "Jadhav", "Pawar", "Yadav", "Singh", "Sharma", "Reddy", "Naidu", "Gowda",
+              "Das", "Mondal", "Patel", "Chaudhary", "Kumar", "Pillai", "Sandhu", "Mishra", "Verma", "Nair"]
+
+# (product, unit, typical price in rupees)
+PRODUCTS = [
+    ("Tomatoes", "kg", 25.0), ("Potatoes", "kg", 15.0), ("Onions", "kg", 20.0), ("Rice", "kg", 45.0),
+    ("Wheat", "kg", 30.0), ("Maize", "kg", 22.0), ("Cotton", "kg", 65.0), ("Soybean", "kg", 48.0),
+    ("Chickpeas", "kg", 70.0), ("Groundnut", "kg", 60.0), ("Bananas", "dozen", 50.0), ("Sugarcane", "quintal", 350.0),
+]
+
+TIP_CATEGORIES = ["Soil Management", "Water Management", "Pest Control", "Crop Selection",
+                  "Harvesting", "Equipment", "Weather", "Sustainable Practices"]
+
+MESSAGES = [
+    "Who has {product} ready this week?", "Rates for {product} went up at the mandi today.",
+    "Can anyone share transport to the market on Friday?", "Rain expected tomorrow, cover the harvested {product}.",
+    "Need {quantity} {unit} of {product}, good price offered.", "Thanks everyone for the quick supply!",
+]
+
+
+def _uuid(rng):
+    return str(uuid.UUID(bytes=rng.bytes(16), version=4))
+
+
+def _skewed_weights(count, exponent=1.1):
+    """Weights for picking among `count` items where the first few get most picks"""
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _timestamps(rng, count, start, days):
+    """`count` ISO timestamps spread over `days` days from `start`, in time order"""
+    offsets = np.sort(rng.uniform(0, days * 86400, count))
+    return [(start + timedelta(seconds=float(s))).isoformat() for s in offsets]
+
+
+def generate_users(rng, count, created_at):
+    """Users clustered around the farming districts"""
+    shares = np.array([d[3] for d in DISTRICTS], dtype=np.float64)
+    district = rng.choice(len(DISTRICTS), size=count, p=shares / shares.sum())
+    centers = np.array([(d[1], d[2]) for d in DISTRICTS])[district]
+    coordinates = centers + rng.normal(0, DISTRICT_SPREAD, (count, 2))
+    first = rng.integers(len(FIRST_NAMES), size=count)
+    last = rng.integers(len(LAST_NAMES), size=count)
+    has_phone = rng.random(count) < 0.7
+    phones = rng.integers(6_000_000_000, 9_999_999_999, size=count)
+    users = []
+    for i in range(count):
+        user = {
+            "id": _uuid(rng),
+            "name": f"{FIRST_NAMES[first[i]]} {LAST_NAMES[last[i]]}",
+            "latitude": round(float(coordinates[i, 0]), 5),
+            "longitude": round(float(coordinates[i, 1]), 5),
+            "created_at": created_at
+        }
+        if has_phone[i]:
+            user["phone"] = f"+91 {phones[i]}"
+        users.append(user)
+    return users
+
+
+def add_messages(rng, communities, count, start, days):
+    """Messages from community members, most of them in the busiest communities"""
+    if not communities or not count:
+        return 0
+    per_community = rng.multinomial(count, _skewed_weights(len(communities)))
+    order = rng.permutation(len(communities))
+    for community_index, n in zip(order, per_community):
+        community = communities[community_index]
+        members = community["members"]
+        authors = rng.integers(len(members), size=n)
+        templates = rng.integers(len(MESSAGES), size=n)
+        products = rng.integers(len(PRODUCTS), size=n)
+        for author, template, product, timestamp in zip(authors, templates, products, _timestamps(rng, n, start, days)):
+            member = members[author]
+            name, unit, _ = PRODUCTS[product]
+            community["messages"].append({
+                "id": _uuid(rng),
+                "user_id": member["id"],
+                "user_name": member["name"],
+                "user_type": member["type"],
+                "content": MESSAGES[template].format(product=name, quantity=int(rng.integers(10, 500)), unit=unit),
+                "timestamp": timestamp
+            })
+    return count
+
+
+def generate_polls(rng, communities, count, now):
+    """Polls in communities with farmers, some already fulfilled or closed"""
+    with_farmers = [c for c in communities if len(c["members"]) > 1]
+    if not with_farmers:
+        return []
+    polls = []
+    picks = rng.choice(len(with_farmers), size=count, p=_skewed_weights(len(with_farmers)))
+    for community_index in picks:
+        community = with_farmers[community_index]
+        product, unit, _ = PRODUCTS[int(rng.integers(len(PRODUCTS)))]
+        quantity = int(rng.integers(50, 2000))
+        farmers = community["members"][1:]
+        responders = rng.choice(len(farmers), size=min(len(farmers), int(rng.integers(0, 20))), replace=False)
+        responses = {}
+        for farmer_index in responders:
+            farmer = farmers[farmer_index]
+            responses[farmer["id"]] = {
+                "farmer_id": farmer["id"],
+                "farmer_name": farmer["name"],
+                "quantity": int(rng.integers(5, quantity // 4 + 6)),
+                "reference_code": f"P{len(polls):04d}-F{farmer['id'][:4]}-{rng.bytes(3).hex().upper()}",
+                "created_at": now.isoformat()
+            }
+        total = sum(r["quantity"] for r in responses.values())
+        deadline = now + timedelta(days=int(rng.integers(-30, 60)))
+        status = "fulfilled" if total >= quantity else ("closed" if deadline < now else "open")
+        polls.append({
+            "id": _uuid(rng),
+            "community_id": community["id"],
+            "vendor_id": community["vendor_id"],
+            "vendor_name": community["vendor_name"],
+            "product": product,
+            "quantity": quantity,
+            "unit": unit,
+            "deadline": deadline.date().isoformat(),
+            "status": status,
+            "created_at": (deadline - timedelta(days=30)).isoformat(),
+            "responses": responses,
+            "total_committed": total
+        })
+    return polls
+
+
+def add_prices(rng, vendors, count, start, days, batch=50_000):
+    """Market prices from vendors in their districts, added to the price store in time order"""
+    if not vendors or not count:
+        return 0
+    store = PriceStore()
+    # Each district pays its own premium or discount on the typical price
+    district_factor = np.exp(rng.normal(0, 0.1, (len(DISTRICTS), len(PRODUCTS))))
+    vendor_district = [min(range(len(DISTRICTS)),
+                           key=lambda d: (DISTRICTS[d][1] - v["latitude"]) ** 2 + (DISTRICTS[d][2] - v["longitude"]) ** 2)
+                       for v in vendors]
+    seconds = np.sort(rng.uniform(0, days * 86400, count))
+    for begin in range(0, count, batch):
+        n = min(batch, count - begin)
+        vendor_picks = rng.integers(len(vendors), size=n)
+        product_picks = rng.integers(len(PRODUCTS), size=n)
+        noise = np.exp(rng.normal(0, 0.05, n))
+        entries = []
+        for i in range(n):
+            vendor = vendors[vendor_picks[i]]
+            district = vendor_district[vendor_picks[i]]
+            product, unit, typical = PRODUCTS[product_picks[i]]
+            entries.append({
+                "id": _uuid(rng),
+                "vendor_id": vendor["id"],
+                "vendor_name": vendor["name"],
+                "product": product,
+                "price": round(typical * district_factor[district, product_picks[i]] * noise[i], 2),
+                "unit": unit,
+                "location": DISTRICTS[district][0],
+                "notes": "",
+                "timestamp": (start + timedelta(seconds=float(seconds[begin + i]))).isoformat()
+            })
+        store.extend(entries)
+    return count
+
+
+def generate_tips(rng, users, count, start, days):
+    """Farming tips written by vendors and farmers"""
+    if not users or not count:
+        return []
+    authors = rng.integers(len(users), size=count)
+    categories = rng.integers(len(TIP_CATEGORIES), size=count)
+    products = rng.integers(len(PRODUCTS), size=count)
+    tips = []
+    for author, category, product, timestamp in zip(authors, categories, products, _timestamps(rng, count, start, days)):
+        user, user_type = users[author]
+        topic = TIP_CATEGORIES[category]
+        tips.append({
+            "id": _uuid(rng),
+            "user_id": user["id"],
+            "user_name": user["name"],
+            "user_type": user_type,
+            "title": f"{topic} for {PRODUCTS[product][0]}",
+            "content": f"What has worked for us with {PRODUCTS[product][0].lower()}: {topic.lower()} "
+                       f"done early in the season saves water and labour later.",
+            "category": topic,
+            "timestamp": timestamp
+        })
+    return tips
+
+
+def write_likes(rng, tips, farmers, count, now):
+    """Likes of tips by farmers, most of them on a few popular tips; returns how many were written"""
+    if not tips or not farmers or not count:
+        return 0
+    seen = set()
+    tip_picks = rng.choice(len(tips), size=count, p=_skewed_weights(len(tips)))
+    user_picks = rng.integers(len(farmers), size=count)
+    with open(TIP_LIKES_FILE, 'a') as f:
+        for tip_index, user_index in zip(tip_picks, user_picks):
+            if (tip_index, user_index) in seen:
+                continue
+            seen.add((tip_index, user_index))
+            f.write(json.dumps({"tip_id": tips[tip_index]["id"], "user_id": farmers[user_index]["id"],
+                                "liked_at": now.isoformat()}) + "\n")
+    return len(seen)
+
+
+def generate(farmers=10_000, vendors=200, messages=50_000, polls=2_000, prices=100_000, tips=2_000, likes=50_000,
+             days=180, seed=7):
+    """Fill the (empty) data directory in the working directory; returns the counts and seconds per step"""
+    rng = np.random.default_rng(seed)
+    now = datetime.now().replace(microsecond=0)
+    start = now - timedelta(days=days)
+    report = {"seconds": {}}
+    started = time.perf_counter()
+
+    def step(name):
+        nonlocal started
+        finished = time.perf_counter()
+        report["seconds"][name] = finished - started
+        started = finished
+
+    # Vendors first, so importing the farmers joins them to the communities in one pass
+    vendor_rows = generate_users(rng, vendors, start.isoformat())
+    farmer_rows = generate_users(rng, farmers, start.isoformat())
+    import_users("vendor", enumerate(vendor_rows, 1))
+    report["memberships"] = import_users("farmer", enumerate(farmer_rows, 1))["memberships"]
+    report["farmers"], report["vendors"] = farmers, vendors
+    step("users")
+
+    communities = load_sharded(COMMUNITIES_FILES)
+    report["messages"] = add_messages(rng, communities, messages, start, days)
+    save_all([(rows, path) for path, rows in split_by_shard(communities, COMMUNITIES_FILES, "id").items()])
+    step("messages")
+
+    poll_rows = generate_polls(rng, communities, polls, now)
+    save_all([(rows, path) for path, rows in split_by_shard(poll_rows, POLLS_FILES, "community_id").items()])
+    report["polls"] = len(poll_rows)
+    step("polls")
+
+    report["prices"] = add_prices(rng, vendor_rows, prices, start, days)
+    step("prices")
+
+    authors = [(v, "vendor") for v in vendor_rows] + [(f, "farmer") for f in farmer_rows]
+    tip_rows = generate_tips(rng, authors, tips, start, days)
+    save_data(tip_rows, FARMING_TIPS_FILE)
+    report["tips"] = len(tip_rows)
+    report["likes"] = write_likes(rng, tip_rows, farmer_rows, likes, now)
+    step("tips")
+
+    # Records the schema version; the sample data is not seeded, as the data is not empty
+    bootstrap()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic data directory for load tests")
+    parser.add_argument("--farmers", type=int, default=10_000)
+    parser.add_argument("--vendors", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--polls", type=int, default=2_000)
+    parser.add_argument("--prices", type=int, default=100_000)
+    parser.add_argument("--tips", type=int, default=2_000)
+    parser.add_argument("--likes", type=int, default=50_000)
+    parser.add_argument("--days", type=int, default=180, help="history to spread timestamps over")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if any(os.path.exists(path) for path in (FARMERS_FILE, VENDORS_FILE, COMMUNITIES_FILE, *COMMUNITIES_FILES)):
+        sys.exit("This directory already has data; run in an empty directory")
+    report = generate(args.farmers, args.vendors, args.messages, args.polls, args.prices, args.tips, args.likes,
+                      args.days, args.seed)
+    print(", ".join(f"{report[kind]:,} {kind}" for kind in
+                    ("farmers", "vendors", "memberships", "messages", "polls", "prices", "tips", "likes")))
+    print("seconds: " + ", ".join(f"{step} {seconds:.1f}" for step, seconds in report["seconds"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bootstrap import bootstrap  # noqa: E402
+from services.resources import reset_resources  # noqa: E402
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """A fresh data directory as the working directory, with the services' resources built anew for it"""
+    monkeypatch.chdir(tmp_path)
+    reset_resources()
+    bootstrap()
+    yield tmp_path
+    reset_resources()
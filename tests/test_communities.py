@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.communities import (  # noqa: E402
+    add_message_to_community, changed_elsewhere, get_community_messages, get_user_communities,
+    search_community_messages
+)
+from services.users import register_user  # noqa: E402
+from storage import communities_file, file_stamp  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def post_from_another_process(community_id, message):
+    subprocess.run([sys.executable, "-c", f"""
+import sys
+sys.path.insert(0, {ROOT!r})
+from services.communities import add_message_to_community
+add_message_to_community({community_id!r}, "f2", "Amina", "farmer", {message!r})
+"""], check=True)
+
+
+def test_a_message_from_another_process_is_seen_once_everywhere(data_dir):
+    vendor_id = register_user("vendor", "Youssef", 31.63, -8.0)
+    [community] = get_user_communities(vendor_id, "vendor")
+    shard_file = communities_file(community["id"])
+    # Build the search index, so this process's writes update it in place
+    assert search_community_messages(community["id"], "olives")[1] == 0
+
+    stamp = file_stamp(shard_file)
+    add_message_to_community(community["id"], vendor_id, "Youssef", "vendor", "Olives arrive on Monday")
+    stamp, elsewhere = changed_elsewhere(shard_file, stamp)
+    assert not elsewhere
+
+    post_from_another_process(community["id"], "Fresh olives from the north field")
+
+    stamp, elsewhere = changed_elsewhere(shard_file, stamp)
+    assert elsewhere
+    assert not changed_elsewhere(shard_file, stamp)[1]
+    assert get_community_messages(community["id"])[1] == 2
+    assert search_community_messages(community["id"], "olives")[1] == 2
+    assert search_community_messages(community["id"], "north field")[1] == 1
+    assert get_user_communities(vendor_id, "vendor")[0]["message_count"] == 2
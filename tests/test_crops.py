@@ -0,0 +1,44 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+from crop_recommendations import RecommendationIndex  # noqa: E402
+from services import crops  # noqa: E402
+from storage import RECOMMENDATIONS_FILE, load_data, save_data  # noqa: E402
+
+
+class FakeRecommender:
+    def __init__(self, version):
+        self.version = version
+
+    def score(self, farmers):
+        return [{"id": farmer["id"], "crops": [{"crop": "rice", "probability": 0.9}], "version": self.version}
+                for farmer in farmers]
+
+
+@pytest.fixture(params=["snapshot", "log"])
+def recommendations(request, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "PERSISTENCE", request.param)
+    save_data([{"id": "f1", "crops": [{"crop": "wheat", "probability": 0.8}], "version": "old"}], RECOMMENDATIONS_FILE)
+    index = RecommendationIndex(RECOMMENDATIONS_FILE, lambda: load_data(RECOMMENDATIONS_FILE))
+    monkeypatch.setattr(crops, "get_recommendation_index", lambda: index)
+    return index
+
+
+def test_a_recommendation_from_another_model_is_scored_again_and_replaced(recommendations, monkeypatch):
+    monkeypatch.setattr(crops, "get_recommender", lambda: FakeRecommender("new"))
+
+    assert crops.get_crop_recommendation({"id": "f1"})["version"] == "new"
+    assert [(row["id"], row["version"]) for row in load_data(RECOMMENDATIONS_FILE)] == [("f1", "new")]
+    assert recommendations.get("f1")["crops"][0]["crop"] == "rice"
+
+
+def test_a_saved_recommendation_is_kept_without_a_model(recommendations, monkeypatch):
+    monkeypatch.setattr(crops, "get_recommender", lambda: None)
+
+    assert crops.get_crop_recommendation({"id": "f1"})["version"] == "old"
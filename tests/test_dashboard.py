@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+from dashboard import DashboardSummaries  # noqa: E402
+from storage import COMMUNITIES_FILES, POLLS_FILES, communities_file, load_data, save_data  # noqa: E402
+
+
+def message(message_id, timestamp):
+    return {"id": message_id, "user_id": "f1", "user_name": "Amina", "user_type": "farmer",
+            "content": "hello", "timestamp": timestamp}
+
+
+@pytest.fixture
+def summaries(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(storage, "PERSISTENCE", "snapshot")
+    community = {"id": "c1", "name": "Olives", "vendor_name": "Youssef", "created_at": "2026-01-01T00:00:00",
+                 "members": [{"id": "f1"}], "messages": [message("m1", "2026-01-01T00:00:00")]}
+    save_data([community], communities_file("c1"))
+    summaries = DashboardSummaries(COMMUNITIES_FILES, load_data, POLLS_FILES, lambda file_path: [])
+    summaries.rebuild()
+    return summaries
+
+
+def message_added(seq, message_id, timestamp):
+    return {"seq": seq, "type": "message_added", "community_id": "c1", "message": message(message_id, timestamp)}
+
+
+def test_messages_applied_out_of_order_are_all_counted(summaries):
+    summaries.apply(message_added(1, "m3", "2026-01-01T00:00:02"))
+    summaries.apply(message_added(2, "m2", "2026-01-01T00:00:01"))
+
+    [row] = summaries.user_communities("f1")
+    assert row["message_count"] == 3
+    assert row["last_message_at"] == "2026-01-01T00:00:02"
+
+
+def test_a_message_is_counted_once(summaries):
+    summaries.apply(message_added(1, "m1", "2026-01-01T00:00:00"))
+    summaries.apply(message_added(2, "m2", "2026-01-01T00:00:01"))
+    summaries.apply(message_added(2, "m2", "2026-01-01T00:00:01"))
+
+    assert summaries.user_communities("f1")[0]["message_count"] == 2
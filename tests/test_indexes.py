@@ -0,0 +1,94 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+from community_index import CommunityIndex  # noqa: E402
+from poll_index import PollIndex  # noqa: E402
+from storage import file_lock, file_stamp, load_data, save_data  # noqa: E402
+from tips_index import TipsIndex  # noqa: E402
+from user_index import UserIndex  # noqa: E402
+
+
+class CountingLoader:
+    """Loads a data file, counting how often the index under test reloads it"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.calls = 0
+
+    def __call__(self, file_path=None):
+        self.calls += 1
+        return load_data(file_path or self.file_path)
+
+
+def poll(poll_id):
+    return {"id": poll_id, "community_id": "c1", "vendor_id": "v1", "responses": {}, "created_at": poll_id}
+
+
+def tip(tip_id):
+    return {"id": tip_id, "title": "Mulch", "content": "Keep the soil moist", "category": "Soil",
+            "timestamp": tip_id}
+
+
+def user(user_id):
+    return {"id": user_id, "name": f"Farmer {user_id}"}
+
+
+def entry(community_id):
+    return {"id": community_id, "name": "Olives", "vendor_id": "v1", "vendor_name": "Youssef"}
+
+
+# For each index: how to make a row, build the index and tell it about a write from this process
+INDEXES = {
+    "polls": (poll, lambda path, load: PollIndex([path], load),
+              lambda index, path, stamp, row, rows: index.apply_write(path, stamp, updated=[row], saved=rows)),
+    "tips": (tip, lambda path, load: TipsIndex(path, load, likes_file=path + ".likes"),
+             lambda index, path, stamp, row, rows: index.apply_tip(stamp, row)),
+    "users": (user, lambda path, load: UserIndex(path, load),
+              lambda index, path, stamp, row, rows: index.apply_user(stamp, row)),
+    "communities": (entry, lambda path, load: CommunityIndex(path, load),
+                    lambda index, path, stamp, row, rows: index.apply_write(stamp, [row])),
+}
+
+
+@pytest.fixture(params=sorted(INDEXES))
+def indexed(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "PERSISTENCE", "snapshot")
+    make_row, build, apply_write = INDEXES[request.param]
+    file_path = str(tmp_path / f"{request.param}.json")
+    save_data([make_row("a")], file_path)
+    load = CountingLoader(file_path)
+    return file_path, make_row, build(file_path, load), load, apply_write
+
+
+def test_a_write_from_another_process_is_reloaded(indexed):
+    file_path, make_row, index, load, _ = indexed
+    assert index.get("a") is not None
+    loads = load.calls
+
+    # Another process saves the file without telling this one's index
+    save_data(load_data(file_path) + [make_row("b")], file_path)
+
+    assert index.get("b") is not None
+    assert load.calls == loads + 1
+
+
+def test_a_write_from_this_process_is_applied_without_a_reload(indexed):
+    file_path, make_row, index, load, apply_write = indexed
+    assert index.get("a") is not None
+    loads = load.calls
+
+    row = make_row("b")
+    with file_lock(file_path):
+        stamp_before = file_stamp(file_path)
+        rows = load_data(file_path) + [row]
+        save_data(rows, file_path)
+        apply_write(index, file_path, stamp_before, row, rows)
+
+    assert index.get("b") is not None
+    assert index.get("a") is not None
+    assert load.calls == loads
@@ -0,0 +1,63 @@
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from outbox import drain  # noqa: E402
+from services.communities import (  # noqa: E402
+    deliver_outbox_entry, get_community_messages, get_user_communities, search_community_messages
+)
+from services.polls import create_poll, get_poll_by_id, load_polls, respond_to_poll  # noqa: E402
+from services.users import register_user  # noqa: E402
+
+
+def vendor_poll(quantity):
+    vendor_id = register_user("vendor", "Youssef", 31.63, -8.0)
+    [community] = get_user_communities(vendor_id, "vendor")
+    deadline = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d")
+    poll_id = create_poll(community["id"], vendor_id, "Youssef", "Olives", quantity, "kg", deadline)
+    return vendor_id, community["id"], poll_id
+
+
+def test_concurrent_responses_are_all_counted(data_dir):
+    _, _, poll_id = vendor_poll(1000)
+    farmers = [f"farmer-{i}" for i in range(8)]
+
+    threads = [threading.Thread(target=respond_to_poll, args=(poll_id, farmer_id, farmer_id, 10))
+               for farmer_id in farmers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for poll in (get_poll_by_id(poll_id), next(p for p in load_polls() if p["id"] == poll_id)):
+        assert sorted(poll["responses"]) == farmers
+        assert poll["total_committed"] == 80
+
+
+def test_redelivered_notices_are_posted_once(data_dir):
+    vendor_id, community_id, poll_id = vendor_poll(10)
+    assert respond_to_poll(poll_id, "farmer-1", "Amina", 10)
+    # Build the search index, so deliveries update it as they are written
+    assert search_community_messages(community_id, "requirement met")[1] == 0
+
+    entries = []
+
+    # The first delivery succeeds but is not acknowledged, as if the process died before removing the entries
+    def deliver_then_fail(entry):
+        entries.append(entry)
+        deliver_outbox_entry(entry)
+        raise RuntimeError("crashed before acknowledging")
+
+    assert drain(deliver_then_fail) == 0
+    assert drain(deliver_outbox_entry) == len(entries)
+    assert drain(deliver_outbox_entry) == 0
+
+    messages, total = get_community_messages(community_id)
+    assert any("has been met" in m["content"] for m in messages)
+    assert [m["id"] for m in messages] == [entry["id"] for entry in entries]
+    assert total == len(entries)
+    assert search_community_messages(community_id, "requirement met")[1] == 1
+    assert get_user_communities(vendor_id, "vendor")[0]["message_count"] == len(entries)
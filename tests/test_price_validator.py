@@ -0,0 +1,33 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_validator import FLAGGED, OK, QUARANTINED, WARMUP, PriceValidator  # noqa: E402
+
+
+def price(value):
+    return {"product": "Wheat", "unit": "kg", "location": "Ludhiana", "price": value}
+
+
+def warmed_up():
+    validator = PriceValidator()
+    for value in [20.0, 21.0, 19.5, 20.5, 20.0] * WARMUP:
+        assert validator.validate(price(value))["status"] == OK
+    return validator
+
+
+def test_quarantined_prices_do_not_move_the_statistics():
+    validator = warmed_up()
+    verdicts = [validator.validate(price(2000.0)) for _ in range(50)]
+
+    assert {verdict["status"] for verdict in verdicts} == {QUARANTINED}
+    assert verdicts[-1]["typical_price"] == verdicts[0]["typical_price"]
+    assert validator.validate(price(20.0))["status"] == OK
+
+
+def test_flagged_prices_still_update_the_statistics():
+    validator = warmed_up()
+    typical = validator.validate(price(20.0))["typical_price"]
+    assert validator.validate(price(30.0))["status"] == FLAGGED
+    assert validator.validate(price(20.0))["typical_price"] > typical
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+from search_index import MESSAGES, TIPS, SearchIndex, message_documents, tip_documents  # noqa: E402
+from storage import file_stamp, load_data, save_data  # noqa: E402
+
+
+@pytest.fixture
+def communities_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "PERSISTENCE", "snapshot")
+    file_path = str(tmp_path / "communities_0.json")
+    save_data([{"id": "c1", "messages": [message("m1", "tomatoes for sale")]}], file_path)
+    return file_path
+
+
+def message(message_id, text):
+    return {"id": message_id, "sender_name": "Amina", "content": text, "timestamp": "2026-01-01T00:00:00"}
+
+
+def indexed(file_path):
+    index = SearchIndex()
+    index.add_source(file_path, lambda: message_documents(load_data(file_path)))
+    return index
+
+
+def add_message(file_path, new_message):
+    communities = load_data(file_path)
+    communities[0]["messages"].append(new_message)
+    save_data(communities, file_path)
+
+
+def test_a_write_is_indexed_once_when_the_index_has_already_reloaded(communities_file):
+    index = indexed(communities_file)
+    assert index.search(MESSAGES, "tomatoes")[1] == 1
+
+    stamp_before = file_stamp(communities_file)
+    new_message = message("m2", "more tomatoes")
+    add_message(communities_file, new_message)
+    # A search between the save and the writer's update reloads the file itself
+    assert index.search(MESSAGES, "tomatoes")[1] == 2
+    index.apply_write(communities_file, stamp_before, [(MESSAGES, "c1", new_message)])
+
+    assert index.search(MESSAGES, "tomatoes")[1] == 2
+
+
+def test_a_write_on_top_of_an_unseen_version_is_left_to_the_reindex(communities_file):
+    index = indexed(communities_file)
+    index.search(MESSAGES, "tomatoes")
+
+    add_message(communities_file, message("m2", "onions"))
+    stamp_before = file_stamp(communities_file)
+    new_message = message("m3", "more onions")
+    add_message(communities_file, new_message)
+    index.apply_write(communities_file, stamp_before, [(MESSAGES, "c1", new_message)])
+
+    assert index.search(MESSAGES, "onions")[1] == 2
+
+
+def test_a_write_to_an_unknown_file_is_ignored(communities_file):
+    index = indexed(communities_file)
+    index.apply_write(communities_file + ".other", None, [(MESSAGES, "c1", message("m2", "tomatoes"))])
+
+    assert index.search(MESSAGES, "tomatoes")[1] == 1
+
+
+def test_tip_categories_ignore_case_and_surrounding_spaces(tmp_path):
+    tips_file = str(tmp_path / "farming_tips.json")
+    save_data([{"id": "t1", "title": "Irrigation", "content": "Water early", "category": " Water "}], tips_file)
+    index = SearchIndex()
+    index.add_source(tips_file, lambda: tip_documents(load_data(tips_file)))
+
+    assert index.search(TIPS, "water", scope="water")[1] == 1
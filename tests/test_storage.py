@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import storage  # noqa: E402
+from event_log import append_change, apply_changes, insert_change, read_changes, replace_change, wal_path  # noqa: E402
+from storage import compact_log, load_data, locked_data, record_changes, save_data  # noqa: E402
+
+
+@pytest.fixture
+def data_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "PERSISTENCE", "log")
+    file_path = str(tmp_path / "polls_0.json")
+    save_data([{"id": "a", "responses": [], "status": "open"}], file_path)
+    return file_path
+
+
+def ids(rows):
+    return sorted(row["id"] for row in rows)
+
+
+def test_logged_changes_are_replayed_onto_the_file(data_file):
+    record_changes(data_file, [insert_change({"id": "b", "responses": [], "status": "open"}),
+                               append_change("a", "responses", {"id": "f1"})])
+
+    assert os.path.exists(wal_path(data_file))
+    rows = {row["id"]: row for row in load_data(data_file)}
+    assert sorted(rows) == ["a", "b"]
+    assert rows["a"]["responses"] == [{"id": "f1"}]
+
+
+def test_replaying_changes_twice_has_no_effect(data_file):
+    changes = [insert_change({"id": "b", "responses": [], "status": "open"}),
+               append_change("a", "responses", {"id": "f1"})]
+    record_changes(data_file, changes)
+    once = load_data(data_file)
+
+    assert apply_changes(load_data(data_file), changes) == once
+    assert apply_changes(load_data(data_file), changes + changes) == once
+
+
+def test_a_replace_wins_over_the_row_it_replaces(data_file):
+    changes = [append_change("a", "responses", {"id": "f1"}),
+               replace_change({"id": "a", "responses": [], "status": "closed"}),
+               append_change("a", "responses", {"id": "f2"}),
+               replace_change({"id": "b", "responses": [], "status": "open"})]
+    record_changes(data_file, changes)
+    once = load_data(data_file)
+
+    assert once == [{"id": "a", "responses": [{"id": "f2"}], "status": "closed"},
+                    {"id": "b", "responses": [], "status": "open"}]
+    assert apply_changes(load_data(data_file), changes) == once
+    compact_log(data_file)
+    assert load_data(data_file) == once
+
+
+def test_compaction_keeps_every_change(data_file):
+    record_changes(data_file, [insert_change({"id": "b", "responses": [], "status": "open"}),
+                               append_change("a", "responses", {"id": "f1"})])
+    before = load_data(data_file)
+
+    assert compact_log(data_file) == 2
+    assert not os.path.exists(wal_path(data_file))
+    assert load_data(data_file) == before
+
+    record_changes(data_file, [append_change("b", "responses", {"id": "f2"})])
+    assert compact_log(data_file) == 1
+    assert {row["id"]: row["responses"] for row in load_data(data_file)} == {"a": [{"id": "f1"}], "b": [{"id": "f2"}]}
+
+
+def test_updates_and_deletes_survive_later_changes_and_compaction(data_file):
+    record_changes(data_file, [insert_change({"id": "b", "responses": [], "status": "open"}),
+                               insert_change({"id": "c", "responses": [], "status": "open"})])
+    with locked_data(data_file) as rows:
+        rows[:] = [row for row in rows if row["id"] != "b"]
+        rows[0]["status"] = "closed"
+    assert read_changes(data_file) == ([], 0)
+
+    record_changes(data_file, [insert_change({"id": "d", "responses": [], "status": "open"})])
+    compact_log(data_file)
+
+    rows = {row["id"]: row for row in load_data(data_file)}
+    assert sorted(rows) == ["a", "c", "d"]
+    assert rows["a"]["status"] == "closed"
+
+
+def test_a_rewrite_during_a_read_is_seen_whole_or_not_at_all(data_file, monkeypatch):
+    record_changes(data_file, [insert_change({"id": "b", "responses": [], "status": "open"})])
+    before = load_data(data_file)
+
+    def rewrite():
+        with locked_data(data_file) as rows:
+            rows[:] = [dict(row, status="closed") for row in rows if row["id"] != "b"]
+
+    # Start the rewrite once the reader has read the log, and give it the time to finish
+    rewriter = threading.Thread(target=rewrite)
+
+    def read_changes_then_rewrite(file_path):
+        changes = read_changes(file_path)
+        if rewriter.ident is None:
+            rewriter.start()
+            rewriter.join(timeout=0.5)
+        return changes
+
+    monkeypatch.setattr(storage, "read_changes", read_changes_then_rewrite)
+    during = load_data(data_file)
+    rewriter.join()
+    monkeypatch.setattr(storage, "read_changes", read_changes)
+    after = load_data(data_file)
+
+    assert after == [{"id": "a", "responses": [], "status": "closed"}]
+    assert during in (before, after)
@@ -0,0 +1,139 @@
+import json
+import os
+import threading
+from bisect import bisect_left, insort
+
+from storage import file_lock, file_stamp
+
+# Append-only likes table: one {"tip_id", "user_id", "liked_at"} record per line
+TIP_LIKES_FILE = "tip_likes.jsonl"
+
+ALL_CATEGORIES = None
+
+
+def category_key(category):
+    """A tip category as it is indexed and looked up, ignoring case and surrounding spaces"""
+    return category.strip().lower()
+
+
+class TipsIndex:
+    """Farming tips ranked by likes, with likes kept as per-tip sets
+
+    Likes live in an append-only table instead of a list inside each tip, so a
+    like appends one line instead of rewriting the tips file. Each category,
+    and all tips together, has a list of (likes, timestamp, id) kept sorted
+    with bisect, so a like moves one entry instead of re-sorting, and a page of
+    the most liked tips is a slice from the end.
+
+    Like the poll index, it is rebuilt if the tips file or likes table were
+    changed by another process.
+    """
+
+    def __init__(self, tips_file, load_tips, likes_file=TIP_LIKES_FILE):
+        self.tips_file = tips_file
+        self.load_tips = load_tips
+        self.likes_file = likes_file
+        self._lock = threading.RLock()
+        self.rebuild()
+
+    def _read_likes(self):
+        if not os.path.exists(self.likes_file):
+            return []
+        with open(self.likes_file, 'r') as f:
+            return [json.loads(line) for line in f if line.endswith("\n")]
+
+    def rebuild(self):
+        """Reindex all tips and likes from storage"""
+        with self._lock:
+            self._tips_stamp = file_stamp(self.tips_file)
+            self._likes_stamp = file_stamp(self.likes_file)
+            self._tips = {}
+            self._likers = {}
+            self._ranked = {ALL_CATEGORIES: []}
+            tips = self.load_tips()
+            for tip in tips:
+                # Tips saved before the likes table keep their likes in "liked_by"
+                self._likers[tip["id"]] = set(tip.get("liked_by", ()))
+            for like in self._read_likes():
+                self._likers.setdefault(like["tip_id"], set()).add(like["user_id"])
+            for tip in tips:
+                self._tips[tip["id"]] = tip
+                for ranked in self._rankings(tip):
+                    ranked.append(self._rank_key(tip["id"]))
+            for ranked in self._ranked.values():
+                ranked.sort()
+
+    def _refresh(self):
+        if file_stamp(self.tips_file) != self._tips_stamp or file_stamp(self.likes_file) != self._likes_stamp:
+            self.rebuild()
+
+    def _rank_key(self, tip_id):
+        return (len(self._likers.get(tip_id, ())), self._tips[tip_id]["timestamp"], tip_id)
+
+    def _rankings(self, tip):
+        return (self._ranked[ALL_CATEGORIES], self._ranked.setdefault(category_key(tip["category"]), []))
+
+    def _view(self, tip_id):
+        view = dict(self._tips[tip_id], likes=len(self._likers.get(tip_id, ())))
+        view.pop("liked_by", None)
+        return view
+
+    def apply_tip(self, stamp_before, tip):
+        """Add a tip just saved by this process
+
+        Call while still holding the tips file lock, with the file stamp taken
+        under the lock before loading; if the index had not seen that version,
+        it is rebuilt instead.
+        """
+        with self._lock:
+            if stamp_before != self._tips_stamp:
+                self.rebuild()
+                return
+            self._tips[tip["id"]] = tip
+            self._likers.setdefault(tip["id"], set())
+            for ranked in self._rankings(tip):
+                insort(ranked, self._rank_key(tip["id"]))
+            self._tips_stamp = file_stamp(self.tips_file)
+
+    def like(self, tip_id, user_id, liked_at):
+        """Record a user's like of a tip; returns False if the tip does not exist or was already liked"""
+        with self._lock, file_lock(self.likes_file):
+            # A tip posted by another process since the last rebuild must be found too
+            self._refresh()
+            if tip_id not in self._tips or user_id in self._likers[tip_id]:
+                return False
+
+            with open(self.likes_file, 'a') as f:
+                f.write(json.dumps({"tip_id": tip_id, "user_id": user_id, "liked_at": liked_at}) + "\n")
+
+            # Move the tip one like up in each of its rankings
+            old_key = self._rank_key(tip_id)
+            self._likers[tip_id].add(user_id)
+            new_key = self._rank_key(tip_id)
+            for ranked in self._rankings(self._tips[tip_id]):
+                del ranked[bisect_left(ranked, old_key)]
+                insort(ranked, new_key)
+            self._likes_stamp = file_stamp(self.likes_file)
+            return True
+
+    def has_liked(self, tip_id, user_id):
+        """Whether a user has liked a tip"""
+        with self._lock:
+            self._refresh()
+            return user_id in self._likers.get(tip_id, ())
+
+    def get(self, tip_id):
+        """A tip with its like count, or None"""
+        with self._lock:
+            self._refresh()
+            return self._view(tip_id) if tip_id in self._tips else None
+
+    def page(self, category=ALL_CATEGORIES, page=1, page_size=10):
+        """One page of tips, most liked (then newest) first, and the total number of tips"""
+        with self._lock:
+            self._refresh()
+            key = category_key(category) if category is not ALL_CATEGORIES else ALL_CATEGORIES
+            ranked = self._ranked.get(key, [])
+            end = len(ranked) - (page - 1) * page_size
+            start = max(0, end - page_size)
+            return [self._view(tip_id) for _, _, tip_id in reversed(ranked[start:max(0, end)])], len(ranked)
@@ -0,0 +1,123 @@
+import threading
+from bisect import bisect_left, insort
+
+from storage import file_stamp
+
+
+def _name_key(text):
+    return " ".join(text.casefold().split())
+
+
+def _phone_key(text):
+    return "".join(ch for ch in text if ch.isdigit())
+
+
+def _keys(user):
+    words = _name_key(user["name"]).split(" ")
+    names = [(" ".join(words[i:]), user["id"]) for i in range(len(words))]
+    phone = _phone_key(user.get("phone") or "")
+    return names, [(phone, user["id"])] if phone else []
+
+
+class UserIndex:
+    """Farmers or vendors by id, by name or phone prefix, and in registration order
+
+    Names and phone numbers are kept in sorted arrays of (key, id), with an
+    entry for every word of a name so "pat" finds "Ramesh Patil". A prefix
+    lookup bisects to the first match and reads on to the limit, so typeahead
+    does not slow down as users are added.
+
+    Like the poll index, it is rebuilt if the users file was changed by
+    another process.
+    """
+
+    def __init__(self, users_file, load_users):
+        self.users_file = users_file
+        self.load_users = load_users
+        self._lock = threading.RLock()
+        self.rebuild()
+
+    def rebuild(self):
+        """Reindex all users from storage"""
+        with self._lock:
+            self._stamp = file_stamp(self.users_file)
+            self._users = {}
+            self._order = []
+            self._names = []
+            self._phones = []
+            for user in self.load_users():
+                if user["id"] in self._users:
+                    continue
+                self._users[user["id"]] = user
+                self._order.append(user["id"])
+                names, phones = _keys(user)
+                self._names.extend(names)
+                self._phones.extend(phones)
+            self._names.sort()
+            self._phones.sort()
+
+    def _refresh(self):
+        if file_stamp(self.users_file) != self._stamp:
+            self.rebuild()
+
+    def apply_user(self, stamp_before, user):
+        """Add a user just saved by this process
+
+        Call while still holding the users file lock, with the file stamp taken
+        under the lock before saving; if the index had not seen that version,
+        it is rebuilt instead.
+        """
+        with self._lock:
+            if stamp_before != self._stamp:
+                self.rebuild()
+                return
+            self._users[user["id"]] = user
+            self._order.append(user["id"])
+            names, phones = _keys(user)
+            for key in names:
+                insort(self._names, key)
+            for key in phones:
+                insort(self._phones, key)
+            self._stamp = file_stamp(self.users_file)
+
+    def get(self, user_id):
+        """A user by id, or None"""
+        with self._lock:
+            self._refresh()
+            return self._users.get(user_id)
+
+    def count(self):
+        """How many users there are"""
+        with self._lock:
+            self._refresh()
+            return len(self._order)
+
+    def search(self, query, limit=10):
+        """Users whose name (from any word on) or phone number starts with the query, in name order"""
+        with self._lock:
+            self._refresh()
+            # Queries of digits and punctuation only are phone numbers
+            if any(ch.isalpha() for ch in query) or not _phone_key(query):
+                keys, prefix = self._names, _name_key(query)
+            else:
+                keys, prefix = self._phones, _phone_key(query)
+            if not prefix:
+                return []
+
+            found = []
+            seen = set()
+            for i in range(bisect_left(keys, (prefix,)), len(keys)):
+                key, user_id = keys[i]
+                if not key.startswith(prefix) or len(found) == limit:
+                    break
+                if user_id not in seen:
+                    seen.add(user_id)
+                    found.append(self._users[user_id])
+            return found
+
+    def page(self, page=1, page_size=20):
+        """One page of users in registration order, and the total number of users"""
+        with self._lock:
+            self._refresh()
+            start = (page - 1) * page_size
+            return [self._users[user_id] for user_id in self._order[start:start + page_size]], len(self._order)